@@ -1,5 +1,5 @@
 import streamlit as st
-from database import init_db
+from database import bootstrap_db, run_maintenance_if_due
 from auth import load_css, check_session_timeout, update_last_activity
 from pages import (
     show_landing_page,
@@ -17,10 +17,12 @@ def main():
         layout="wide"
     )
 
-    # Initialize the database
-    if not init_db():
+    # Initialize the database (runs once per process, cached across reruns)
+    if not bootstrap_db():
         st.error("Failed to initialize database. Please check the logs.")
         return
+    # Prunes old login events and unreferenced files at most once a day
+    run_maintenance_if_due()
 
     # Custom theme and CSS
     st.markdown("""
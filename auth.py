@@ -1,6 +1,7 @@
 import streamlit as st
-import bcrypt
-from database import get_user_by_email, update_user_activity, update_user_password, update_reset_token, get_user_by_reset_token, clear_reset_token
+import sqlite3
+import passwords
+from database import get_user_by_email, record_login_event, update_user_password, update_reset_token, get_user_by_reset_token, clear_reset_token, transaction, log_activity
 from datetime import datetime, timedelta
 import secrets
 import string
@@ -58,15 +59,37 @@ def load_css():
     </style>
     """, unsafe_allow_html=True)
 
+BUSY_MESSAGE = "Too many people are signing in right now. Please try again in a moment."
+
+def hash_password(password):
+    return passwords.hash_password(password)
+
+def verify_password(hashed_password, password):
+    return passwords.verify_password(hashed_password, password)
+
 def login_user(email, password):
     user = get_user_by_email(email)
-    if user and bcrypt.checkpw(password.encode('utf-8'), user['password']):
-        update_user_activity(user['id'], 'last_login')
-        return user
-    return None
+    try:
+        if not (user and verify_password(user['password'], password)):
+            record_login_event(user['id'] if user else None, succeeded=False)
+            return None
+        # Hashes made at an older, cheaper cost factor are upgraded while the password is at hand
+        new_hash = passwords.rehash_if_needed(user['password'], password)
+    except passwords.PasswordHasherBusy:
+        st.error(BUSY_MESSAGE)
+        return None
+    if new_hash:
+        update_user_password(user['id'], new_hash)
+    record_login_event(user['id'])
+    log_activity('login', email, user_id=user['id'], entity='user', entity_id=user['id'])
+    return user
 
 def register_user(email, password, first_name, last_name, mobile):
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    try:
+        hashed_password = hash_password(password)
+    except passwords.PasswordHasherBusy:
+        st.error(BUSY_MESSAGE)
+        return False
     now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     user_data = {
         'email': email,
@@ -85,6 +108,8 @@ def register_user(email, password, first_name, last_name, mobile):
     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
     """
     result = execute_db_query(query, tuple(user_data.values()), fetch=False)
+    if result is not None:
+        log_activity('registration', email, entity='user')
     return result is not None
 
 def check_session_timeout():
@@ -122,10 +147,24 @@ def initiate_password_reset(email):
 
 def reset_password(reset_token, new_password):
     user = get_user_by_reset_token(reset_token)
-    if user:
-        hashed_password = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
-        if update_user_password(user['id'], hashed_password):
+    if not user:
+        return False
+    # Hashed before the transaction so the write lock is held only for the two updates
+    try:
+        hashed_password = hash_password(new_password)
+    except passwords.PasswordHasherBusy:
+        st.error(BUSY_MESSAGE)
+        return False
+    try:
+        with transaction('immediate'):
+            # Checked again under the write lock, so a token can only be used once
+            if get_user_by_reset_token(reset_token) is None:
+                return False
+            update_user_password(user['id'], hashed_password)
             clear_reset_token(user['id'])
-            return True
-    return False
+        log_activity('password_reset', user['email'], user_id=user['id'], entity='user', entity_id=user['id'])
+        return True
+    except sqlite3.Error as e:
+        st.error(f"Failed to reset password: {str(e)}")
+        return False
 
@@ -0,0 +1,240 @@
+"""Populate a database with a reproducible synthetic dataset.
+
+    python benchmarks/generate_data.py --scale 100k --output bench_100k.db
+
+Every table created by init_db is filled. Row counts are derived from the
+number of users, and the same --seed and --reference-date always produce the
+same rows. Uploaded files come from a small set of sample blobs, so a
+large dataset stays small on disk (the blob store deduplicates them).
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bcrypt
+from PIL import Image
+import blob_store
+import database
+
+SCALES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+BATCH_USERS = 10_000
+SAMPLE_FILE_COUNT = 64
+
+FIRST_NAMES = ["Amara", "Ben", "Chloe", "Daniel", "Ebony", "Farah", "George", "Hannah", "Isaac", "Jasmine",
+               "Kwame", "Leah", "Mohammed", "Niamh", "Oliver", "Priya", "Quentin", "Rosa", "Samuel", "Tara",
+               "Uche", "Victoria", "William", "Xin", "Yusuf", "Zara"]
+LAST_NAMES = ["Adeyemi", "Brown", "Chen", "Davies", "Evans", "Fernandes", "Green", "Hughes", "Ibrahim", "Jones",
+              "Khan", "Lewis", "Mensah", "Nowak", "Okafor", "Patel", "Quinn", "Roberts", "Singh", "Taylor",
+              "Usman", "Vaughan", "Williams", "Xu", "Young", "Zhou"]
+POSITIONS = ["Registered Nurse", "Doctor", "Physiotherapist", "Occupational Therapist", "Healthcare Assistant",
+             "Midwife", "Paramedic", "Pharmacist", "Radiographer", "Care Coordinator"]
+EMPLOYERS = ["NHS Trust", "Bupa", "HC-One", "Spire Healthcare", "Nuffield Health", "Barchester", "Agency"]
+SKILLS = ["triage", "wound care", "phlebotomy", "medication administration", "patient assessment",
+          "dementia care", "ECG", "infection control", "palliative care", "manual handling"]
+CERTIFICATIONS = ["NMC registration", "BLS", "ALS", "Manual Handling", "Safeguarding Level 2", "COSHH"]
+DEGREES = ["BSc Nursing", "MBBS", "BSc Physiotherapy", "NVQ Level 3", "MSc Public Health"]
+INSTITUTIONS = ["University of Leeds", "King's College London", "University of Manchester", "Open University"]
+VISA_TYPES = ["British Citizen", "EU Settlement Scheme", "Skilled Worker Visa", "Health and Care Worker Visa", "Other"]
+DOCUMENT_TYPES = ["Degree Certificate", "Other Certificate", "Passport Photograph", "Resume", "Government ID",
+                  "Address Proof", "Job Experience Evidence"]
+APPLICATION_STATUSES = ["submitted", "under_review", "interview_scheduled", "rejected", "accepted"]
+INTERVIEW_STATUSES = ["scheduled", "completed", "cancelled", "rescheduled"]
+ACTIVITY_TYPES = ["login", "application_submitted", "document_uploaded", "application_status_updated"]
+MESSAGE_WORDS = ("thank you for your application we would like to invite you to an interview please "
+                 "upload your documents at your earliest convenience the shift pattern is flexible").split()
+
+def user_count(scale):
+    return SCALES[scale.lower()] if scale.lower() in SCALES else int(scale)
+
+def fmt(moment):
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+def make_sample_files(rng, root):
+    """Store SAMPLE_FILE_COUNT PDFs and photo-sized PNGs; returns their blob references"""
+    refs = []
+    for i in range(SAMPLE_FILE_COUNT):
+        if i % 2:
+            # A seeded pixel grid scaled up, so previews have a real image to decode
+            tile = Image.frombytes('RGB', (16, 12), rng.randbytes(16 * 12 * 3))
+            out = io.BytesIO()
+            tile.resize((rng.randint(400, 1600), rng.randint(300, 1200))).save(out, 'PNG')
+            data = out.getvalue()
+            mime_type = 'image/png'
+        else:
+            data = b'%PDF-1.4\n' + rng.randbytes(rng.randint(5_000, 120_000))
+            mime_type = 'application/pdf'
+        sha256, size = blob_store.write_blob(root, data)
+        refs.append((sha256, size, mime_type))
+    return refs
+
+def application_data(rng, first_name, last_name, email, reference):
+    authorized = rng.random() < 0.85
+    return json.dumps({
+        'personal_info': {'first_name': first_name, 'last_name': last_name, 'email': email,
+                          'phone': f"07{rng.randint(100000000, 999999999)}", 'address': f"{rng.randint(1, 200)} High Street",
+                          'dob': str(reference.date() - timedelta(days=rng.randint(21 * 365, 65 * 365)))},
+        'professional_info': {'position': rng.choice(POSITIONS), 'years_experience': rng.randint(0, 35),
+                              'current_employer': rng.choice(EMPLOYERS)},
+        'education': {'highest_degree': rng.choice(DEGREES), 'institution': rng.choice(INSTITUTIONS),
+                      'graduation_year': rng.randint(1985, 2025)},
+        'certifications': rng.sample(CERTIFICATIONS, rng.randint(1, 3)),
+        'skills': rng.sample(SKILLS, rng.randint(2, 5)),
+        'work_authorization': {'authorized': authorized, 'visa_type': rng.choice(VISA_TYPES) if authorized else None},
+        'references': [{'name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", 'relation': 'Manager',
+                        'contact': f"ref{rng.randint(1, 10**6)}@example.com"}],
+        'additional_info': {'start_date': str(reference.date() + timedelta(days=rng.randint(0, 120))),
+                            'preferred_schedule': rng.choice(['Full-time', 'Part-time', 'Flexible']),
+                            'willing_to_relocate': rng.random() < 0.3}
+    })
+
+def generate(path, users, seed=42, reference=None, log=print):
+    """Create `path` and fill it; returns {table: row count}"""
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists")
+    rng = random.Random(seed)
+    reference = reference or datetime.now().replace(microsecond=0)
+
+    def moment(max_days):
+        return reference - timedelta(seconds=rng.randint(0, max_days * 86400))
+
+    database.DATABASE_NAME = path
+    if not database.init_db():
+        raise RuntimeError("init_db failed")
+    database.close_all_connections()
+    samples = make_sample_files(rng, database.get_blob_root())
+    pdfs = [ref for ref in samples if ref[2] == 'application/pdf']
+    pngs = [ref for ref in samples if ref[2] == 'image/png']
+    # Hashing a password per user would dominate the run; every generated user gets "password"
+    password = bcrypt.hashpw(b'password', bcrypt.gensalt(4))
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    counts = {}
+
+    def insert(table, columns, rows):
+        if rows:
+            conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})", rows)
+            counts[table] = counts.get(table, 0) + len(rows)
+
+    admin_count = max(2, users // 5000)
+    admin_ids = list(range(2, 2 + admin_count))  # id 1 is the admin init_db creates
+    first_candidate = admin_ids[-1] + 1
+    with conn:
+        insert('users', ['id', 'email', 'password', 'first_name', 'last_name', 'mobile', 'role', 'registration_date',
+                         'last_login', 'last_activity'],
+               [(admin_id, f"admin{admin_id}@example.com", password, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+                 '0200000000', 'admin', fmt(moment(730)), fmt(moment(7)), fmt(moment(7))) for admin_id in admin_ids])
+        insert('positions', ['title', 'description', 'required_staff', 'filled_staff', 'created_at'],
+               [(f"{title} - {site}", f"{title} vacancy at {site}", rng.randint(1, 20), rng.randint(0, 10), fmt(moment(365)))
+                for title in POSITIONS for site in ("North", "South", "East", "West")])
+        tests = []
+        for i in range(25):
+            questions = [{'text': f"Question {q + 1}", 'type': 'multiple_choice', 'options': ['A', 'B', 'C', 'D'],
+                          'correct_answer': rng.choice('ABCD')} for q in range(rng.randint(5, 15))]
+            tests.append((f"{rng.choice(POSITIONS)} screening {i + 1}", "Screening test", json.dumps(questions),
+                          rng.choice([15, 30, 45]), rng.choice(admin_ids), fmt(moment(365))))
+        insert('screening_tests', ['title', 'description', 'questions', 'duration', 'created_by', 'creation_date'], tests)
+
+    candidate_total = users - admin_count
+    started = time.perf_counter()
+    for batch_start in range(0, candidate_total, BATCH_USERS):
+        batch = range(first_candidate + batch_start, first_candidate + min(batch_start + BATCH_USERS, candidate_total))
+        rows = {name: [] for name in ('users', 'applications', 'documents', 'messages', 'interviews',
+                                      'test_assignments', 'edit_requests', 'activities', 'login_events')}
+        for user_id in batch:
+            first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            email = f"{first_name.lower()}.{last_name.lower()}{user_id}@example.com"
+            registered = moment(730)
+            picture = rng.choice(pngs) if rng.random() < 0.2 else (None, None, None)
+            rows['users'].append((user_id, email, password, first_name, last_name, f"07{rng.randint(100000000, 999999999)}",
+                                  'candidate', fmt(registered), fmt(moment(30)), fmt(moment(30)),
+                                  rng.choice(['active', 'active', 'active', 'inactive']), rng.randint(21, 65),
+                                  rng.choice(['London', 'Leeds', 'Manchester', 'Bristol', 'Glasgow']), 'United Kingdom', *picture))
+            for _ in range(rng.choices([0, 1, 2], [10, 80, 10])[0]):
+                submitted = moment(365)
+                resume, cover_letter = rng.choice(pdfs), rng.choice(pdfs)
+                rows['applications'].append((user_id, application_data(rng, first_name, last_name, email, reference),
+                                             rng.choice(APPLICATION_STATUSES), fmt(submitted), fmt(submitted), *resume, *cover_letter))
+            for _ in range(rng.randint(0, 6)):
+                file_ref = rng.choice(samples)
+                rows['documents'].append((user_id, f"{rng.choice(DOCUMENT_TYPES).lower().replace(' ', '_')}_{user_id}.{'png' if file_ref[2] == 'image/png' else 'pdf'}",
+                                          *file_ref, rng.choice(DOCUMENT_TYPES), fmt(moment(365)), rng.random() < 0.6))
+            for _ in range(rng.randint(0, 8)):
+                admin_id = rng.choice(admin_ids)
+                sender, recipient = (admin_id, user_id) if rng.random() < 0.6 else (user_id, admin_id)
+                rows['messages'].append((sender, recipient, ' '.join(rng.choices(MESSAGE_WORDS, k=rng.randint(5, 40))),
+                                         fmt(moment(180)), rng.random() < 0.7))
+            for _ in range(rng.choices([0, 1, 2], [45, 45, 10])[0]):
+                day = reference.date() + timedelta(days=rng.randint(-60, 60))
+                rows['interviews'].append((user_id, str(day), f"{rng.randint(8, 17):02d}:{rng.choice(['00', '30'])}:00",
+                                           rng.choice(['In-person', 'Phone', 'Video']), rng.choice(POSITIONS), 'Smart casual',
+                                           rng.choice(['First', 'Second', 'Final']), rng.choice(INTERVIEW_STATUSES)))
+            for test_id in rng.sample(range(1, len(tests) + 1), rng.choices([0, 1, 2], [40, 45, 15])[0]):
+                assigned = moment(180)
+                if rng.random() < 0.5:
+                    rows['test_assignments'].append((test_id, user_id, fmt(assigned), fmt(assigned), fmt(assigned + timedelta(minutes=25)),
+                                                     'completed', rng.randint(0, 100), json.dumps({'0': rng.choice('ABCD')})))
+                else:
+                    rows['test_assignments'].append((test_id, user_id, fmt(assigned), None, None, 'assigned', None, None))
+            if rng.random() < 0.05:
+                rows['edit_requests'].append((user_id, "Details changed", json.dumps({'location': 'Leeds'}), fmt(moment(60)),
+                                              rng.choice(['pending', 'approved', 'rejected'])))
+            for _ in range(rng.randint(0, 12)):
+                rows['login_events'].append((user_id, 'login' if rng.random() < 0.9 else 'login_failed', fmt(moment(365))))
+            for _ in range(rng.randint(1, 5)):
+                activity_type = rng.choice(ACTIVITY_TYPES)
+                rows['activities'].append((activity_type, email, fmt(moment(90)), user_id, 'user', user_id))
+
+        with conn:
+            insert('users', ['id', 'email', 'password', 'first_name', 'last_name', 'mobile', 'role', 'registration_date',
+                             'last_login', 'last_activity', 'status', 'age', 'location', 'country',
+                             'profile_picture_sha256', 'profile_picture_size', 'profile_picture_mime'], rows['users'])
+            insert('applications', ['user_id', 'application_data', 'status', 'submitted_date', 'last_modified',
+                                    'resume_sha256', 'resume_size', 'resume_mime',
+                                    'cover_letter_sha256', 'cover_letter_size', 'cover_letter_mime'], rows['applications'])
+            insert('documents', ['user_id', 'file_name', 'file_data_sha256', 'file_data_size', 'file_data_mime',
+                                 'file_type', 'upload_date', 'viewed'], rows['documents'])
+            insert('messages', ['sender_id', 'recipient_id', 'message', 'sent_date', 'read_status'], rows['messages'])
+            insert('interviews', ['candidate_id', 'date', 'time', 'type', 'role', 'dress_code', 'stage', 'status'], rows['interviews'])
+            insert('test_assignments', ['test_id', 'candidate_id', 'assigned_date', 'start_time', 'end_time', 'status',
+                                        'score', 'responses'], rows['test_assignments'])
+            insert('edit_requests', ['user_id', 'request_reason', 'requested_changes', 'request_date', 'status'], rows['edit_requests'])
+            insert('activities', ['activity_type', 'details', 'timestamp', 'user_id', 'entity', 'entity_id'], rows['activities'])
+            insert('login_events', ['user_id', 'event', 'occurred_at'], rows['login_events'])
+        done = batch.stop - first_candidate
+        log(f"{done}/{candidate_total} candidates ({time.perf_counter() - started:.1f}s)")
+
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', default='1k', help=f"number of users, or one of {', '.join(SCALES)}")
+    parser.add_argument('--output', help="database file to create (default bench_<scale>.db)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reference-date', help="YYYY-MM-DD that generated dates are relative to (default today)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger('database').setLevel(logging.WARNING)
+    reference = datetime.strptime(args.reference_date, '%Y-%m-%d') if args.reference_date else None
+    output = args.output or f"bench_{args.scale.lower()}.db"
+    started = time.perf_counter()
+    counts = generate(output, user_count(args.scale), args.seed, reference)
+    print(json.dumps(counts, indent=2))
+    print(f"Created {output} in {time.perf_counter() - started:.1f}s")
+
+if __name__ == '__main__':
+    main()
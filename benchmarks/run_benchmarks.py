@@ -0,0 +1,424 @@
+"""Time database.py functions and page renders against a generated dataset.
+
+    python benchmarks/generate_data.py --scale 100k --output bench_100k.db
+    python benchmarks/run_benchmarks.py bench_100k.db --output results.json
+    python benchmarks/run_benchmarks.py bench_100k.db --baseline results.json
+
+Startup is measured first: `import app` and `import pages` are each timed
+in a fresh interpreter with -X importtime, along with peak memory and
+whether plotly.express was loaded.
+
+The dataset is copied first (with its blob store), so the cases that write
+never change it. Each case runs once to warm up, then --repeat more times;
+the query cache is cleared before every timed call unless --warm-cache is
+given, so reads measure SQL rather than cache hits. With --baseline, a case
+whose median is more than --threshold slower (and more than --min-delta-ms
+in absolute terms) is reported and the exit status is 1.
+"""
+import argparse
+import inspect
+import io
+import itertools
+import json
+import logging
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import database
+import query_cache
+
+class Context:
+    """Ids of representative rows in the dataset, looked up once"""
+    def __init__(self, path):
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        one = lambda query: conn.execute(query).fetchone()
+        # A candidate with a typical amount of history, rather than the first or last row
+        candidate = one("""SELECT u.id, u.email FROM users u
+                           WHERE u.role = 'candidate'
+                             AND EXISTS (SELECT 1 FROM applications a WHERE a.user_id = u.id)
+                             AND EXISTS (SELECT 1 FROM documents d WHERE d.user_id = u.id)
+                             AND EXISTS (SELECT 1 FROM messages m WHERE m.recipient_id = u.id)
+                             AND EXISTS (SELECT 1 FROM interviews i WHERE i.candidate_id = u.id)
+                           ORDER BY u.id LIMIT 1 OFFSET (SELECT COUNT(*) / 2 FROM users) / 10""")
+        self.candidate_id, self.email = candidate['id'], candidate['email']
+        self.admin_id = one("SELECT id FROM users WHERE role = 'admin' ORDER BY id LIMIT 1")['id']
+        self.document_id = one(f"SELECT id FROM documents WHERE user_id = {self.candidate_id} LIMIT 1")['id']
+        self.application_id = one(f"SELECT id FROM applications WHERE user_id = {self.candidate_id} LIMIT 1")['id']
+        self.interview_id = one(f"SELECT id FROM interviews WHERE candidate_id = {self.candidate_id} LIMIT 1")['id']
+        self.test_id = one("SELECT id FROM screening_tests ORDER BY id LIMIT 1")['id']
+        self.position_id = one("SELECT id FROM positions ORDER BY id LIMIT 1")['id']
+        self.edit_request_id = (one("SELECT id FROM edit_requests ORDER BY id LIMIT 1") or {'id': 0})['id']
+        self.candidate_ids = [r['id'] for r in conn.execute(
+            f"SELECT id FROM users WHERE role = 'candidate' AND id >= {self.candidate_id} ORDER BY id LIMIT 50")]
+        self.interview_ids = [r['id'] for r in conn.execute("SELECT id FROM interviews ORDER BY id DESC LIMIT 50")]
+        self.application_ids = [r['id'] for r in conn.execute("SELECT id FROM applications ORDER BY id DESC LIMIT 50")]
+        # Deleted one per call, newest first
+        self.conversation_id = one(f"""SELECT conversation_id FROM conversation_participants
+                                       WHERE user_id = {self.candidate_id} ORDER BY last_activity DESC LIMIT 1""")[0]
+        self.message_ids = [r['id'] for r in conn.execute("SELECT id FROM messages ORDER BY id DESC LIMIT 1000")]
+        self.owned_documents = [(r['id'], r['user_id']) for r in conn.execute("SELECT id, user_id FROM documents ORDER BY id DESC LIMIT 1000")]
+        picture = one("SELECT profile_picture_sha256, profile_picture_mime FROM users WHERE profile_picture_sha256 IS NOT NULL LIMIT 1")
+        self.picture = (picture[0], picture[1]) if picture else (None, None)
+        self.search_term = candidate['email'].split('.')[0]
+        self.row_counts = {r['name']: conn.execute(f"SELECT COUNT(*) FROM {r['name']}").fetchone()[0]
+                           for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND sql NOT LIKE 'CREATE VIRTUAL%'")}
+        conn.close()
+        self.today = date.today().isoformat()
+        self.counter = itertools.count()
+        # A 4 MB PDF-looking upload for store_upload
+        self.upload = b'%PDF-1.4 ' + os.urandom(4 * 1024 * 1024)
+
+def _log_and_flush(ctx):
+    database.log_activity('benchmark', 'benchmark event', user_id=ctx.admin_id, entity='user', entity_id=ctx.candidate_id)
+    return database.flush_activity_log()
+
+# Every public database.py function has a case here or a reason in SKIPPED;
+# anything else is listed as uncovered in the report.
+DATABASE_CASES = {
+    'get_user_by_email': lambda ctx: database.get_user_by_email(ctx.email),
+    'update_user_activity': lambda ctx: database.update_user_activity(ctx.candidate_id, 'last_activity'),
+    'get_application': lambda ctx: database.get_application(ctx.candidate_id),
+    'save_application': lambda ctx: database.save_application(ctx.candidate_id, {'professional_info': {'position': 'Doctor', 'years_experience': 4}},
+                                                              b'%PDF-1.4 resume', b'%PDF-1.4 cover letter'),
+    'get_candidate_tests': lambda ctx: database.get_candidate_tests(ctx.candidate_id),
+    'get_messages': lambda ctx: database.get_messages(ctx.candidate_id),
+    'get_conversations_page': lambda ctx: database.get_conversations_page(include_total=True),
+    'get_conversations_page[admin]': lambda ctx: database.get_conversations_page(ctx.admin_id, include_total=True),
+    'get_conversations_page[candidate]': lambda ctx: database.get_conversations_page(ctx.candidate_id),
+    'get_conversation_messages': lambda ctx: database.get_conversation_messages(ctx.conversation_id),
+    'mark_conversation_read': lambda ctx: database.mark_conversation_read(ctx.conversation_id, ctx.candidate_id),
+    'get_unread_message_count': lambda ctx: database.get_unread_message_count(ctx.admin_id),
+    'save_message': lambda ctx: database.save_message(ctx.admin_id, ctx.candidate_id, "Benchmark message"),
+    'send_message_bulk': lambda ctx: database.send_message_bulk(ctx.admin_id, ctx.candidate_ids, "Benchmark broadcast"),
+    'delete_message': lambda ctx: database.delete_message(ctx.message_ids.pop()),
+    'get_documents': lambda ctx: database.get_documents(ctx.candidate_id),
+    'save_document': lambda ctx: database.save_document(ctx.candidate_id, 'benchmark.pdf', b'%PDF-1.4 benchmark', 'Resume'),
+    'get_screening_tests': lambda ctx: database.get_screening_tests(),
+    'get_screening_tests_page': lambda ctx: database.get_screening_tests_page(include_total=True),
+    'create_screening_test': lambda ctx: database.create_screening_test('Benchmark test', 'Benchmark', [{'text': 'Q', 'type': 'text'}], 10, ctx.admin_id),
+    'assign_test': lambda ctx: database.assign_test(ctx.test_id, ctx.candidate_id),
+    'assign_test_bulk': lambda ctx: database.assign_test_bulk(ctx.test_id, ctx.candidate_ids),
+    'get_test_details': lambda ctx: database.get_test_details(ctx.test_id),
+    'start_test': lambda ctx: database.start_test(ctx.test_id, ctx.candidate_id),
+    'submit_test': lambda ctx: database.submit_test(ctx.test_id, ctx.candidate_id, json.dumps({'0': 'A'}), 50),
+    'get_pending_edit_requests': lambda ctx: database.get_pending_edit_requests(),
+    'update_edit_request': lambda ctx: database.update_edit_request(ctx.edit_request_id, 'approved'),
+    'submit_edit_request': lambda ctx: database.submit_edit_request(ctx.candidate_id, 'Benchmark', json.dumps({'location': 'Leeds'})),
+    'get_total_candidates': lambda ctx: database.get_total_candidates(),
+    'get_open_applications': lambda ctx: database.get_open_applications(),
+    'get_scheduled_interviews': lambda ctx: database.get_scheduled_interviews(),
+    'get_filled_positions': lambda ctx: database.get_filled_positions(),
+    'update_filled_positions': lambda ctx: database.update_filled_positions(ctx.position_id, 3),
+    'get_recent_activities': lambda ctx: database.get_recent_activities(),
+    'add_new_position': lambda ctx: database.add_new_position(f"Benchmark position {next(ctx.counter)}", 'Benchmark', 2),
+    'get_all_candidates': lambda ctx: database.get_all_candidates(),
+    'get_candidates_page': lambda ctx: database.get_candidates_page(include_total=True),
+    'get_candidates_page[filtered]': lambda ctx: database.get_candidates_page(status='active', position='Midwife', sort='name'),
+    'get_all_applications': lambda ctx: database.get_all_applications(),
+    'get_applications_page': lambda ctx: database.get_applications_page(include_total=True),
+    'get_applications_page[filtered]': lambda ctx: database.get_applications_page(position='Registered Nurse', min_experience=5,
+                                                                                 work_authorized=True, sort='experience'),
+    'get_application_positions': lambda ctx: database.get_application_positions(),
+    'get_all_documents': lambda ctx: database.get_all_documents(),
+    'list_documents': lambda ctx: database.list_documents(include_total=True),
+    'list_documents[filtered]': lambda ctx: database.list_documents(file_type='Resume', viewed=False),
+    'mark_document_viewed': lambda ctx: database.mark_document_viewed(ctx.document_id),
+    'update_user_profile': lambda ctx: database.update_user_profile(ctx.candidate_id, {
+        'first_name': 'Bench', 'last_name': 'Mark', 'mobile': '0700000000', 'home_address': '1 High Street', 'age': 30,
+        'location': 'Leeds', 'country': 'United Kingdom', 'profile_picture': None}),
+    'get_user_profile': lambda ctx: database.get_user_profile(ctx.candidate_id),
+    'get_user_documents': lambda ctx: database.get_user_documents(ctx.candidate_id),
+    'delete_document': lambda ctx: database.delete_document(*ctx.owned_documents.pop()),
+    'schedule_interview': lambda ctx: database.schedule_interview([ctx.candidate_id], ctx.today, '10:00:00', 'Video', 'Doctor', 'Smart casual', 'First'),
+    'schedule_interviews_bulk': lambda ctx: database.schedule_interviews_bulk(ctx.candidate_ids, ctx.today, '10:00:00', 'Video', 'Doctor', 'Smart casual', 'First'),
+    'get_candidate_interviews': lambda ctx: database.get_candidate_interviews(ctx.candidate_id),
+    'update_interview_response': lambda ctx: database.update_interview_response(ctx.interview_id, 'accepted', 'Benchmark'),
+    'get_all_interviews': lambda ctx: database.get_all_interviews(),
+    'get_interviews_page': lambda ctx: database.get_interviews_page(include_total=True),
+    'update_interview_status': lambda ctx: database.update_interview_status(ctx.interview_id, 'scheduled'),
+    'update_interview_status_bulk': lambda ctx: database.update_interview_status_bulk(ctx.interview_ids, 'scheduled'),
+    'reschedule_interview': lambda ctx: database.reschedule_interview(ctx.interview_id, ctx.today, '11:00:00'),
+    'update_application_status': lambda ctx: database.update_application_status(ctx.application_id, 'under_review'),
+    'update_application_status_bulk': lambda ctx: database.update_application_status_bulk(ctx.application_ids, 'under_review'),
+    'get_candidate_360': lambda ctx: database.get_candidate_360(ctx.candidate_id),
+    'get_candidate_360[heavy]': lambda ctx: database.get_candidate_360(ctx.candidate_id, include_heavy=True),
+    'get_candidate_details': lambda ctx: database.get_candidate_details(ctx.candidate_id),
+    'search_candidates': lambda ctx: database.search_candidates(ctx.search_term),
+    'get_all_positions': lambda ctx: database.get_all_positions(),
+    'get_positions_page': lambda ctx: database.get_positions_page(include_total=True),
+    'get_total_applicants': lambda ctx: database.get_total_applicants(),
+    'get_total_messages': lambda ctx: database.get_total_messages(),
+    'get_total_documents': lambda ctx: database.get_total_documents(),
+    'get_login_statistics': lambda ctx: database.get_login_statistics(),
+    'get_login_statistics[hourly]': lambda ctx: database.get_login_statistics(2, 'hour'),
+    'get_login_statistics[year]': lambda ctx: database.get_login_statistics(365),
+    'record_login_event': lambda ctx: database.record_login_event(ctx.candidate_id),
+    'get_dashboard_snapshot': lambda ctx: database.get_dashboard_snapshot(),
+    'check_metric_counters': lambda ctx: database.check_metric_counters(),
+    'get_interview_statistics': lambda ctx: database.get_interview_statistics(),
+    'get_file_data': lambda ctx: database.get_file_data(ctx.document_id),
+    'get_document_info': lambda ctx: database.get_document_info(ctx.document_id),
+    'store_upload': lambda ctx: database.store_upload(io.BytesIO(ctx.upload), 'upload.pdf', allowed_types={'application/pdf'}),
+    'get_thumbnail': lambda ctx: database.get_thumbnail(*ctx.picture, 'medium'),
+    'update_user_password': lambda ctx: database.update_user_password(ctx.candidate_id, b'not-a-real-hash'),
+    'update_reset_token': lambda ctx: database.update_reset_token(ctx.candidate_id, 'benchmark-token'),
+    'get_user_by_reset_token': lambda ctx: database.get_user_by_reset_token('benchmark-token'),
+    'clear_reset_token': lambda ctx: database.clear_reset_token(ctx.candidate_id),
+    'log_activity': _log_and_flush,
+    'query_activities': lambda ctx: database.query_activities(include_total=True),
+    'query_activities[user]': lambda ctx: database.query_activities(user_id=ctx.candidate_id),
+    'get_application_statistics': lambda ctx: database.get_application_statistics(),
+    'get_user_activity_log': lambda ctx: database.get_user_activity_log(ctx.candidate_id),
+    'update_app_setting': lambda ctx: database.update_app_setting('benchmark', 'value'),
+    'get_app_setting': lambda ctx: database.get_app_setting('filled_positions'),
+}
+
+SKIPPED = {
+    'get_pool': "infrastructure", 'get_pool_stats': "infrastructure", 'get_writer': "infrastructure",
+    'get_writer_stats': "infrastructure", 'close_all_connections': "infrastructure", 'transaction': "infrastructure",
+    'get_db_connection': "infrastructure", 'written_table': "infrastructure", 'execute_db_query': "covered by every case",
+    'execute_many': "covered by the *_bulk cases", 'fetch_page': "covered by the *_page cases",
+    'get_query_stats': "infrastructure", 'reset_query_stats': "infrastructure", 'get_cache_stats': "infrastructure", 'get_thumbnail_stats': "infrastructure",
+    'get_thumbnail_root': "infrastructure",
+    'get_blob_root': "infrastructure", 'store_file': "covered by save_document", 'load_file': "covered by get_candidate_360[heavy]",
+    'open_document': "covered by get_file_data", 'flush_activity_log': "covered by log_activity",
+    'collect_blob_garbage': "maintenance job", 'prune_login_events': "maintenance job", 'compact_database': "maintenance job (rewrites the file)",
+    'run_maintenance': "maintenance job", 'run_maintenance_if_due': "starts the maintenance job",
+    'rebuild_candidate_search': "maintenance job", 'get_schema_version': "startup", 'run_migrations': "startup",
+    'init_db': "startup", 'bootstrap_db': "startup",
+}
+
+# page function -> (user role, positional arguments taken from the context)
+PAGE_CASES = {
+    'show_landing_page': (None, ()),
+    'show_login_page': (None, ()),
+    'show_registration_page': (None, ()),
+    'show_password_recovery_page': (None, ()),
+    'show_admin_dashboard': ('admin', ()),
+    'show_admin_overview': ('admin', ()),
+    'show_admin_candidates': ('admin', ()),
+    'show_candidate_details': ('admin', ('candidate_id',)),
+    'show_document': ('admin', ('document_id',)),
+    'show_admin_applications': ('admin', ()),
+    'show_full_application': ('admin', ('candidate_id',)),
+    'show_admin_interviews': ('admin', ()),
+    'show_admin_positions': ('admin', ()),
+    'show_admin_documents': ('admin', ()),
+    'show_admin_messages': ('admin', ()),
+    'show_admin_screening_tests': ('admin', ()),
+    'show_admin_performance': ('admin', ()),
+    'show_candidate_dashboard': ('candidate', ()),
+    'show_candidate_profile': ('candidate', ()),
+    'show_candidate_application': ('candidate', ()),
+    'show_candidate_messages': ('candidate', ()),
+    'show_candidate_documents': ('candidate', ()),
+    'show_candidate_interviews': ('candidate', ()),
+    'show_candidate_tests': ('candidate', ()),
+    'show_test': ('candidate', ('test_id', 'candidate_id')),
+}
+
+def public_functions(module):
+    return sorted(name for name, obj in vars(module).items()
+                  if inspect.isfunction(obj) and not name.startswith('_') and obj.__module__ == module.__name__)
+
+def summarise(samples):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {'median_ms': round(statistics.median(ordered) * 1000, 3), 'min_ms': round(ordered[0] * 1000, 3),
+            'p95_ms': round(p95 * 1000, 3), 'repeats': len(ordered)}
+
+def time_case(func, repeat, warm_cache):
+    func()
+    samples = []
+    for _ in range(repeat):
+        if not warm_cache:
+            query_cache.clear()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarise(samples)
+
+def _render_page(page, user, page_args):
+    # Runs inside AppTest, in this process; database.DATABASE_NAME is already the copy
+    import streamlit as st
+    import pages
+    if user:
+        st.session_state.user = user
+    getattr(pages, page)(*page_args)
+
+def render_page(page, user, page_args):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_function(_render_page, args=(page, user, page_args), default_timeout=120)
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+
+# Modules imported in a fresh interpreter under -X importtime: the app entry
+# point, which should stay light, and the page module it loads on first visit
+STARTUP_CASES = ['app', 'pages']
+
+_STARTUP_PROBE = """
+import json, resource, sys
+import {module}
+print(json.dumps({{'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  'modules': len(sys.modules),
+                  'plotly_express': 'plotly.express' in sys.modules}}))
+"""
+
+def measure_import(module):
+    """Import `module` in a new interpreter; returns (seconds, probe output)"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', _STARTUP_PROBE.format(module=module)],
+                            cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    # Lines look like "import time: self [us] | cumulative | name"; the target is the un-indented entry
+    cumulative = next(int(line.split('|')[1]) for line in result.stderr.splitlines()
+                      if line.startswith('import time:') and line.split('|')[2].rstrip() == f" {module}")
+    return cumulative / 1e6, json.loads(result.stdout.strip().splitlines()[-1])
+
+def time_startup(module, repeat):
+    samples, probe = [], None
+    for _ in range(repeat + 1):
+        elapsed, probe = measure_import(module)
+        samples.append(elapsed)
+    # The first run fills the OS file cache; like the other cases it is not counted
+    return dict(summarise(samples[1:]), **probe)
+
+def copy_dataset(source, workdir):
+    """Back up the dataset (and its blobs) into workdir; returns the copy's path"""
+    target = os.path.join(workdir, 'benchmark.db')
+    src, dst = sqlite3.connect(source), sqlite3.connect(target)
+    with dst:
+        src.backup(dst)
+    src.close()
+    dst.close()
+    blobs = f"{os.path.splitext(source)[0]}_blobs"
+    if os.path.isdir(blobs):
+        shutil.copytree(blobs, os.path.join(workdir, 'benchmark_blobs'))
+    return target
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """Cases whose median got slower than the baseline by more than the threshold"""
+    regressions = []
+    for group in ('startup', 'database', 'pages'):
+        for name, current in results.get(group, {}).items():
+            previous = baseline.get(group, {}).get(name)
+            if not previous or 'median_ms' not in current or 'median_ms' not in previous:
+                continue
+            delta = current['median_ms'] - previous['median_ms']
+            if delta > min_delta_ms and current['median_ms'] > previous['median_ms'] * (1 + threshold):
+                regressions.append({'case': f"{group}.{name}", 'baseline_ms': previous['median_ms'],
+                                    'current_ms': current['median_ms'],
+                                    'ratio': round(current['median_ms'] / max(previous['median_ms'], 1e-9), 2)})
+    return regressions
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('database', help="dataset created by generate_data.py")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help="earlier results to compare against")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed slowdown of the median (0.25 = 25%%)")
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help="ignore slowdowns smaller than this")
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--page-repeat', type=int, default=3)
+    parser.add_argument('--only', help="run only cases whose name contains this text")
+    parser.add_argument('--skip-pages', action='store_true')
+    parser.add_argument('--skip-startup', action='store_true')
+    parser.add_argument('--warm-cache', action='store_true', help="let reads hit the query cache")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+    # Rendering outside `streamlit run` warns about the missing script context on every
+    # call; AppTest resets logger levels, so filter the records instead
+    logging.getLogger('streamlit.runtime.scriptrunner_utils.script_run_context').addFilter(lambda record: False)
+    workdir = tempfile.mkdtemp(prefix='recruitment_bench_')
+    try:
+        database.DATABASE_NAME = copy_dataset(args.database, workdir)
+        database.BLOB_STORE_DIR = os.path.join(workdir, 'benchmark_blobs')
+        database.THUMBNAIL_DIR = os.path.join(workdir, 'benchmark_thumbnails')
+        database.bootstrap_db()
+        ctx = Context(database.DATABASE_NAME)
+        users = {'admin': database.get_user_by_email('admin@admin.com'),
+                 'candidate': database.get_user_by_email(ctx.email), None: None}
+
+        results = {'meta': {
+            'dataset': os.path.abspath(args.database), 'row_counts': ctx.row_counts,
+            'started_at': datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(),
+            'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version, 'platform': platform.platform(),
+            'repeat': args.repeat, 'page_repeat': args.page_repeat, 'warm_cache': args.warm_cache,
+        }, 'startup': {}, 'database': {}, 'pages': {}}
+        results['meta']['uncovered'] = [name for name in public_functions(database)
+                                        if name not in SKIPPED and not any(case.split('[')[0] == name for case in DATABASE_CASES)]
+        for name in results['meta']['uncovered']:
+            print(f"warning: database.{name} has no benchmark case")
+
+        if not args.skip_startup:
+            for name in STARTUP_CASES:
+                if args.only and args.only not in name:
+                    continue
+                try:
+                    results['startup'][name] = time_startup(name, args.page_repeat)
+                except (subprocess.CalledProcessError, StopIteration, ValueError) as e:
+                    results['startup'][name] = {'error': str(e)}
+                print(f"startup.{name}: {results['startup'][name]}")
+
+        for name, case in DATABASE_CASES.items():
+            if args.only and args.only not in name:
+                continue
+            try:
+                results['database'][name] = time_case(lambda: case(ctx), args.repeat, args.warm_cache)
+            except Exception as e:
+                results['database'][name] = {'error': str(e)}
+            print(f"database.{name}: {results['database'][name]}")
+
+        if not args.skip_pages:
+            for name, (role, arg_names) in PAGE_CASES.items():
+                if args.only and args.only not in name:
+                    continue
+                page_args = tuple(getattr(ctx, arg) for arg in arg_names)
+                try:
+                    results['pages'][name] = time_case(lambda: render_page(name, users[role], page_args),
+                                                       args.page_repeat, args.warm_cache)
+                except Exception as e:
+                    results['pages'][name] = {'error': str(e)}
+                print(f"pages.{name}: {results['pages'][name]}")
+
+        database.close_all_connections()
+        results['meta']['finished_at'] = datetime.now().isoformat(timespec='seconds')
+        regressions = []
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare(results, json.load(f), args.threshold, args.min_delta_ms)
+            results['regressions'] = regressions
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    errors = [f"{group}.{name}" for group in ('startup', 'database', 'pages') for name, r in results[group].items() if 'error' in r]
+    for case in errors:
+        print(f"error: {case} failed")
+    for r in regressions:
+        print(f"regression: {r['case']} {r['baseline_ms']} ms -> {r['current_ms']} ms ({r['ratio']}x)")
+    return 1 if regressions or errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
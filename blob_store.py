@@ -0,0 +1,196 @@
+import hashlib
+import mimetypes
+import os
+import tempfile
+import time
+
+# Files are stored as <root>/<aa>/<bb>/<sha256>, where aa and bb are the
+# first two byte pairs of the hex digest. Identical content is stored once.
+
+CHUNK_SIZE = 1024 * 1024
+
+class UploadRejected(ValueError):
+    """An upload that is empty, too large, or not the type it claims to be"""
+
+# Leading bytes of the file formats candidates upload
+_SIGNATURES = [
+    (b'%PDF-', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/msword'),
+]
+
+def blob_path(root, sha256):
+    return os.path.join(root, sha256[:2], sha256[2:4], sha256)
+
+def blob_exists(root, sha256):
+    return os.path.exists(blob_path(root, sha256))
+
+def sniff_mime_type(head):
+    """Guess a MIME type from the first bytes of a file, or None"""
+    for signature, mime_type in _SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[4:8] == b'ftyp':
+        return 'video/mp4'
+    if head.startswith(b'PK\x03\x04'):
+        return 'application/zip'
+    return None
+
+# Types whose content always starts with a signature sniff_mime_type knows
+_SNIFFABLE_TYPES = {mime_type for _, mime_type in _SIGNATURES} | {'image/webp', 'video/mp4'}
+# Signatures shared by several formats, so they cannot contradict a file name
+_CONTAINER_TYPES = {'application/zip', 'application/msword'}
+
+def guess_mime_type(file_name=None, head=b''):
+    """MIME type from the content signature, falling back to the file name"""
+    sniffed = sniff_mime_type(head)
+    guessed = mimetypes.guess_type(file_name)[0] if file_name else None
+    # .docx/.xlsx are zip containers, so the extension is more specific
+    if sniffed == 'application/zip' and guessed:
+        return guessed
+    return sniffed or guessed or 'application/octet-stream'
+
+def _read_into(fileobj, buffer):
+    if hasattr(fileobj, 'readinto'):
+        return fileobj.readinto(buffer) or 0
+    # sqlite3.Blob and similar only have read()
+    data = fileobj.read(len(buffer))
+    buffer[:len(data)] = data
+    return len(data)
+
+def _describe_size(size):
+    return f"{size / (1024 * 1024):g} MB" if size >= 1024 * 1024 else f"{size} byte"
+
+def _reuse(path):
+    """Refresh an existing blob's mtime so a reused orphan gets a new grace period; False if it is missing"""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+def write_stream(root, fileobj, chunk_size=CHUNK_SIZE, max_size=None, check_head=None):
+    """Copy a file object into the store in fixed-size chunks.
+
+    Returns (sha256, size). The content is hashed while it is written to a
+    temporary file, which is then renamed into place, so readers never see
+    a partial blob and memory use does not depend on the file size.
+    check_head is called with the first bytes before anything is written
+    and may raise to refuse the file; going over max_size bytes raises
+    UploadRejected and discards what was written.
+    """
+    os.makedirs(root, exist_ok=True)
+    # One buffer is reused for every chunk, so nothing else is copied
+    buffer = bytearray(chunk_size)
+    chunk = memoryview(buffer)
+    n = _read_into(fileobj, buffer)
+    if check_head:
+        check_head(bytes(chunk[:min(n, 64)]))
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=root, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            while n:
+                size += n
+                if max_size is not None and size > max_size:
+                    raise UploadRejected(f"File is larger than the {_describe_size(max_size)} limit")
+                digest.update(chunk[:n])
+                tmp.write(chunk[:n])
+                n = _read_into(fileobj, buffer)
+        sha256 = digest.hexdigest()
+        path = blob_path(root, sha256)
+        if _reuse(path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        return sha256, size
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def ingest_stream(root, fileobj, file_name=None, max_size=None, allowed_types=None, chunk_size=CHUNK_SIZE):
+    """Store an upload in one pass, refusing it as early as possible.
+
+    The MIME type is sniffed from the first bytes and checked against the
+    file name and allowed_types before anything is written; the size is
+    checked as the chunks arrive. Returns (sha256, size, mime_type) or
+    raises UploadRejected.
+    """
+    detected = {}
+
+    def check_head(head):
+        if not head:
+            raise UploadRejected(f"{file_name or 'File'} is empty")
+        claimed = mimetypes.guess_type(file_name)[0] if file_name else None
+        sniffed = sniff_mime_type(head)
+        mime_type = guess_mime_type(file_name, head)
+        if (claimed in _SNIFFABLE_TYPES and sniffed != claimed) or \
+                (claimed and sniffed and sniffed not in _CONTAINER_TYPES and sniffed != claimed):
+            found = sniffed or 'unrecognised content'
+            raise UploadRejected(f"{file_name} is named as {claimed} but contains {found}")
+        if allowed_types is not None and mime_type not in allowed_types:
+            raise UploadRejected(f"{file_name or 'File'} is not an accepted file type ({mime_type})")
+        detected['mime_type'] = mime_type
+
+    sha256, size = write_stream(root, fileobj, chunk_size, max_size, check_head)
+    return sha256, size, detected['mime_type']
+
+def write_blob(root, data):
+    """Store a bytes object, returning (sha256, size)"""
+    sha256 = hashlib.sha256(data).hexdigest()
+    path = blob_path(root, sha256)
+    if not _reuse(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return sha256, len(data)
+
+def open_blob(root, sha256):
+    return open(blob_path(root, sha256), 'rb')
+
+def read_blob(root, sha256):
+    with open_blob(root, sha256) as f:
+        return f.read()
+
+def iter_blobs(root):
+    """Yield (sha256, path) for every stored blob"""
+    if not os.path.isdir(root):
+        return
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if len(name) == 64 and not name.startswith('.'):
+                yield name, os.path.join(dirpath, name)
+
+def delete_unreferenced(root, referenced, grace_seconds=3600):
+    """Remove blobs whose digest is not in `referenced`.
+
+    Blobs younger than grace_seconds are kept, because an upload writes its
+    file before the row that references it is committed.
+    """
+    cutoff = time.time() - grace_seconds
+    removed = 0
+    for sha256, path in list(iter_blobs(root)):
+        if sha256 in referenced:
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
@@ -1,10 +1,22 @@
 import sqlite3
 import streamlit as st
+import atexit
 import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
 from contextlib import contextmanager
 from datetime import datetime, timedelta
 import json
-import bcrypt
+import re
+import base64
+import blob_store
+import passwords
+import query_cache
+import query_stats
+import thumbnails
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -12,191 +24,1250 @@ logger = logging.getLogger(__name__)
 
 DATABASE_NAME = 'miracle_healthcare.db'
 
+# Uploaded file bytes live on disk, addressed by SHA-256. None stores them
+# next to the database file, in <database name>_blobs/.
+BLOB_STORE_DIR = None
+
+# Previews of stored pictures and PDFs (see thumbnails.py). None keeps them
+# next to the database file, in <database name>_thumbnails/.
+THUMBNAIL_DIR = None
+
+# Connection pool settings
+POOL_SIZE = 8
+POOL_TIMEOUT = 10.0          # seconds to wait for a free connection
+POOL_IDLE_TIMEOUT = 300.0    # seconds before an idle connection is closed
+
+# Single writer settings
+WRITE_BATCH_SIZE = 100     # most queued writes group-committed in one transaction
+WRITE_TIMEOUT = 30.0       # seconds a caller waits for its write to commit
+
+# Applied once to every connection when it is opened
+CONNECTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,        # negative means KiB, so ~16 MB per connection
+    'mmap_size': 268435456,      # 256 MB
+    'busy_timeout': 5000,        # milliseconds
+    'temp_store': 'MEMORY',
+}
+
+def _open_connection(database, timeout=POOL_TIMEOUT):
+    conn = sqlite3.connect(database, check_same_thread=False, timeout=timeout)
+    conn.row_factory = sqlite3.Row
+    for pragma, value in CONNECTION_PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+    return conn
+
+class ConnectionPool:
+    """Thread-safe pool of SQLite connections for a single database file"""
+
+    def __init__(self, database, size=POOL_SIZE, timeout=POOL_TIMEOUT, idle_timeout=POOL_IDLE_TIMEOUT):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._idle = []  # (connection, returned_at), most recently used last
+        self._open = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self.stats = {'hits': 0, 'misses': 0, 'waits': 0, 'timeouts': 0, 'evictions': 0}
+
+    def _connect(self):
+        return _open_connection(self.database, self.timeout)
+
+    def _evict_idle(self):
+        """Close connections that have been idle longer than idle_timeout (lock held)"""
+        cutoff = time.monotonic() - self.idle_timeout
+        while self._idle and self._idle[0][1] < cutoff:
+            conn, _ = self._idle.pop(0)
+            self._open -= 1
+            self.stats['evictions'] += 1
+            conn.close()
+
+    def acquire(self):
+        with self._cond:
+            self._evict_idle()
+            deadline = None
+            while not self._idle and self._open >= self.size:
+                if deadline is None:
+                    self.stats['waits'] += 1
+                    deadline = time.monotonic() + self.timeout
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise sqlite3.OperationalError("Timed out waiting for a pooled database connection")
+                self._cond.wait(remaining)
+            if self._idle:
+                self.stats['hits'] += 1
+                return self._idle.pop()[0]
+            self._open += 1
+            self.stats['misses'] += 1
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard=False):
+        # A closed pool closes connections as they come back instead of keeping them
+        discard = discard or self._closed
+        if not discard:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                discard = True
+        with self._cond:
+            if discard:
+                self._open -= 1
+                conn.close()
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def close(self):
+        """Close the idle connections now and every in-use one when it is released"""
+        with self._cond:
+            self._closed = True
+            for conn, _ in self._idle:
+                conn.close()
+            self._open -= len(self._idle)
+            self._idle = []
+
+    def get_stats(self):
+        with self._cond:
+            return dict(self.stats, open=self._open, idle=len(self._idle), in_use=self._open - len(self._idle), size=self.size)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(database=None):
+    """Return the connection pool for the given (or current) database file"""
+    database = database or DATABASE_NAME
+    with _pools_lock:
+        pool = _pools.get(database)
+        if pool is None:
+            pool = _pools[database] = ConnectionPool(database)
+        return pool
+
+def get_pool_stats():
+    """Hit/wait/open-connection counters for every pool, keyed by database file"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.database: pool.get_stats() for pool in pools}
+
+class DatabaseWriter:
+    """Owns the only write connection to a database file.
+
+    Writes are queued as functions of the connection and applied in order by
+    one thread, so sessions never compete for SQLite's write lock. Requests
+    that are waiting when a batch starts are group-committed: each runs
+    under its own savepoint in one transaction, so a failing request is
+    rolled back alone and the whole batch costs a single commit. Callers get
+    a Future that resolves once their write is committed.
+    """
+
+    def __init__(self, database, batch_size=WRITE_BATCH_SIZE):
+        self.database = database
+        self.batch_size = batch_size
+        # Held while a batch or a transaction('immediate') uses the connection
+        self.lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._conn = None
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self.stats = {'requests': 0, 'batches': 0, 'failures': 0, 'largest_batch': 0}
+
+    def connection(self):
+        """The write connection; only use it while holding self.lock"""
+        if self._conn is None:
+            self._conn = _open_connection(self.database, WRITE_TIMEOUT)
+        return self._conn
+
+    def submit(self, write, tables=()):
+        """Queue write(conn) and return a Future for its result.
+
+        The cache versions of `tables` are bumped once the write commits.
+        """
+        future = Future()
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+            self._queue.put((write, tables, future))
+        return future
+
+    def execute(self, write, tables=(), timeout=WRITE_TIMEOUT):
+        """Submit a write and wait for it to commit, re-raising its error.
+
+        A write still queued after `timeout` is cancelled, never applied later.
+        """
+        future = self.submit(write, tables)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            if future.cancel():
+                raise sqlite3.OperationalError("Timed out waiting for the database writer; the write was not applied")
+            # Already in the batch being applied, so it may still commit: wait for the outcome
+            return future.result()
+
+    def _run(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            batch = [request]
+            while len(batch) < self.batch_size:
+                try:
+                    request = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._queue.put(None)
+                    break
+                batch.append(request)
+            with self.lock:
+                self._apply(batch)
+
+    def _apply(self, batch):
+        batch = [(write, tables, future) for write, tables, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        conn = None
+        outcomes = []
+        try:
+            conn = self.connection()
+            conn.execute("BEGIN IMMEDIATE")
+            for write, tables, future in batch:
+                conn.execute("SAVEPOINT request")
+                try:
+                    outcomes.append((future, tables, write(conn), None))
+                    conn.execute("RELEASE request")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO request")
+                    conn.execute("RELEASE request")
+                    outcomes.append((future, (), None, e))
+            conn.commit()
+        except Exception as e:
+            # Opening the connection, BEGIN or COMMIT failed, so nothing in the batch was written
+            if conn is not None and conn.in_transaction:
+                conn.rollback()
+            self.stats['failures'] += len(batch)
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.stats['batches'] += 1
+        self.stats['requests'] += len(batch)
+        self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+        # Bumped after the commit so no reader can cache the old rows under the new version
+        query_cache.bump_tables(*{table for _, tables, _, error in outcomes for table in tables})
+        for future, _, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                self.stats['failures'] += 1
+                future.set_exception(error)
+
+    def vacuum(self, timeout=WRITE_TIMEOUT):
+        """Run VACUUM on the write connection between batches (it cannot run inside a transaction)"""
+        if not self.lock.acquire(timeout=timeout):
+            raise sqlite3.OperationalError("Timed out waiting for the database writer")
+        try:
+            self.connection().execute("VACUUM")
+        finally:
+            self.lock.release()
+
+    def close(self):
+        """Apply every queued write, then stop the thread and close the connection"""
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+            if thread:
+                self._queue.put(None)
+        if thread:
+            thread.join()
+        with self.lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def get_stats(self):
+        return dict(self.stats, queued=self._queue.qsize(), batch_size=self.batch_size)
+
+_writers = {}
+
+def get_writer(database=None):
+    """Return the single writer for the given (or current) database file"""
+    database = database or DATABASE_NAME
+    with _pools_lock:
+        writer = _writers.get(database)
+        if writer is None:
+            writer = _writers[database] = DatabaseWriter(database)
+        return writer
+
+def get_writer_stats():
+    """Request, batch and failure counters for every writer, keyed by database file"""
+    with _pools_lock:
+        writers = list(_writers.values())
+    return {writer.database: writer.get_stats() for writer in writers}
+
+def close_all_connections():
+    """Close every pooled connection: idle ones now, ones in use when they are released"""
+    # Queued activity events need their database's writer one last time
+    flush_activity_log()
+    with _pools_lock:
+        pools = list(_pools.values())
+        writers = list(_writers.values())
+        _pools.clear()
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+    for pool in pools:
+        pool.close()
+
+_local = threading.local()
+
+class _Transaction:
+    """The transaction open on the current thread"""
+    def __init__(self, conn):
+        self.conn = conn
+        self.depth = 0
+        self.written = set()
+
+def _current_transaction():
+    return getattr(_local, 'transaction', None)
+
+query_cache.set_transaction_check(lambda: _current_transaction() is not None)
+
+def _record_write(table):
+    tx = _current_transaction()
+    if table and tx is not None:
+        tx.written.add(table)
+
+@contextmanager
+def transaction(mode='deferred'):
+    """Run the enclosed database calls as one unit of work with a single commit.
+
+    Every database.py function called inside the block joins it: nothing is
+    committed until the block exits, and an exception rolls everything back
+    and propagates instead of being reported with st.error. Nested blocks
+    become savepoints, so an inner failure can be caught without losing the
+    outer work. Yields the connection.
+
+    'immediate' is for blocks that write: they run on the database writer's
+    connection while holding its lock, so they queue behind other writes
+    instead of failing with "database is locked". 'deferred' blocks run on
+    a pooled connection and are for consistent multi-query reads: the
+    connection is read-only for the block, so a write in it (or in a block
+    nested inside it) raises sqlite3.OperationalError instead of bypassing
+    the writer.
+    """
+    if mode not in ('deferred', 'immediate'):
+        raise ValueError(f"Unknown transaction mode: {mode}")
+    tx = _current_transaction()
+    if tx is not None:
+        tx.depth += 1
+        savepoint = f"sp_{tx.depth}"
+        tx.conn.execute(f"SAVEPOINT {savepoint}")
+        try:
+            yield tx.conn
+            tx.conn.execute(f"RELEASE {savepoint}")
+        except BaseException:
+            # Some errors (e.g. SQLITE_FULL) have already rolled back the whole transaction
+            if tx.conn.in_transaction:
+                tx.conn.execute(f"ROLLBACK TO {savepoint}")
+                tx.conn.execute(f"RELEASE {savepoint}")
+            raise
+        finally:
+            tx.depth -= 1
+        return
+
+    if mode == 'immediate':
+        writer = get_writer()
+        if not writer.lock.acquire(timeout=WRITE_TIMEOUT):
+            raise sqlite3.OperationalError("Timed out waiting for the database writer")
+        try:
+            conn = writer.connection()
+        except BaseException:
+            writer.lock.release()
+            raise
+        release = writer.lock.release
+    else:
+        pool = get_pool()
+        conn = pool.acquire()
+
+        def release():
+            try:
+                conn.execute("PRAGMA query_only = OFF")
+            except sqlite3.Error:
+                pool.release(conn, discard=True)
+            else:
+                pool.release(conn)
+
+    tx = _local.transaction = _Transaction(conn)
+    try:
+        if mode == 'deferred':
+            conn.execute("PRAGMA query_only = ON")
+        conn.execute(f"BEGIN {mode.upper()}")
+        yield conn
+        conn.commit()
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        _local.transaction = None
+        release()
+    # Bumped after the commit so no reader can cache the old rows under the new version
+    query_cache.bump_tables(*tx.written)
+
+def _report_query_error(e):
+    """Show a failed query to the user, or re-raise it to the open transaction"""
+    if _current_transaction() is not None:
+        raise e
+    logger.error(f"Database query error: {str(e)}")
+    st.error(f"Database query error: {str(e)}")
+
 @contextmanager
 def get_db_connection():
-    """Create a database connection with proper error handling"""
+    """Borrow a pooled database connection with proper error handling.
+
+    Inside transaction() this is the transaction's connection, which the
+    caller must not commit, and errors propagate to the transaction.
+    """
+    tx = _current_transaction()
+    if tx is not None:
+        yield tx.conn
+        return
+    pool = None
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE_NAME, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
+        pool = get_pool()
+        conn = pool.acquire()
         yield conn
     except sqlite3.Error as e:
         logger.error(f"Database connection error: {str(e)}")
         st.error(f"Database connection error: {str(e)}")
     finally:
         if conn:
-            conn.close()
+            pool.release(conn)
+
+# Table written by an INSERT/REPLACE/UPDATE/DELETE statement
+_WRITE_TARGET = re.compile(r'^\s*(?:INSERT|REPLACE|UPDATE|DELETE)(?:\s+OR\s+\w+)?(?:\s+INTO|\s+FROM)?\s+["`\[]?(\w+)', re.IGNORECASE)
+
+def written_table(query):
+    match = _WRITE_TARGET.match(query)
+    return match.group(1).lower() if match else None
+
+# Statements whose plan is captured when they run slowly
+_EXPLAINABLE = re.compile(r'^\s*(?:SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+
+def _blob_bytes(values):
+    if isinstance(values, dict):
+        values = values.values()
+    return sum(len(value) for value in values or () if isinstance(value, (bytes, memoryview)))
+
+def _run_query(conn, query, params=(), fetch=True):
+    """Execute one statement and record its cost in query_stats.
+
+    Returns the fetched rows, or the cursor when fetch is False. A slow
+    statement has its EXPLAIN QUERY PLAN captured and logged once.
+    """
+    start = time.perf_counter()
+    try:
+        cursor = conn.execute(query, params or ())
+        rows = cursor.fetchall() if fetch else None
+    except sqlite3.Error:
+        query_stats.record(query, time.perf_counter() - start, error=True)
+        raise
+    elapsed = time.perf_counter() - start
+    if fetch:
+        slow = query_stats.record(query, elapsed, len(rows), sum(_blob_bytes(tuple(row)) for row in rows))
+    else:
+        slow = query_stats.record(query, elapsed, max(cursor.rowcount, 0), _blob_bytes(params))
+    if slow and _EXPLAINABLE.match(query) and query_stats.needs_plan(query):
+        try:
+            plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params or ())]
+            query_stats.record_plan(query, plan, elapsed)
+        except sqlite3.Error:
+            pass
+    return rows if fetch else cursor
+
+def get_query_stats(top=None, order_by='total_ms'):
+    """Per-statement call counts, latency percentiles, rows and BLOB bytes (see query_stats)"""
+    return query_stats.snapshot(top, order_by)
+
+def reset_query_stats():
+    query_stats.reset()
 
 def execute_db_query(query, params=None, fetch=True):
     """Execute database query with proper error handling"""
+    if not fetch and _current_transaction() is None:
+        # Writes outside a transaction are queued to the database's single writer
+        table = written_table(query)
+        try:
+            get_writer().execute(lambda conn: _run_query(conn, query, params, fetch=False), (table,) if table else ())
+            return True
+        except sqlite3.Error as e:
+            _report_query_error(e)
+            return None
     try:
         with get_db_connection() as conn:
-            cursor = conn.cursor()
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
-            
             if fetch:
-                result = cursor.fetchall()
+                result = _run_query(conn, query, params)
             else:
-                conn.commit()
+                _run_query(conn, query, params, fetch=False)
+                # Committed, and the cache bumped, when the transaction ends
+                _record_write(written_table(query))
                 result = True
             
             return result
     except sqlite3.Error as e:
-        logger.error(f"Database query error: {str(e)}")
-        st.error(f"Database query error: {str(e)}")
+        _report_query_error(e)
         return None
 
-def init_db():
+BULK_CHUNK_SIZE = 500
+
+def execute_many(query, rows, chunk_size=BULK_CHUNK_SIZE):
+    """Run one write statement for many parameter rows with one commit per chunk.
+
+    Returns one outcome per row, in order: {'ok': True} or
+    {'ok': False, 'error': message}. Each chunk is first written with
+    executemany. If any row fails, the chunk is rolled back and replayed row
+    by row in the same transaction, each row under its own savepoint, so
+    the good rows still commit and every failure is reported. Inside
+    transaction() the chunks are savepoints of the caller's transaction.
+    """
+    rows = list(rows)
+    table = written_table(query)
+    outcomes = []
     try:
-        with get_db_connection() as conn:
-            c = conn.cursor()
-            
-            # Users table
-            c.execute('''CREATE TABLE IF NOT EXISTS users
-                         (id INTEGER PRIMARY KEY,
-                          email TEXT UNIQUE,
-                          password BLOB,
-                          first_name TEXT,
-                          last_name TEXT,
-                          mobile TEXT,
-                          role TEXT,
-                          registration_date TEXT,
-                          last_login TEXT,
-                          last_activity TEXT,
-                          status TEXT DEFAULT 'active',
-                          profile_locked BOOLEAN DEFAULT 0,
-                          profile_picture BLOB,
-                          home_address TEXT,
-                          age INTEGER,
-                          location TEXT,
-                          country TEXT,
-                          reset_token TEXT)''')
-            
-            # Applications table
-            c.execute('''CREATE TABLE IF NOT EXISTS applications
-                         (id INTEGER PRIMARY KEY,
-                          user_id INTEGER,
-                          application_data TEXT,
-                          status TEXT,
-                          submitted_date TEXT,
-                          last_modified TEXT,
-                          resume BLOB,
-                          cover_letter BLOB,
-                          FOREIGN KEY (user_id) REFERENCES users(id))''')
-            
-            # Documents table
-            c.execute('''CREATE TABLE IF NOT EXISTS documents
-                         (id INTEGER PRIMARY KEY,
-                          user_id INTEGER,
-                          file_name TEXT,
-                          file_data BLOB,
-                          file_type TEXT,
-                          upload_date TEXT,
-                          viewed BOOLEAN DEFAULT 0,
-                          FOREIGN KEY (user_id) REFERENCES users(id))''')
-            
-            # Messages table
-            c.execute('''CREATE TABLE IF NOT EXISTS messages
-                         (id INTEGER PRIMARY KEY,
-                          sender_id INTEGER,
-                          recipient_id INTEGER,
-                          message TEXT,
-                          sent_date TEXT,
-                          read_status BOOLEAN DEFAULT 0,
-                          FOREIGN KEY (sender_id) REFERENCES users(id),
-                          FOREIGN KEY (recipient_id) REFERENCES users(id))''')
-            
-            # Edit requests table
-            c.execute('''CREATE TABLE IF NOT EXISTS edit_requests
-                         (id INTEGER PRIMARY KEY,
-                          user_id INTEGER,
-                          request_reason TEXT,
-                          requested_changes TEXT,
-                          request_date TEXT,
-                          status TEXT DEFAULT 'pending',
-                          admin_response TEXT,
-                          response_date TEXT,
-                          FOREIGN KEY (user_id) REFERENCES users(id))''')
-            
-            # Screening tests table
-            c.execute('''CREATE TABLE IF NOT EXISTS screening_tests
-                         (id INTEGER PRIMARY KEY,
-                          title TEXT,
-                          description TEXT,
-                          questions TEXT,
-                          duration INTEGER,
-                          created_by INTEGER,
-                          creation_date TEXT,
-                          FOREIGN KEY (created_by) REFERENCES users(id))''')
-            
-            # Test assignments table
-            c.execute('''CREATE TABLE IF NOT EXISTS test_assignments
-                         (id INTEGER PRIMARY KEY,
-                          test_id INTEGER,
-                          candidate_id INTEGER,
-                          assigned_date TEXT,
-                          start_time TEXT,
-                          end_time TEXT,
-                          status TEXT,
-                          score INTEGER,
-                          responses TEXT,
-                          FOREIGN KEY (test_id) REFERENCES screening_tests(id),
-                          FOREIGN KEY (candidate_id) REFERENCES users(id))''')
-
-            # Positions table
-            c.execute('''CREATE TABLE IF NOT EXISTS positions
-                         (id INTEGER PRIMARY KEY,
-                          title TEXT UNIQUE,
-                          description TEXT,
-                          required_staff INTEGER,
-                          filled_staff INTEGER DEFAULT 0,
-                          created_at TEXT)''')
-            
-            # Activities table
-            c.execute('''CREATE TABLE IF NOT EXISTS activities
-                         (id INTEGER PRIMARY KEY,
-                          activity_type TEXT,
-                          details TEXT,
-                          timestamp TEXT)''')
-            
-            # App settings table
-            c.execute('''CREATE TABLE IF NOT EXISTS app_settings
-                         (key TEXT PRIMARY KEY,
-                          value TEXT)''')
-            
-            # Interviews table
-            c.execute('''CREATE TABLE IF NOT EXISTS interviews
-                         (id INTEGER PRIMARY KEY,
-                          candidate_id INTEGER,
-                          date TEXT,
-                          time TEXT,
-                          type TEXT,
-                          role TEXT,
-                          dress_code TEXT,
-                          stage TEXT,
-                          status TEXT,
-                          candidate_response TEXT,
-                          candidate_note TEXT,
-                          FOREIGN KEY (candidate_id) REFERENCES users(id))''')
-            
-            # Initialize filled_positions in app_settings if not exists
-            c.execute("INSERT OR IGNORE INTO app_settings (key, value) VALUES ('filled_positions', '0')")
-            
-            # Create admin user if not exists
-            c.execute("SELECT * FROM users WHERE email = 'admin@admin.com'")
-            if not c.fetchone():
-                now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                hashed_password = bcrypt.hashpw('12345'.encode(), bcrypt.gensalt())
-                c.execute('''INSERT INTO users 
-                             (email, password, first_name, last_name, mobile, role, 
-                              registration_date, last_login, last_activity)
-                             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                             ('admin@admin.com', hashed_password, 'Admin', 'User', '1234567890', 'admin', now, now, now))
-            
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            try:
+                with transaction('immediate') as conn:
+                    chunk_started = time.perf_counter()
+                    conn.executemany(query, chunk)
+                    query_stats.record(query, time.perf_counter() - chunk_started, len(chunk), sum(_blob_bytes(params) for params in chunk))
+                    _record_write(table)
+                chunk_outcomes = [{'ok': True} for _ in chunk]
+            except sqlite3.Error:
+                chunk_outcomes = []
+                with transaction('immediate') as conn:
+                    _record_write(table)
+                    for params in chunk:
+                        try:
+                            with transaction():
+                                _run_query(conn, query, params, fetch=False)
+                            chunk_outcomes.append({'ok': True})
+                        except sqlite3.Error as e:
+                            chunk_outcomes.append({'ok': False, 'error': str(e)})
+            outcomes.extend(chunk_outcomes)
+    except sqlite3.Error as e:
+        _report_query_error(e)
+
+    # Rows never reached because the connection or a commit failed
+    outcomes.extend({'ok': False, 'error': 'not executed'} for _ in rows[len(outcomes):])
+    failed = [o for o in outcomes if not o['ok']]
+    if failed:
+        logger.error(f"Bulk write: {len(failed)} of {len(rows)} rows failed, first error: {failed[0]['error']}")
+    return outcomes
+
+def _cache_scope():
+    return DATABASE_NAME
+
+def get_cache_stats():
+    return query_cache.get_cache_stats()
+
+DEFAULT_PAGE_SIZE = 25
+COUNT_ESTIMATE_LIMIT = 10000  # totals are counted up to this many rows, then reported as "10000+"
+
+def _encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def _decode_cursor(cursor):
+    return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+
+def fetch_page(query, params=(), sort_keys=('id',), page_size=DEFAULT_PAGE_SIZE, cursor=None,
+               descending=True, include_total=False):
+    """Keyset-paginate a SELECT statement.
+
+    `query` is a SELECT without ORDER BY or LIMIT whose result includes every
+    column named in `sort_keys`; the last sort key must be unique (normally
+    the row id) and none may be NULL. Rows are ordered by the sort keys, so
+    the cost of a page depends on page_size and an index on the sort keys,
+    never on how deep into the result the page is.
+
+    Returns {'rows', 'next_cursor', 'prev_cursor', 'total', 'total_capped'}.
+    Pass either cursor back to move one page forward or back. `total` is
+    only counted when include_total is set, and stops at COUNT_ESTIMATE_LIMIT
+    (total_capped is then True).
+    """
+    base_params = tuple(params)
+    params = list(params)
+    key_list = ', '.join(sort_keys)
+    placeholders = ', '.join('?' for _ in sort_keys)
+    backwards = False
+    where = ""
+    if cursor:
+        position = _decode_cursor(cursor)
+        backwards = position['dir'] == 'prev'
+        # Moving back through a descending list means walking the keys upwards
+        after = '>' if descending == backwards else '<'
+        where = f"WHERE ({key_list}) {after} ({placeholders})"
+        params.extend(position['key'])
+    ascending = descending == backwards
+    order = ', '.join(f"{key} {'ASC' if ascending else 'DESC'}" for key in sort_keys)
+
+    paged_query = f"SELECT * FROM ({query}) {where} ORDER BY {order} LIMIT ?"
+    results = execute_db_query(paged_query, (*params, page_size + 1)) or []
+    has_more = len(results) > page_size
+    rows = [dict(r) for r in results[:page_size]]
+    if backwards:
+        rows.reverse()
+
+    def key_of(row):
+        return [row[key] for key in sort_keys]
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_more or backwards:
+            next_cursor = _encode_cursor({'dir': 'next', 'key': key_of(rows[-1])})
+        if (has_more and backwards) or (cursor and not backwards):
+            prev_cursor = _encode_cursor({'dir': 'prev', 'key': key_of(rows[0])})
+
+    total = None
+    if include_total:
+        count_query = f"SELECT COUNT(*) FROM ({query} LIMIT {COUNT_ESTIMATE_LIMIT})"
+        count = execute_db_query(count_query, base_params)
+        total = count[0][0] if count else 0
+    return {
+        'rows': rows,
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor,
+        'total': total,
+        'total_capped': total is not None and total >= COUNT_ESTIMATE_LIMIT
+    }
+
+def get_blob_root():
+    return BLOB_STORE_DIR or f"{os.path.splitext(DATABASE_NAME)[0]}_blobs"
+
+def get_thumbnail_root():
+    return THUMBNAIL_DIR or f"{os.path.splitext(DATABASE_NAME)[0]}_thumbnails"
+
+def get_thumbnail(sha256, mime_type, size='small'):
+    """Resized preview (WebP or JPEG bytes) of a stored picture or PDF, or None.
+
+    size is a key of thumbnails.RENDITIONS. Renditions are cached on disk,
+    so only the first request for one reads the original.
+    """
+    blob_root = get_blob_root()
+    return thumbnails.get_thumbnail(get_thumbnail_root(), lambda: blob_store.open_blob(blob_root, sha256),
+                                    sha256, mime_type, size)
+
+def get_thumbnail_stats():
+    return thumbnails.get_thumbnail_stats()
+
+def _file_ref(blob_root, sha256, size, mime_type):
+    thumbnails.generate_later(get_thumbnail_root(), lambda: blob_store.open_blob(blob_root, sha256), sha256, mime_type)
+    return {'sha256': sha256, 'size': size, 'mime_type': mime_type}
+
+def store_file(data, file_name=None):
+    """Write file bytes to the blob store; returns {'sha256', 'size', 'mime_type'} or None.
+
+    A reference already returned by store_upload is passed through unchanged.
+    """
+    if data is None or isinstance(data, dict):
+        return data
+    blob_root = get_blob_root()
+    sha256, size = blob_store.write_blob(blob_root, data)
+    return _file_ref(blob_root, sha256, size, blob_store.guess_mime_type(file_name, data[:64]))
+
+def store_upload(fileobj, file_name=None, max_size=None, allowed_types=None):
+    """Stream an uploaded file object into the blob store without reading it whole.
+
+    Returns the same reference as store_file, or None for no file. Raises
+    blob_store.UploadRejected, leaving nothing behind, if the file is empty,
+    larger than max_size bytes, or its content is not an allowed type or
+    does not match its name.
+    """
+    if fileobj is None:
+        return None
+    if hasattr(fileobj, 'seek'):
+        fileobj.seek(0)
+    blob_root = get_blob_root()
+    sha256, size, mime_type = blob_store.ingest_stream(blob_root, fileobj, file_name or getattr(fileobj, 'name', None),
+                                                       max_size, allowed_types)
+    return _file_ref(blob_root, sha256, size, mime_type)
+
+def load_file(sha256):
+    """Read file bytes from the blob store, or None if the blob is missing"""
+    try:
+        return blob_store.read_blob(get_blob_root(), sha256)
+    except FileNotFoundError:
+        logger.error(f"Blob {sha256} is referenced but missing from {get_blob_root()}")
+        return None
+
+def _hydrate_file(row, column):
+    """Replace a row's (now empty) BLOB column with the bytes its reference points to"""
+    sha256 = row.get(f'{column}_sha256')
+    if sha256:
+        row[column] = load_file(sha256)
+    return row
+
+def collect_blob_garbage(grace_seconds=3600):
+    """Delete stored files that no row references any more (run daily by run_maintenance)"""
+    query = """
+        SELECT file_data_sha256 FROM documents WHERE file_data_sha256 IS NOT NULL
+        UNION SELECT resume_sha256 FROM applications WHERE resume_sha256 IS NOT NULL
+        UNION SELECT cover_letter_sha256 FROM applications WHERE cover_letter_sha256 IS NOT NULL
+        UNION SELECT profile_picture_sha256 FROM users WHERE profile_picture_sha256 IS NOT NULL
+    """
+    result = execute_db_query(query)
+    if result is None:
+        return 0
+    referenced = {r[0] for r in result}
+    return blob_store.delete_unreferenced(get_blob_root(), referenced, grace_seconds)
+
+def compact_database():
+    """Reclaim the space freed by moving BLOBs out (rewrites the whole file, run off-hours)"""
+    try:
+        if _current_transaction() is not None:
+            raise sqlite3.OperationalError("cannot VACUUM from within a transaction")
+        get_writer().vacuum()
+        return True
+    except sqlite3.Error as e:
+        _report_query_error(e)
+        return None
+
+def _migration_001_initial_schema(c):
+    # Users table
+    c.execute('''CREATE TABLE IF NOT EXISTS users
+                 (id INTEGER PRIMARY KEY,
+                  email TEXT UNIQUE,
+                  password BLOB,
+                  first_name TEXT,
+                  last_name TEXT,
+                  mobile TEXT,
+                  role TEXT,
+                  registration_date TEXT,
+                  last_login TEXT,
+                  last_activity TEXT,
+                  status TEXT DEFAULT 'active',
+                  profile_locked BOOLEAN DEFAULT 0,
+                  profile_picture BLOB,
+                  home_address TEXT,
+                  age INTEGER,
+                  location TEXT,
+                  country TEXT,
+                  reset_token TEXT)''')
+    
+    # Applications table
+    c.execute('''CREATE TABLE IF NOT EXISTS applications
+                 (id INTEGER PRIMARY KEY,
+                  user_id INTEGER,
+                  application_data TEXT,
+                  status TEXT,
+                  submitted_date TEXT,
+                  last_modified TEXT,
+                  resume BLOB,
+                  cover_letter BLOB,
+                  FOREIGN KEY (user_id) REFERENCES users(id))''')
+    
+    # Documents table
+    c.execute('''CREATE TABLE IF NOT EXISTS documents
+                 (id INTEGER PRIMARY KEY,
+                  user_id INTEGER,
+                  file_name TEXT,
+                  file_data BLOB,
+                  file_type TEXT,
+                  upload_date TEXT,
+                  viewed BOOLEAN DEFAULT 0,
+                  FOREIGN KEY (user_id) REFERENCES users(id))''')
+    
+    # Messages table
+    c.execute('''CREATE TABLE IF NOT EXISTS messages
+                 (id INTEGER PRIMARY KEY,
+                  sender_id INTEGER,
+                  recipient_id INTEGER,
+                  message TEXT,
+                  sent_date TEXT,
+                  read_status BOOLEAN DEFAULT 0,
+                  FOREIGN KEY (sender_id) REFERENCES users(id),
+                  FOREIGN KEY (recipient_id) REFERENCES users(id))''')
+    
+    # Edit requests table
+    c.execute('''CREATE TABLE IF NOT EXISTS edit_requests
+                 (id INTEGER PRIMARY KEY,
+                  user_id INTEGER,
+                  request_reason TEXT,
+                  requested_changes TEXT,
+                  request_date TEXT,
+                  status TEXT DEFAULT 'pending',
+                  admin_response TEXT,
+                  response_date TEXT,
+                  FOREIGN KEY (user_id) REFERENCES users(id))''')
+    
+    # Screening tests table
+    c.execute('''CREATE TABLE IF NOT EXISTS screening_tests
+                 (id INTEGER PRIMARY KEY,
+                  title TEXT,
+                  description TEXT,
+                  questions TEXT,
+                  duration INTEGER,
+                  created_by INTEGER,
+                  creation_date TEXT,
+                  FOREIGN KEY (created_by) REFERENCES users(id))''')
+    
+    # Test assignments table
+    c.execute('''CREATE TABLE IF NOT EXISTS test_assignments
+                 (id INTEGER PRIMARY KEY,
+                  test_id INTEGER,
+                  candidate_id INTEGER,
+                  assigned_date TEXT,
+                  start_time TEXT,
+                  end_time TEXT,
+                  status TEXT,
+                  score INTEGER,
+                  responses TEXT,
+                  FOREIGN KEY (test_id) REFERENCES screening_tests(id),
+                  FOREIGN KEY (candidate_id) REFERENCES users(id))''')
+
+    # Positions table
+    c.execute('''CREATE TABLE IF NOT EXISTS positions
+                 (id INTEGER PRIMARY KEY,
+                  title TEXT UNIQUE,
+                  description TEXT,
+                  required_staff INTEGER,
+                  filled_staff INTEGER DEFAULT 0,
+                  created_at TEXT)''')
+    
+    # Activities table
+    c.execute('''CREATE TABLE IF NOT EXISTS activities
+                 (id INTEGER PRIMARY KEY,
+                  activity_type TEXT,
+                  details TEXT,
+                  timestamp TEXT)''')
+    
+    # App settings table
+    c.execute('''CREATE TABLE IF NOT EXISTS app_settings
+                 (key TEXT PRIMARY KEY,
+                  value TEXT)''')
+    
+    # Interviews table
+    c.execute('''CREATE TABLE IF NOT EXISTS interviews
+                 (id INTEGER PRIMARY KEY,
+                  candidate_id INTEGER,
+                  date TEXT,
+                  time TEXT,
+                  type TEXT,
+                  role TEXT,
+                  dress_code TEXT,
+                  stage TEXT,
+                  status TEXT,
+                  candidate_response TEXT,
+                  candidate_note TEXT,
+                  FOREIGN KEY (candidate_id) REFERENCES users(id))''')
+
+def _migration_002_lookup_indexes(c):
+    # Each index matches a WHERE/ORDER BY used by the query functions below
+    c.execute("CREATE INDEX IF NOT EXISTS idx_users_role ON users(role)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_users_last_login ON users(last_login)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_users_reset_token ON users(reset_token) WHERE reset_token IS NOT NULL")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_applications_user ON applications(user_id, submitted_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_applications_status ON applications(status)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_documents_user ON documents(user_id, upload_date, file_name, file_type)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_messages_recipient ON messages(recipient_id, sent_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_messages_sender ON messages(sender_id, sent_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_interviews_candidate ON interviews(candidate_id, date, time)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_interviews_schedule ON interviews(date, time)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_interviews_status ON interviews(status)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_test_assignments_candidate ON test_assignments(candidate_id, assigned_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_test_assignments_test ON test_assignments(test_id, candidate_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_edit_requests_status ON edit_requests(status, request_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_screening_tests_created ON screening_tests(creation_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_positions_created ON positions(created_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_activities_timestamp ON activities(timestamp)")
+
+def _move_blobs_to_store(c, table, column, default_name=None, name_column=None):
+    """Stream every inline BLOB in table.column into the blob store and clear it"""
+    root = get_blob_root()
+    select_name = f", {name_column}" if name_column else ""
+    rows = c.execute(f"SELECT id{select_name} FROM {table} WHERE {column} IS NOT NULL").fetchall()
+    for row in rows:
+        file_name = row[1] if name_column else default_name
+        with c.connection.blobopen(table, column, row[0], readonly=True) as blob:
+            head = blob.read(64)
+            blob.seek(0)
+            sha256, size = blob_store.write_stream(root, blob)
+        c.execute(f"""UPDATE {table}
+                      SET {column}_sha256 = ?, {column}_size = ?, {column}_mime = ?, {column} = NULL
+                      WHERE id = ?""",
+                  (sha256, size, blob_store.guess_mime_type(file_name, head), row[0]))
+
+def _migration_003_blob_store(c):
+    c.execute("ALTER TABLE documents ADD COLUMN file_data_sha256 TEXT")
+    c.execute("ALTER TABLE documents ADD COLUMN file_data_size INTEGER")
+    c.execute("ALTER TABLE documents ADD COLUMN file_data_mime TEXT")
+    for column in ('resume', 'cover_letter'):
+        c.execute(f"ALTER TABLE applications ADD COLUMN {column}_sha256 TEXT")
+        c.execute(f"ALTER TABLE applications ADD COLUMN {column}_size INTEGER")
+        c.execute(f"ALTER TABLE applications ADD COLUMN {column}_mime TEXT")
+    c.execute("ALTER TABLE users ADD COLUMN profile_picture_sha256 TEXT")
+    c.execute("ALTER TABLE users ADD COLUMN profile_picture_size INTEGER")
+    c.execute("ALTER TABLE users ADD COLUMN profile_picture_mime TEXT")
+
+    _move_blobs_to_store(c, 'documents', 'file_data', name_column='file_name')
+    _move_blobs_to_store(c, 'applications', 'resume', default_name='resume.pdf')
+    _move_blobs_to_store(c, 'applications', 'cover_letter', default_name='cover_letter.pdf')
+    _move_blobs_to_store(c, 'users', 'profile_picture')
+
+def _migration_004_document_listing_indexes(c):
+    # Keyset pagination of the admin document list, newest first
+    c.execute("CREATE INDEX IF NOT EXISTS idx_documents_upload ON documents(upload_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_documents_type ON documents(file_type, upload_date)")
+
+def _migration_005_pagination_indexes(c):
+    # Keyset pagination of the admin message list
+    c.execute("CREATE INDEX IF NOT EXISTS idx_messages_sent ON messages(sent_date)")
+
+def _migration_006_candidate_search(c):
+    # One search document per candidate: profile fields plus the searchable
+    # parts of every application they submitted. Malformed application JSON
+    # is skipped rather than failing the write that fired the trigger.
+    applications = """(SELECT CASE WHEN json_valid(application_data) THEN application_data END AS data
+                       FROM applications WHERE user_id = u.id) a"""
+    c.execute(f"""CREATE VIEW IF NOT EXISTS candidate_search_source AS
+                  SELECT u.id AS id, u.first_name, u.last_name, u.email,
+                         (SELECT group_concat(json_extract(a.data, '$.professional_info.position'), ' ')
+                          FROM {applications}) AS position,
+                         (SELECT group_concat(json_extract(a.data, '$.professional_info.current_employer'), ' ')
+                          FROM {applications}) AS employer,
+                         (SELECT group_concat(j.value, ' ')
+                          FROM {applications}, json_each(a.data, '$.skills') j) AS skills,
+                         (SELECT group_concat(j.value, ' ')
+                          FROM {applications}, json_each(a.data, '$.certifications') j) AS certifications,
+                         (SELECT group_concat(COALESCE(json_extract(a.data, '$.education.highest_degree'), '') || ' ' ||
+                                              COALESCE(json_extract(a.data, '$.education.institution'), ''), ' ')
+                          FROM {applications}) AS education
+                  FROM users u
+                  WHERE u.role = 'candidate'""")
+    c.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS candidate_search USING fts5(
+                     first_name, last_name, email, position, employer, skills, certifications, education,
+                     tokenize = 'unicode61 remove_diacritics 2',
+                     prefix = '2 3')""")
+    # Name and email matches outrank matches inside the application
+    c.execute("""INSERT INTO candidate_search (candidate_search, rank)
+                 VALUES ('rank', 'bm25(10.0, 10.0, 5.0, 4.0, 2.0, 3.0, 2.0, 1.0)')""")
+
+    refresh = """
+        DELETE FROM candidate_search WHERE rowid = {user_id};
+        INSERT INTO candidate_search (rowid, first_name, last_name, email, position, employer, skills, certifications, education)
+        SELECT * FROM candidate_search_source WHERE id = {user_id};
+    """
+    triggers = [
+        ('candidate_search_user_insert', 'AFTER INSERT ON users', refresh.format(user_id='NEW.id')),
+        ('candidate_search_user_update', 'AFTER UPDATE OF first_name, last_name, email, role ON users',
+         refresh.format(user_id='OLD.id') + refresh.format(user_id='NEW.id')),
+        ('candidate_search_user_delete', 'AFTER DELETE ON users',
+         "DELETE FROM candidate_search WHERE rowid = OLD.id;"),
+        ('candidate_search_application_insert', 'AFTER INSERT ON applications', refresh.format(user_id='NEW.user_id')),
+        ('candidate_search_application_update', 'AFTER UPDATE OF application_data, user_id ON applications',
+         refresh.format(user_id='OLD.user_id') + refresh.format(user_id='NEW.user_id')),
+        ('candidate_search_application_delete', 'AFTER DELETE ON applications', refresh.format(user_id='OLD.user_id')),
+    ]
+    for name, event, body in triggers:
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END")
+
+    c.execute("""INSERT INTO candidate_search (rowid, first_name, last_name, email, position, employer, skills, certifications, education)
+                 SELECT * FROM candidate_search_source""")
+
+# Dashboard counters kept in metric_counters by triggers:
+# (table, columns whose update can move the counter, counter name, amount).
+# {row} is replaced by NEW/OLD in triggers and by the table name when rebuilding.
+METRIC_COUNTERS = [
+    ('users', 'role', "'candidates'", "CASE WHEN {row}.role = 'candidate' THEN 1 ELSE 0 END"),
+    ('applications', 'status', "'applications.status:' || COALESCE({row}.status, '')", "1"),
+    ('interviews', 'status', "'interviews.status:' || COALESCE({row}.status, '')", "1"),
+    ('positions', 'filled_staff', "'positions.filled_staff'", "COALESCE({row}.filled_staff, 0)"),
+]
+
+def _counter_upsert(name, amount, row, sign=''):
+    return f"""INSERT INTO metric_counters (name, value)
+               VALUES ({name.format(row=row)}, {sign}({amount.format(row=row)}))
+               ON CONFLICT(name) DO UPDATE SET value = value + excluded.value;"""
+
+def _expected_metric_counters_query():
+    return " UNION ALL ".join(
+        f"SELECT {name.format(row=table)} AS name, SUM({amount.format(row=table)}) AS value FROM {table} GROUP BY 1"
+        for table, _, name, amount in METRIC_COUNTERS
+    )
+
+def _migration_007_metric_counters(c):
+    c.execute("""CREATE TABLE IF NOT EXISTS metric_counters
+                 (name TEXT PRIMARY KEY,
+                  value INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID""")
+    for table, columns, name, amount in METRIC_COUNTERS:
+        c.execute(f"""CREATE TRIGGER IF NOT EXISTS metrics_{table}_insert AFTER INSERT ON {table}
+                      BEGIN {_counter_upsert(name, amount, 'NEW')} END""")
+        c.execute(f"""CREATE TRIGGER IF NOT EXISTS metrics_{table}_update AFTER UPDATE OF {columns} ON {table}
+                      BEGIN {_counter_upsert(name, amount, 'OLD', '-')} {_counter_upsert(name, amount, 'NEW')} END""")
+        c.execute(f"""CREATE TRIGGER IF NOT EXISTS metrics_{table}_delete AFTER DELETE ON {table}
+                      BEGIN {_counter_upsert(name, amount, 'OLD', '-')} END""")
+    c.execute("DELETE FROM metric_counters")
+    c.execute(f"INSERT INTO metric_counters (name, value) {_expected_metric_counters_query()}")
+
+def _migration_008_activity_log(c):
+    c.execute("ALTER TABLE activities ADD COLUMN user_id INTEGER")
+    c.execute("ALTER TABLE activities ADD COLUMN entity TEXT")
+    c.execute("ALTER TABLE activities ADD COLUMN entity_id INTEGER")
+    # Older rows only mention their user as "user_id: N" inside details
+    c.execute("""UPDATE activities
+                 SET user_id = CAST(substr(details, instr(details, 'user_id: ') + 9) AS INTEGER)
+                 WHERE instr(details, 'user_id: ') > 0
+                   AND substr(details, instr(details, 'user_id: ') + 9) GLOB '[0-9]*'""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_activities_user ON activities(user_id, timestamp)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_activities_entity ON activities(entity, entity_id, timestamp)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_activities_type ON activities(activity_type, timestamp)")
+
+# application_data fields projected into VIRTUAL generated columns, so they
+# can be filtered, sorted and indexed without parsing JSON in Python.
+# Rows whose data is not valid JSON read as NULL instead of failing.
+APPLICATION_FIELDS = [
+    ('position', 'TEXT', '$.professional_info.position'),
+    ('years_experience', 'INTEGER', '$.professional_info.years_experience'),
+    ('visa_type', 'TEXT', '$.work_authorization.visa_type'),
+    ('work_authorized', 'INTEGER', '$.work_authorization.authorized'),
+    ('start_date', 'TEXT', '$.additional_info.start_date'),
+]
+
+def _migration_009_application_fields(c):
+    for column, column_type, path in APPLICATION_FIELDS:
+        c.execute(f"""ALTER TABLE applications ADD COLUMN {column} {column_type}
+                      GENERATED ALWAYS AS (CASE WHEN json_valid(application_data)
+                                                THEN json_extract(application_data, '{path}') END) VIRTUAL""")
+    # Indexes store the extracted values, filling them in for existing rows
+    c.execute("CREATE INDEX IF NOT EXISTS idx_applications_position ON applications(position, years_experience)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_applications_experience ON applications(years_experience)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_applications_visa ON applications(visa_type)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_applications_start ON applications(start_date)")
+
+def _migration_010_candidate_list_indexes(c):
+    # Keyset pagination of the filtered candidate grid; rowid (id) follows the
+    # indexed columns, so each equality filter still walks ids in order
+    c.execute("CREATE INDEX IF NOT EXISTS idx_users_role_status ON users(role, status)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_users_role_registered ON users(role, registration_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_users_role_name ON users(role, last_name, first_name)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_applications_position_user ON applications(position, user_id)")
+
+# Login event rollups: table -> bucket expression over an event time.
+# Triggers add every new event to each table, and nothing takes it away
+# again, so the rollups outlive pruning of login_events.
+LOGIN_ROLLUPS = {
+    'hour': ('login_counts_hourly', "strftime('%Y-%m-%d %H:00', {time})"),
+    'day': ('login_counts_daily', "date({time})"),
+}
+
+def _migration_011_login_events(c):
+    c.execute("""CREATE TABLE IF NOT EXISTS login_events
+                 (id INTEGER PRIMARY KEY,
+                  user_id INTEGER,
+                  event TEXT NOT NULL,
+                  occurred_at TEXT NOT NULL)""")
+    rollup_inserts = []
+    for table, bucket in LOGIN_ROLLUPS.values():
+        c.execute(f"""CREATE TABLE IF NOT EXISTS {table}
+                      (bucket TEXT NOT NULL,
+                       event TEXT NOT NULL,
+                       count INTEGER NOT NULL DEFAULT 0,
+                       PRIMARY KEY (bucket, event)) WITHOUT ROWID""")
+        rollup_inserts.append(f"""INSERT INTO {table} (bucket, event, count)
+                                  VALUES ({bucket.format(time='NEW.occurred_at')}, NEW.event, 1)
+                                  ON CONFLICT(bucket, event) DO UPDATE SET count = count + 1;""")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS login_events_rollup AFTER INSERT ON login_events
+                  BEGIN {' '.join(rollup_inserts)} END""")
+    # last_login is the only history older databases have: one login per user
+    c.execute("""INSERT INTO login_events (user_id, event, occurred_at)
+                 SELECT id, 'login', last_login FROM users
+                 WHERE datetime(last_login) IS NOT NULL
+                 ORDER BY last_login""")
+
+# Conversation bookkeeping kept by triggers on messages. A message joins the
+# conversation of its two users (created on first contact), and each user's
+# conversation_participants row carries their unread count and the time of
+# the latest message, which orders their inbox.
+_MESSAGE_PAIR = "MIN({row}.sender_id, {row}.recipient_id), MAX({row}.sender_id, {row}.recipient_id)"
+
+def _participant_upsert(user, other, unread):
+    return f"""INSERT INTO conversation_participants (conversation_id, user_id, other_user_id, unread_count, last_activity)
+               SELECT conversation_id, {user}, {other}, {unread}, NEW.sent_date FROM messages WHERE id = NEW.id
+               ON CONFLICT(conversation_id, user_id) DO UPDATE
+               SET unread_count = unread_count + excluded.unread_count,
+                   last_activity = MAX(COALESCE(last_activity, ''), excluded.last_activity);"""
+
+def _migration_012_conversations(c):
+    # The candidate message form used to store the recipient's email as recipient_id
+    c.execute("""UPDATE messages SET recipient_id = (SELECT id FROM users WHERE email = messages.recipient_id)
+                 WHERE typeof(recipient_id) = 'text'""")
+    c.execute("""CREATE TABLE IF NOT EXISTS conversations
+                 (id INTEGER PRIMARY KEY,
+                  user_low INTEGER NOT NULL,
+                  user_high INTEGER NOT NULL,
+                  created_at TEXT,
+                  last_activity TEXT,
+                  last_message_id INTEGER,
+                  message_count INTEGER NOT NULL DEFAULT 0,
+                  UNIQUE (user_low, user_high))""")
+    c.execute("""CREATE TABLE IF NOT EXISTS conversation_participants
+                 (conversation_id INTEGER NOT NULL,
+                  user_id INTEGER NOT NULL,
+                  other_user_id INTEGER,
+                  unread_count INTEGER NOT NULL DEFAULT 0,
+                  last_activity TEXT,
+                  PRIMARY KEY (conversation_id, user_id)) WITHOUT ROWID""")
+    c.execute("ALTER TABLE messages ADD COLUMN conversation_id INTEGER")
+
+    # Backfill from the existing messages in bulk, before the triggers exist
+    c.execute(f"""INSERT INTO conversations (user_low, user_high, created_at, last_activity, last_message_id, message_count)
+                  SELECT {_MESSAGE_PAIR.format(row='messages')}, MIN(sent_date), MAX(sent_date), MAX(id), COUNT(*)
+                  FROM messages
+                  WHERE sender_id IS NOT NULL AND recipient_id IS NOT NULL
+                  GROUP BY 1, 2""")
+    c.execute("""UPDATE messages SET conversation_id = (
+                     SELECT id FROM conversations
+                     WHERE user_low = MIN(messages.sender_id, messages.recipient_id)
+                       AND user_high = MAX(messages.sender_id, messages.recipient_id))
+                 WHERE sender_id IS NOT NULL AND recipient_id IS NOT NULL""")
+    c.execute("""INSERT INTO conversation_participants (conversation_id, user_id, other_user_id, unread_count, last_activity)
+                 SELECT conversation_id, user_id, MAX(other_user_id), SUM(unread), MAX(sent_date)
+                 FROM (SELECT conversation_id, sender_id AS user_id, recipient_id AS other_user_id, 0 AS unread, sent_date
+                       FROM messages WHERE conversation_id IS NOT NULL
+                       UNION ALL
+                       SELECT conversation_id, recipient_id, sender_id, CASE WHEN read_status THEN 0 ELSE 1 END, sent_date
+                       FROM messages WHERE conversation_id IS NOT NULL)
+                 GROUP BY conversation_id, user_id""")
+
+    c.execute("CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages(conversation_id, sent_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_conversations_activity ON conversations(last_activity)")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_conversation_participants_inbox
+                 ON conversation_participants(user_id, last_activity, conversation_id)""")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_conversation_participants_unread
+                 ON conversation_participants(user_id, unread_count) WHERE unread_count > 0""")
+
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS conversations_message_insert AFTER INSERT ON messages
+                  WHEN NEW.sender_id IS NOT NULL AND NEW.recipient_id IS NOT NULL
+                  BEGIN
+                      INSERT INTO conversations (user_low, user_high, created_at, last_activity, message_count)
+                      VALUES ({_MESSAGE_PAIR.format(row='NEW')}, NEW.sent_date, NEW.sent_date, 0)
+                      ON CONFLICT(user_low, user_high) DO NOTHING;
+                      UPDATE messages SET conversation_id = (
+                          SELECT id FROM conversations
+                          WHERE user_low = MIN(NEW.sender_id, NEW.recipient_id) AND user_high = MAX(NEW.sender_id, NEW.recipient_id))
+                      WHERE id = NEW.id;
+                      UPDATE conversations
+                      SET last_activity = MAX(COALESCE(last_activity, ''), NEW.sent_date),
+                          last_message_id = MAX(COALESCE(last_message_id, 0), NEW.id),
+                          message_count = message_count + 1
+                      WHERE id = (SELECT conversation_id FROM messages WHERE id = NEW.id);
+                      {_participant_upsert('NEW.sender_id', 'NEW.recipient_id', '0')}
+                      {_participant_upsert('NEW.recipient_id', 'NEW.sender_id', 'CASE WHEN NEW.read_status THEN 0 ELSE 1 END')}
+                  END""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS conversations_message_read AFTER UPDATE OF read_status ON messages
+                 WHEN NEW.conversation_id IS NOT NULL AND (CASE WHEN OLD.read_status THEN 1 ELSE 0 END) != (CASE WHEN NEW.read_status THEN 1 ELSE 0 END)
+                 BEGIN
+                     UPDATE conversation_participants
+                     SET unread_count = unread_count + CASE WHEN NEW.read_status THEN -1 ELSE 1 END
+                     WHERE conversation_id = NEW.conversation_id AND user_id = NEW.recipient_id;
+                 END""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS conversations_message_delete AFTER DELETE ON messages
+                 WHEN OLD.conversation_id IS NOT NULL
+                 BEGIN
+                     UPDATE conversation_participants SET unread_count = unread_count - 1
+                     WHERE conversation_id = OLD.conversation_id AND user_id = OLD.recipient_id AND NOT OLD.read_status;
+                     UPDATE conversations
+                     SET message_count = message_count - 1,
+                         last_message_id = CASE WHEN last_message_id = OLD.id
+                                                THEN (SELECT MAX(id) FROM messages WHERE conversation_id = OLD.conversation_id)
+                                                ELSE last_message_id END
+                     WHERE id = OLD.conversation_id;
+                 END""")
+
+# Numbered schema migrations, applied in order and recorded in PRAGMA user_version.
+# Never edit or renumber a released migration; append a new one instead.
+MIGRATIONS = [
+    (1, 'initial schema', _migration_001_initial_schema),
+    (2, 'lookup indexes', _migration_002_lookup_indexes),
+    (3, 'move uploaded files to the blob store', _migration_003_blob_store),
+    (4, 'document listing indexes', _migration_004_document_listing_indexes),
+    (5, 'pagination indexes', _migration_005_pagination_indexes),
+    (6, 'full-text candidate search', _migration_006_candidate_search),
+    (7, 'dashboard metric counters', _migration_007_metric_counters),
+    (8, 'structured activity log', _migration_008_activity_log),
+    (9, 'indexed application fields', _migration_009_application_fields),
+    (10, 'candidate list indexes', _migration_010_candidate_list_indexes),
+    (11, 'login event history', _migration_011_login_events),
+    (12, 'conversations and inboxes', _migration_012_conversations),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def run_migrations(conn):
+    """Apply every migration newer than the database's user_version.
+
+    Each migration runs in its own BEGIN IMMEDIATE transaction, so readers on
+    other connections keep working (WAL) and a concurrent process that applied
+    the same migration first is detected once the write lock is held.
+    """
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version <= get_schema_version(conn):
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version <= get_schema_version(conn):
+                conn.rollback()
+                continue
+            migrate(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {version}")
             conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logger.info(f"Applied database migration {version}: {description}")
+        applied.append(version)
+    if applied:
+        conn.execute("PRAGMA optimize")
+    return applied
+
+def init_db():
+    pool = None
+    conn = None
+    try:
+        pool = get_pool()
+        conn = pool.acquire()
+        run_migrations(conn)
+        c = conn.cursor()
+        
+        # Initialize filled_positions in app_settings if not exists
+        c.execute("INSERT OR IGNORE INTO app_settings (key, value) VALUES ('filled_positions', '0')")
+        
+        # Create admin user if not exists
+        c.execute("SELECT * FROM users WHERE email = 'admin@admin.com'")
+        if not c.fetchone():
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            hashed_password = passwords.hash_password('12345')
+            c.execute('''INSERT INTO users 
+                         (email, password, first_name, last_name, mobile, role, 
+                          registration_date, last_login, last_activity)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                         ('admin@admin.com', hashed_password, 'Admin', 'User', '1234567890', 'admin', now, now, now))
+        
+        conn.commit()
         return True
     except sqlite3.Error as e:
         logger.error(f"Database initialization error: {str(e)}")
@@ -206,6 +1277,63 @@ def init_db():
         logger.error(f"An error occurred: {str(e)}")
         st.error(f"An error occurred: {str(e)}")
         return False
+    finally:
+        if conn:
+            pool.release(conn)
+
+# Database files already bootstrapped by this process: path -> (st_dev, st_ino, st_mtime_ns)
+_bootstrapped = {}
+_bootstrap_lock = threading.Lock()
+
+def _db_file_identity(database):
+    try:
+        st_result = os.stat(database)
+    except OSError:
+        return None
+    return (st_result.st_dev, st_result.st_ino, st_result.st_mtime_ns)
+
+def _reset_pool(database):
+    with _pools_lock:
+        pool = _pools.pop(database, None)
+        writer = _writers.pop(database, None)
+    if writer:
+        writer.close()
+    if pool:
+        pool.close()
+    query_cache.clear()
+
+def bootstrap_db():
+    """Initialise the database once per process instead of on every rerun.
+
+    The result is cached per database file. A changed mtime only costs a
+    user_version read; a replaced file (new inode) drops the pooled
+    connections and runs init_db again.
+    """
+    database = DATABASE_NAME
+    cached = _bootstrapped.get(database)
+    identity = _db_file_identity(database)
+    if cached and identity:
+        if cached == identity:
+            return True
+        if cached[:2] == identity[:2]:
+            result = execute_db_query("PRAGMA user_version")
+            if result and result[0][0] == SCHEMA_VERSION:
+                _bootstrapped[database] = identity
+                return True
+
+    with _bootstrap_lock:
+        identity = _db_file_identity(database)
+        cached = _bootstrapped.get(database)
+        if cached and identity == cached:
+            return True
+        if cached and (identity is None or cached[:2] != identity[:2]):
+            logger.info(f"Database file {database} was replaced, re-running bootstrap")
+            _reset_pool(database)
+        if not init_db():
+            _bootstrapped.pop(database, None)
+            return False
+        _bootstrapped[database] = _db_file_identity(database)
+        return True
 
 def get_user_by_email(email):
     query = "SELECT * FROM users WHERE email = ?"
@@ -217,7 +1345,7 @@ def update_user_activity(user_id, activity_type):
     query = f"UPDATE users SET {activity_type} = ? WHERE id = ?"
     return execute_db_query(query, (now, user_id), fetch=False)
 
-def get_application(user_id):
+def get_application(user_id, include_files=True):
     query = """
         SELECT * FROM applications 
         WHERE user_id = ? 
@@ -225,20 +1353,35 @@ def get_application(user_id):
         LIMIT 1
     """
     result = execute_db_query(query, (user_id,))
-    return dict(result[0]) if result else None
+    if not result:
+        return None
+    application = dict(result[0])
+    if include_files:
+        _hydrate_file(application, 'resume')
+        _hydrate_file(application, 'cover_letter')
+    return application
 
 def save_application(user_id, application_data, resume, cover_letter):
     now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    resume_ref = store_file(resume, 'resume.pdf') or {}
+    cover_letter_ref = store_file(cover_letter, 'cover_letter.pdf') or {}
     query = """
         INSERT INTO applications 
-        (user_id, application_data, status, submitted_date, last_modified, resume, cover_letter)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
+        (user_id, application_data, status, submitted_date, last_modified,
+         resume_sha256, resume_size, resume_mime,
+         cover_letter_sha256, cover_letter_size, cover_letter_mime)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """
-    return execute_db_query(
+    result = execute_db_query(
         query, 
-        (user_id, json.dumps(application_data), 'submitted', now, now, resume, cover_letter),
+        (user_id, json.dumps(application_data), 'submitted', now, now,
+         resume_ref.get('sha256'), resume_ref.get('size'), resume_ref.get('mime_type'),
+         cover_letter_ref.get('sha256'), cover_letter_ref.get('size'), cover_letter_ref.get('mime_type')),
         fetch=False
     )
+    if result:
+        log_activity('application_submitted', user_id=user_id, entity='application')
+    return result
 
 def get_candidate_tests(user_id):
     query = """
@@ -251,35 +1394,102 @@ def get_candidate_tests(user_id):
     return execute_db_query(query, (user_id,))
 
 def get_messages(user_id):
+    # One indexed branch per direction; OR across the two columns scans the table
     query = """
         SELECT m.*, u.first_name || ' ' || u.last_name as sender_name
-        FROM messages m
+        FROM (SELECT * FROM messages WHERE recipient_id = :id
+              UNION ALL
+              SELECT * FROM messages WHERE sender_id = :id AND recipient_id IS NOT :id) m
         JOIN users u ON m.sender_id = u.id
-        WHERE m.recipient_id = ? OR m.sender_id = ?
         ORDER BY m.sent_date DESC
     """
-    return execute_db_query(query, (user_id, user_id))
+    return execute_db_query(query, {'id': user_id})
 
-def save_message(sender_id, recipient_id, message):
-    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+def get_conversations_page(user_id=None, page_size=DEFAULT_PAGE_SIZE, cursor=None, include_total=False):
+    """A user's inbox (every conversation when None), most recently active first.
+
+    Each row has the conversation's unread_count (the user's own, or both
+    participants' together), message_count and a preview of its latest
+    message. Read from the trigger-maintained conversation tables, so the
+    cost of a page does not depend on how many messages exist.
+    """
+    if user_id is None:
+        query = """
+            SELECT c.id AS conversation_id, c.last_activity, c.message_count, c.user_low, c.user_high,
+                   a.first_name || ' ' || a.last_name AS user_low_name,
+                   b.first_name || ' ' || b.last_name AS user_high_name,
+                   (SELECT SUM(unread_count) FROM conversation_participants WHERE conversation_id = c.id) AS unread_count,
+                   m.message AS last_message, m.sender_id AS last_sender_id
+            FROM conversations c
+            LEFT JOIN users a ON a.id = c.user_low
+            LEFT JOIN users b ON b.id = c.user_high
+            LEFT JOIN messages m ON m.id = c.last_message_id
+            WHERE c.message_count > 0
+        """
+        params = ()
+    else:
+        query = """
+            SELECT p.conversation_id, p.last_activity, p.unread_count, p.other_user_id, c.message_count,
+                   o.first_name || ' ' || o.last_name AS other_name, o.email AS other_email,
+                   m.message AS last_message, m.sender_id AS last_sender_id
+            FROM conversation_participants p
+            JOIN conversations c ON c.id = p.conversation_id
+            LEFT JOIN users o ON o.id = p.other_user_id
+            LEFT JOIN messages m ON m.id = c.last_message_id
+            WHERE p.user_id = ? AND c.message_count > 0
+        """
+        params = (user_id,)
+    return fetch_page(query, params, ('last_activity', 'conversation_id'), page_size, cursor, include_total=include_total)
+
+def get_conversation_messages(conversation_id, page_size=DEFAULT_PAGE_SIZE, cursor=None, include_total=False):
+    """One conversation's messages, newest first"""
     query = """
-        INSERT INTO messages 
-        (sender_id, recipient_id, message, sent_date, read_status)
-        VALUES (?, ?, ?, ?, ?)
+        SELECT m.*, s.first_name || ' ' || s.last_name as sender_name
+        FROM messages m
+        LEFT JOIN users s ON m.sender_id = s.id
+        WHERE m.conversation_id = ?
     """
+    return fetch_page(query, (conversation_id,), ('sent_date', 'id'), page_size, cursor, include_total=include_total)
+
+def mark_conversation_read(conversation_id, user_id):
+    """Mark every message user_id received in a conversation as read"""
+    query = "UPDATE messages SET read_status = 1 WHERE conversation_id = ? AND recipient_id = ? AND NOT read_status"
+    return execute_db_query(query, (conversation_id, user_id), fetch=False)
+
+def get_unread_message_count(user_id):
+    """Unread messages across a user's conversations, summed over only the unread ones"""
+    query = "SELECT COALESCE(SUM(unread_count), 0) AS unread FROM conversation_participants WHERE user_id = ? AND unread_count > 0"
+    result = execute_db_query(query, (user_id,))
+    return result[0]['unread'] if result else 0
+
+_SAVE_MESSAGE_QUERY = """
+    INSERT INTO messages 
+    (sender_id, recipient_id, message, sent_date, read_status)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+def save_message(sender_id, recipient_id, message):
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     return execute_db_query(
-        query, 
+        _SAVE_MESSAGE_QUERY, 
         (sender_id, recipient_id, message, now, False),
         fetch=False
     )
 
+def send_message_bulk(sender_id, recipient_ids, message):
+    """Send the same message to many recipients in one transaction; one outcome per recipient"""
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return execute_many(_SAVE_MESSAGE_QUERY, [(sender_id, recipient_id, message, now, False) for recipient_id in recipient_ids])
+
 def delete_message(message_id):
     query = "DELETE FROM messages WHERE id = ?"
     return execute_db_query(query, (message_id,), fetch=False)
 
 def get_documents(user_id):
     query = """
-        SELECT d.*, u.first_name || ' ' || u.last_name as sender_name
+        SELECT d.id, d.user_id, d.file_name, d.file_type, d.upload_date, d.viewed,
+               d.file_data_size, d.file_data_mime,
+               u.first_name || ' ' || u.last_name as sender_name
         FROM documents d
         JOIN users u ON d.user_id = u.id
         WHERE d.user_id = ?
@@ -289,21 +1499,31 @@ def get_documents(user_id):
 
 def save_document(user_id, file_name, file_data, file_type):
     now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    ref = store_file(file_data, file_name) or {}
     query = """
         INSERT INTO documents 
-        (user_id, file_name, file_data, file_type, upload_date)
-        VALUES (?, ?, ?, ?, ?)
+        (user_id, file_name, file_data_sha256, file_data_size, file_data_mime, file_type, upload_date)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
     """
-    return execute_db_query(
+    result = execute_db_query(
         query,
-        (user_id, file_name, file_data, file_type, now),
+        (user_id, file_name, ref.get('sha256'), ref.get('size'), ref.get('mime_type'), file_type, now),
         fetch=False
     )
+    if result:
+        log_activity('document_uploaded', f"{file_type}: {file_name}", user_id=user_id, entity='document')
+    return result
 
+@query_cache.cached('screening_tests', scope=_cache_scope)
 def get_screening_tests():
     query = "SELECT * FROM screening_tests ORDER BY creation_date DESC"
     return execute_db_query(query)
 
+@query_cache.cached('screening_tests', scope=_cache_scope)
+def get_screening_tests_page(page_size=DEFAULT_PAGE_SIZE, cursor=None, include_total=False):
+    query = "SELECT * FROM screening_tests"
+    return fetch_page(query, (), ('creation_date', 'id'), page_size, cursor, include_total=include_total)
+
 def create_screening_test(title, description, questions, duration, created_by):
     now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     query = """
@@ -317,15 +1537,22 @@ def create_screening_test(title, description, questions, duration, created_by):
         fetch=False
     )
 
+_ASSIGN_TEST_QUERY = """
+    INSERT INTO test_assignments 
+    (test_id, candidate_id, assigned_date, status)
+    VALUES (?, ?, ?, 'assigned')
+"""
+
 def assign_test(test_id, candidate_id):
     now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    query = """
-        INSERT INTO test_assignments 
-        (test_id, candidate_id, assigned_date, status)
-        VALUES (?, ?, ?, 'assigned')
-    """
-    return execute_db_query(query, (test_id, candidate_id, now), fetch=False)
+    return execute_db_query(_ASSIGN_TEST_QUERY, (test_id, candidate_id, now), fetch=False)
+
+def assign_test_bulk(test_id, candidate_ids):
+    """Assign a test to many candidates in one transaction; one outcome per candidate"""
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return execute_many(_ASSIGN_TEST_QUERY, [(test_id, candidate_id, now) for candidate_id in candidate_ids])
 
+@query_cache.cached('screening_tests', scope=_cache_scope)
 def get_test_details(test_id):
     query = "SELECT * FROM screening_tests WHERE id = ?"
     result = execute_db_query(query, (test_id,))
@@ -407,103 +1634,269 @@ def get_filled_positions():
     return result[0]['SUM(filled_staff)'] if result else 0
 
 def update_filled_positions(position_id, new_filled_staff):
-    query = "UPDATE positions SET filled_staff = ? WHERE id = ?"
-    return execute_db_query(query, (new_filled_staff, position_id), fetch=False)
+    """Set a position's filled staff and the filled_positions total setting in one commit"""
+    try:
+        with transaction('immediate'):
+            execute_db_query("UPDATE positions SET filled_staff = ? WHERE id = ?", (new_filled_staff, position_id), fetch=False)
+            execute_db_query("""UPDATE app_settings SET value = (SELECT COALESCE(SUM(filled_staff), 0) FROM positions)
+                                WHERE key = 'filled_positions'""", fetch=False)
+        return True
+    except sqlite3.Error as e:
+        _report_query_error(e)
+        return None
 
-def get_recent_activities(limit=10):
-    query = """
+_RECENT_ACTIVITIES_QUERY = """
     SELECT activity_type, details, timestamp FROM activities
     ORDER BY timestamp DESC
     LIMIT ?
-    """
-    results = execute_db_query(query, (limit,))
+"""
+
+def _format_activities(results):
     return [f"{r['activity_type']}: {r['details']} - {r['timestamp']}" for r in results] if results else []
 
+def get_recent_activities(limit=10):
+    results = execute_db_query(_RECENT_ACTIVITIES_QUERY, (limit,))
+    return _format_activities(results)
+
 def add_new_position(title, description, required_staff):
     query = "INSERT INTO positions (title, description, required_staff, created_at) VALUES (?, ?, ?, ?)"
     now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     return execute_db_query(query, (title, description, required_staff, now), fetch=False)
 
-def get_all_candidates():
-    query = """
+_CANDIDATES_QUERY = """
     SELECT u.id, u.first_name, u.last_name, u.email, u.registration_date, u.status
     FROM users u
     WHERE u.role = 'candidate'
+"""
+
+def _candidate_summary(r):
+    return {
+        'id': r['id'],
+        'name': f"{r['first_name']} {r['last_name']}",
+        'email': r['email'],
+        'registration_date': r['registration_date'],
+        'status': r['status']
+    }
+
+@query_cache.cached('users', scope=_cache_scope)
+def get_all_candidates():
+    results = execute_db_query(_CANDIDATES_QUERY)
+    return [_candidate_summary(r) for r in results] if results else []
+
+# Sort orders for get_candidates_page: (sort keys, descending); the last key is unique
+CANDIDATE_SORTS = {
+    'newest': (('id',), True),
+    'oldest': (('id',), False),
+    'name': (('last_name', 'first_name', 'id'), False),
+}
+
+@query_cache.cached('users', 'applications', scope=_cache_scope)
+def get_candidates_page(page_size=DEFAULT_PAGE_SIZE, cursor=None, include_total=False, status=None,
+                        registered_from=None, registered_to=None, position=None, sort='newest'):
+    """Candidates matching every given filter, one page at a time.
+
+    registered_from and registered_to are inclusive dates. position keeps
+    candidates with at least one application for it. sort is a key of
+    CANDIDATE_SORTS; sorting by name skips candidates without one.
     """
-    results = execute_db_query(query)
-    return [
-        {
-            'id': r['id'],
-            'name': f"{r['first_name']} {r['last_name']}",
-            'email': r['email'],
-            'registration_date': r['registration_date'],
-            'status': r['status']
-        } for r in results
-    ] if results else []
-
-def get_all_applications():
-    query = """
-    SELECT a.id, u.first_name, u.last_name, a.application_data, a.status, a.submitted_date
+    conditions = []
+    params = []
+    if status:
+        conditions.append("u.status = ?")
+        params.append(status)
+    if registered_from:
+        conditions.append("u.registration_date >= ?")
+        params.append(str(registered_from))
+    if registered_to:
+        # Registration dates carry a time, so the whole last day is included
+        conditions.append("u.registration_date < date(?, '+1 day')")
+        params.append(str(registered_to))
+    if position:
+        conditions.append("u.id IN (SELECT user_id FROM applications WHERE position = ?)")
+        params.append(position)
+    if sort == 'name':
+        conditions.append("u.last_name IS NOT NULL AND u.first_name IS NOT NULL")
+
+    query = " AND ".join([_CANDIDATES_QUERY] + conditions)
+    sort_keys, descending = CANDIDATE_SORTS[sort]
+    page = fetch_page(query, params, sort_keys, page_size, cursor, descending=descending, include_total=include_total)
+    page['rows'] = [_candidate_summary(r) for r in page['rows']]
+    return page
+
+_APPLICATIONS_QUERY = """
+    SELECT a.id, u.first_name, u.last_name, a.status, a.submitted_date,
+           a.position, a.years_experience, a.visa_type, a.work_authorized, a.start_date
     FROM applications a
     JOIN users u ON a.user_id = u.id
+"""
+
+def _application_summary(r):
+    return {
+        'id': r['id'],
+        'candidate_name': f"{r['first_name']} {r['last_name']}",
+        'position': r['position'],
+        'years_experience': r['years_experience'],
+        'visa_type': r['visa_type'],
+        'work_authorized': None if r['work_authorized'] is None else bool(r['work_authorized']),
+        'start_date': r['start_date'],
+        'status': r['status'],
+        'submitted_date': r['submitted_date']
+    }
+
+def get_all_applications():
+    results = execute_db_query(_APPLICATIONS_QUERY)
+    return [_application_summary(r) for r in results] if results else []
+
+# Sort orders for get_applications_page; the last key is unique as fetch_page requires
+APPLICATION_SORTS = {
+    'submitted': ('id',),
+    'experience': ('years_experience', 'id'),
+}
+
+def get_applications_page(page_size=DEFAULT_PAGE_SIZE, cursor=None, include_total=False, position=None,
+                          min_experience=None, visa_type=None, work_authorized=None, start_by=None,
+                          status=None, sort='submitted'):
+    """Applications matching every given filter, most recently submitted (or most experienced) first.
+
+    The filters use the generated application columns and their indexes,
+    so no application_data is parsed. start_by keeps applicants who can
+    start on or before that date. sort is a key of APPLICATION_SORTS.
     """
-    results = execute_db_query(query)
-    return [
-        {
-            'id': r['id'],
-            'candidate_name': f"{r['first_name']} {r['last_name']}",
-            'position': json.loads(r['application_data']),
-            'status': r['status'],
-            'submitted_date': r['submitted_date']
-        } for r in results
-    ] if results else [] 
+    conditions = []
+    params = []
+    for column, value in (('position', position), ('visa_type', visa_type), ('status', status)):
+        if value:
+            conditions.append(f"a.{column} = ?")
+            params.append(value)
+    if min_experience:
+        conditions.append("a.years_experience >= ?")
+        params.append(min_experience)
+    if work_authorized is not None:
+        conditions.append("a.work_authorized = ?")
+        params.append(1 if work_authorized else 0)
+    if start_by:
+        conditions.append("a.start_date <= ?")
+        params.append(str(start_by))
+
+    if sort == 'experience':
+        # Sort keys may not be NULL, so this order skips applications without the field
+        conditions.append("a.years_experience IS NOT NULL")
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"{_APPLICATIONS_QUERY} {where}"
+    page = fetch_page(query, params, APPLICATION_SORTS[sort], page_size, cursor, include_total=include_total)
+    page['rows'] = [_application_summary(r) for r in page['rows']]
+    return page
+
+def get_application_positions():
+    """Distinct positions applied for, read from the position index"""
+    results = execute_db_query("SELECT DISTINCT position FROM applications WHERE position IS NOT NULL ORDER BY position")
+    return [r['position'] for r in results] if results else []
+
+def _document_summary(r):
+    return {
+        'id': r['id'],
+        'user_id': r['user_id'],
+        'candidate_name': f"{r['first_name']} {r['last_name']}",
+        'file_name': r['file_name'],
+        'document_type': r['file_type'],
+        'upload_date': r['upload_date'],
+        'viewed': bool(r['viewed']),
+        'file_size': r['file_data_size'],
+        'mime_type': r['file_data_mime'],
+        'sha256': r['file_data_sha256']
+    }
+
+_DOCUMENT_SUMMARY_COLUMNS = """
+    d.id, d.user_id, u.first_name, u.last_name, d.file_name, d.file_type, d.upload_date,
+    d.viewed, d.file_data_size, d.file_data_mime, d.file_data_sha256
+"""
 
 def get_all_documents():
-    query = """
-    SELECT d.id, u.first_name, u.last_name, d.file_name, d.file_data, d.file_type, d.upload_date
+    # Metadata only; fetch the bytes of one document with get_file_data
+    query = f"""
+    SELECT {_DOCUMENT_SUMMARY_COLUMNS}
     FROM documents d
     JOIN users u ON d.user_id = u.id
     """
     results = execute_db_query(query)
-    return [
-        {
-            'id': r['id'],
-            'candidate_name': f"{r['first_name']} {r['last_name']}",
-            'file_name': r['file_name'],
-            'file_data': r['file_data'],
-            'document_type': r['file_type'],
-            'upload_date': r['upload_date']
-        } for r in results
-    ] if results else []
+    return [_document_summary(r) for r in results] if results else []
+
+def list_documents(page_size=DEFAULT_PAGE_SIZE, cursor=None, user_id=None, file_type=None,
+                   date_from=None, date_to=None, viewed=None, include_total=False):
+    """One page of document metadata, newest first.
+
+    date_from/date_to are inclusive dates. See fetch_page for the paging arguments.
+    """
+    conditions = []
+    params = []
+    if user_id is not None:
+        conditions.append("d.user_id = ?")
+        params.append(user_id)
+    if file_type:
+        conditions.append("d.file_type = ?")
+        params.append(file_type)
+    if date_from:
+        conditions.append("d.upload_date >= ?")
+        params.append(str(date_from))
+    if date_to:
+        conditions.append("d.upload_date < date(?, '+1 day')")
+        params.append(str(date_to))
+    if viewed is not None:
+        conditions.append("d.viewed = ?")
+        params.append(1 if viewed else 0)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"""
+    SELECT {_DOCUMENT_SUMMARY_COLUMNS}
+    FROM documents d
+    JOIN users u ON d.user_id = u.id
+    {where}
+    """
+    page = fetch_page(query, params, ('upload_date', 'id'), page_size, cursor, include_total=include_total)
+    page['rows'] = [_document_summary(r) for r in page['rows']]
+    return page
+
+def mark_document_viewed(document_id):
+    query = "UPDATE documents SET viewed = 1 WHERE id = ? AND viewed = 0"
+    return execute_db_query(query, (document_id,), fetch=False)
 
 def update_user_profile(user_id, profile_data):
-    query = """
+    """Update the editable profile fields; a profile_picture of None keeps the current picture"""
+    params = [profile_data['first_name'], profile_data['last_name'], profile_data['mobile'],
+              profile_data['home_address'], profile_data['age'], profile_data['location'],
+              profile_data['country']]
+    picture = ""
+    picture_ref = store_file(profile_data.get('profile_picture'))
+    if picture_ref:
+        picture = ", profile_picture = NULL, profile_picture_sha256 = ?, profile_picture_size = ?, profile_picture_mime = ?"
+        params += [picture_ref['sha256'], picture_ref['size'], picture_ref['mime_type']]
+    query = f"""
         UPDATE users
         SET first_name = ?, last_name = ?, mobile = ?, home_address = ?, 
-            age = ?, location = ?, country = ?, profile_picture = ?
+            age = ?, location = ?, country = ?{picture}
         WHERE id = ?
     """
-    return execute_db_query(
-        query,
-        (profile_data['first_name'], profile_data['last_name'], profile_data['mobile'],
-         profile_data['home_address'], profile_data['age'], profile_data['location'],
-         profile_data['country'], profile_data['profile_picture'], user_id),
-        fetch=False
-    )
+    return execute_db_query(query, (*params, user_id), fetch=False)
 
-def get_user_profile(user_id):
+def get_user_profile(user_id, include_picture=True):
+    """A user's profile; include_picture=False leaves out the picture bytes (use get_thumbnail)"""
     query = """
         SELECT id, email, first_name, last_name, mobile, role, registration_date,
-               profile_picture, home_address, age, location, country
+               profile_picture, profile_picture_sha256, profile_picture_mime,
+               home_address, age, location, country
         FROM users
         WHERE id = ?
     """
     result = execute_db_query(query, (user_id,))
-    return dict(result[0]) if result else None
+    if not result:
+        return None
+    profile = dict(result[0])
+    return _hydrate_file(profile, 'profile_picture') if include_picture else profile
 
 def get_user_documents(user_id):
     query = """
-        SELECT id, file_name, file_type, upload_date
+        SELECT id, file_name, file_type, upload_date, file_data_sha256, file_data_mime
         FROM documents
         WHERE user_id = ?
         ORDER BY upload_date DESC
@@ -517,15 +1910,18 @@ def delete_document(document_id, user_id):
     """
     return execute_db_query(query, (document_id, user_id), fetch=False)
 
-def schedule_interview(candidate_ids, date, time, interview_type, role, dress_code, stage):
+def schedule_interviews_bulk(candidate_ids, date, time, interview_type, role, dress_code, stage):
+    """Schedule the same interview for many candidates in one transaction; one outcome per candidate"""
     query = """
         INSERT INTO interviews
         (candidate_id, date, time, type, role, dress_code, stage, status)
         VALUES (?, ?, ?, ?, ?, ?, ?, 'scheduled')
     """
-    for candidate_id in candidate_ids:
-        execute_db_query(query, (candidate_id, date, time, interview_type, role, dress_code, stage), fetch=False)
-    return True
+    return execute_many(query, [(candidate_id, date, time, interview_type, role, dress_code, stage) for candidate_id in candidate_ids])
+
+def schedule_interview(candidate_ids, date, time, interview_type, role, dress_code, stage):
+    outcomes = schedule_interviews_bulk(candidate_ids, date, time, interview_type, role, dress_code, stage)
+    return all(outcome['ok'] for outcome in outcomes)
 
 def get_candidate_interviews(candidate_id):
     query = """
@@ -552,6 +1948,15 @@ def get_all_interviews():
     """
     return execute_db_query(query)
 
+def get_interviews_page(page_size=DEFAULT_PAGE_SIZE, cursor=None, include_total=False):
+    """Interviews, latest scheduled date first"""
+    query = """
+        SELECT i.*, u.first_name, u.last_name, u.email
+        FROM interviews i
+        JOIN users u ON i.candidate_id = u.id
+    """
+    return fetch_page(query, (), ('date', 'time', 'id'), page_size, cursor, include_total=include_total)
+
 def update_interview_status(interview_id, status):
     query = """
         UPDATE interviews
@@ -560,6 +1965,10 @@ def update_interview_status(interview_id, status):
     """
     return execute_db_query(query, (status, interview_id), fetch=False)
 
+def update_interview_status_bulk(interview_ids, status):
+    query = "UPDATE interviews SET status = ? WHERE id = ?"
+    return execute_many(query, [(status, interview_id) for interview_id in interview_ids])
+
 def reschedule_interview(interview_id, new_date, new_time):
     query = """
         UPDATE interviews
@@ -577,34 +1986,159 @@ def update_application_status(application_id, status):
     now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     return execute_db_query(query, (status, now, application_id), fetch=False)
 
-def get_candidate_details(candidate_id):
-    query = """
-        SELECT u.*, a.application_data, a.status as application_status, 
-               a.submitted_date as application_submitted_date,
-               i.date as interview_date, i.time as interview_time, i.status as interview_status,
-               t.score as test_score, t.responses as test_responses
-        FROM users u
-        LEFT JOIN applications a ON u.id = a.user_id
-        LEFT JOIN interviews i ON u.id = i.candidate_id
-        LEFT JOIN test_assignments t ON u.id = t.candidate_id
-        WHERE u.id = ?
-    """
-    result = execute_db_query(query, (candidate_id,))
-    return dict(result[0]) if result else None
+def update_application_status_bulk(application_ids, status):
+    query = "UPDATE applications SET status = ?, last_modified = ? WHERE id = ?"
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return execute_many(query, [(status, now, application_id) for application_id in application_ids])
+
+_CANDIDATE_360_QUERIES = {
+    'applications': """
+        SELECT id, application_data, status, submitted_date, last_modified,
+               resume_sha256, resume_size, resume_mime,
+               cover_letter_sha256, cover_letter_size, cover_letter_mime
+        FROM applications
+        WHERE user_id = ?
+        ORDER BY submitted_date DESC
+    """,
+    'interviews': """
+        SELECT id, date, time, type, role, dress_code, stage, status, candidate_response, candidate_note
+        FROM interviews
+        WHERE candidate_id = ?
+        ORDER BY date DESC, time DESC
+    """,
+    'tests': """
+        SELECT ta.id, ta.test_id, t.title, ta.assigned_date, ta.start_time, ta.end_time,
+               ta.status, ta.score, ta.responses
+        FROM test_assignments ta
+        JOIN screening_tests t ON t.id = ta.test_id
+        WHERE ta.candidate_id = ?
+        ORDER BY ta.assigned_date DESC
+    """,
+    'documents': """
+        SELECT id, file_name, file_type, upload_date, viewed, file_data_size, file_data_mime
+        FROM documents
+        WHERE user_id = ?
+        ORDER BY upload_date DESC
+    """,
+    # Two index lookups (sender, recipient) instead of an OR over the table
+    'messages': """
+        SELECT m.id, m.sender_id, m.recipient_id, m.message, m.sent_date, m.read_status,
+               s.first_name || ' ' || s.last_name AS sender_name,
+               r.first_name || ' ' || r.last_name AS recipient_name
+        FROM (SELECT * FROM messages WHERE sender_id = :id
+              UNION
+              SELECT * FROM messages WHERE recipient_id = :id) m
+        LEFT JOIN users s ON s.id = m.sender_id
+        LEFT JOIN users r ON r.id = m.recipient_id
+        ORDER BY m.sent_date DESC, m.id DESC
+    """,
+}
+
+def get_candidate_360(candidate_id, include_heavy=False):
+    """A candidate's profile with every application, interview, test, document and message.
+
+    Each collection is read with its own indexed query, all in one read
+    transaction, so the cost grows with the candidate's rows rather than
+    with their product. The password hash is never returned; file contents
+    (profile picture, resumes, cover letters) are only loaded with
+    include_heavy=True, otherwise rows carry their blob store references.
+    """
+    try:
+        with transaction() as conn:
+            profile = _run_query(conn, """
+                SELECT id, email, first_name, last_name, mobile, role, registration_date,
+                       last_login, last_activity, status, profile_locked, home_address, age,
+                       location, country, profile_picture_sha256, profile_picture_size, profile_picture_mime
+                FROM users
+                WHERE id = ?
+            """, (candidate_id,))
+            if not profile:
+                return None
+            details = {'profile': dict(profile[0])}
+            for name, query in _CANDIDATE_360_QUERIES.items():
+                params = {'id': candidate_id} if name == 'messages' else (candidate_id,)
+                details[name] = [dict(r) for r in _run_query(conn, query, params)]
+    except sqlite3.Error as e:
+        _report_query_error(e)
+        return None
 
-def search_candidates(search_term):
-    query = """
-        SELECT id, first_name, last_name, email
-        FROM users
-        WHERE role = 'candidate' AND (first_name LIKE ? OR last_name LIKE ? OR email LIKE ?)
+    if include_heavy:
+        _hydrate_file(details['profile'], 'profile_picture')
+        for application in details['applications']:
+            _hydrate_file(application, 'resume')
+            _hydrate_file(application, 'cover_letter')
+    return details
+
+def get_candidate_details(candidate_id):
+    """The profile plus the latest application, interview and test (see get_candidate_360)"""
+    details = get_candidate_360(candidate_id)
+    if not details:
+        return None
+    result = _hydrate_file(details['profile'], 'profile_picture')
+    result.setdefault('profile_picture', None)
+    application = details['applications'][0] if details['applications'] else {}
+    interview = details['interviews'][0] if details['interviews'] else {}
+    test = details['tests'][0] if details['tests'] else {}
+    result.update({
+        'application_data': application.get('application_data'),
+        'application_status': application.get('status'),
+        'application_submitted_date': application.get('submitted_date'),
+        'interview_date': interview.get('date'),
+        'interview_time': interview.get('time'),
+        'interview_status': interview.get('status'),
+        'test_score': test.get('score'),
+        'test_responses': test.get('responses')
+    })
+    return result
+
+def _fts_prefix_query(search_term):
+    """Turn free text into an FTS5 query matching every word as a prefix"""
+    words = re.findall(r'\w+', search_term)
+    return ' '.join(f'"{word}"*' for word in words)
+
+def search_candidates(search_term, limit=50, ranked=True):
+    """Full-text search over candidate names, emails and application content.
+
+    Every word is matched as a prefix, so partial input works for
+    type-ahead. Results carry a highlighted snippet (markdown bold) of the
+    best matching field. With ranked=True results are ordered by bm25, which
+    has to score every match; type-ahead callers can pass ranked=False to
+    get the newest matching candidates, which stops after `limit` matches.
     """
-    search_term = f"%{search_term}%"
-    return execute_db_query(query, (search_term, search_term, search_term))
+    match = _fts_prefix_query(search_term)
+    if not match:
+        return []
+    order = "candidate_search.rank" if ranked else "candidate_search.rowid DESC"
+    query = f"""
+        SELECT u.id, u.first_name, u.last_name, u.email, u.registration_date, u.status,
+               snippet(candidate_search, -1, '**', '**', '…', 12) AS snippet
+        FROM candidate_search
+        JOIN users u ON u.id = candidate_search.rowid
+        WHERE candidate_search MATCH ?
+        ORDER BY {order}
+        LIMIT ?
+    """
+    results = execute_db_query(query, (match, limit))
+    return [dict(_candidate_summary(r), snippet=r['snippet']) for r in results] if results else []
+
+def rebuild_candidate_search():
+    """Regenerate the whole search index from users and applications"""
+    with transaction('immediate') as conn:
+        conn.execute("DELETE FROM candidate_search")
+        conn.execute("""INSERT INTO candidate_search (rowid, first_name, last_name, email, position, employer, skills, certifications, education)
+                        SELECT * FROM candidate_search_source""")
+    return True
 
+@query_cache.cached('positions', scope=_cache_scope)
 def get_all_positions():
     query = "SELECT * FROM positions ORDER BY created_at DESC"
     return execute_db_query(query)
 
+@query_cache.cached('positions', scope=_cache_scope)
+def get_positions_page(page_size=DEFAULT_PAGE_SIZE, cursor=None, include_total=False):
+    query = "SELECT * FROM positions"
+    return fetch_page(query, (), ('created_at', 'id'), page_size, cursor, include_total=include_total)
+
 def get_total_applicants():
     query = "SELECT COUNT(*) FROM applications"
     result = execute_db_query(query)
@@ -628,16 +2162,166 @@ def get_total_documents():
     result = execute_db_query(query)
     return dict(result[0]) if result else {'total': 0, 'unviewed': 0}
 
-def get_login_statistics():
-    query = """
-    SELECT DATE(last_login) as login_date, COUNT(*) as login_count
-    FROM users
-    WHERE last_login >= DATE('now', '-7 days')
-    GROUP BY DATE(last_login)
-    ORDER BY login_date
+LOGIN_EVENT_RETENTION_DAYS = 180   # raw events; the daily rollup is kept for good
+HOURLY_ROLLUP_RETENTION_DAYS = 90
+
+def record_login_event(user_id, succeeded=True):
+    """Append a login attempt to login_events; a success also sets users.last_login.
+
+    user_id is None for a failed attempt on an unknown email. Both writes
+    share one commit, and triggers add the event to the rollups.
     """
-    results = execute_db_query(query)
-    return {r['login_date']: r['login_count'] for r in results} if results else {}
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        with transaction('immediate'):
+            if succeeded:
+                execute_db_query("UPDATE users SET last_login = ? WHERE id = ?", (now, user_id), fetch=False)
+            execute_db_query("INSERT INTO login_events (user_id, event, occurred_at) VALUES (?, ?, ?)",
+                             (user_id, 'login' if succeeded else 'login_failed', now), fetch=False)
+        return True
+    except sqlite3.Error as e:
+        _report_query_error(e)
+        return None
+
+def _login_buckets(days, granularity):
+    """Every bucket label of the last `days` days, oldest first"""
+    now = datetime.now()
+    if granularity == 'hour':
+        start = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=days * 24 - 1)
+        return [(start + timedelta(hours=i)).strftime('%Y-%m-%d %H:00') for i in range(days * 24)]
+    return [(now.date() - timedelta(days=i)).isoformat() for i in reversed(range(days))]
+
+def _login_statistics(conn, days, granularity):
+    """{event: {bucket: count}} from a rollup table, with empty buckets as 0"""
+    table = LOGIN_ROLLUPS[granularity][0]
+    buckets = _login_buckets(days, granularity)
+    rows = _run_query(conn, f"SELECT bucket, event, count FROM {table} WHERE bucket >= ? ORDER BY bucket", (buckets[0],))
+    statistics = {event: dict.fromkeys(buckets, 0) for event in ('login', 'login_failed')}
+    for row in rows:
+        if row['event'] in statistics and row['bucket'] in statistics[row['event']]:
+            statistics[row['event']][row['bucket']] = row['count']
+    return statistics
+
+def get_login_statistics(days=7, granularity='day', event='login'):
+    """Logins (or 'login_failed' attempts) per day or hour over the last `days` days.
+
+    Read from the rollup tables, so the cost depends on the number of
+    buckets, not on the number of users or events.
+    """
+    try:
+        with get_db_connection() as conn:
+            return _login_statistics(conn, days, granularity)[event]
+    except sqlite3.Error as e:
+        _report_query_error(e)
+        return {}
+
+def prune_login_events(keep_days=LOGIN_EVENT_RETENTION_DAYS, keep_hourly_days=HOURLY_ROLLUP_RETENTION_DAYS):
+    """Delete raw login events and hourly rollups older than their retention period (run daily by run_maintenance)"""
+    event_cutoff = (datetime.now() - timedelta(days=keep_days)).strftime('%Y-%m-%d %H:%M:%S')
+    hourly_cutoff = (datetime.now() - timedelta(days=keep_hourly_days)).strftime('%Y-%m-%d %H:00')
+    try:
+        with transaction('immediate'):
+            # A rare scan here keeps login_events free of indexes for cheap inserts
+            execute_db_query("DELETE FROM login_events WHERE occurred_at < ?", (event_cutoff,), fetch=False)
+            execute_db_query(f"DELETE FROM {LOGIN_ROLLUPS['hour'][0]} WHERE bucket < ?", (hourly_cutoff,), fetch=False)
+        return True
+    except sqlite3.Error as e:
+        _report_query_error(e)
+        return None
+
+MAINTENANCE_INTERVAL = 24 * 3600  # seconds between automatic maintenance runs
+
+_maintenance_due = {}  # database file -> time.time() the next run is due
+_maintenance_lock = threading.Lock()
+
+def run_maintenance():
+    """Prune old login events and delete stored files nothing references.
+
+    Records the time in app_settings so run_maintenance_if_due does not
+    repeat it for MAINTENANCE_INTERVAL, across restarts too.
+    """
+    pruned = prune_login_events()
+    removed = collect_blob_garbage()
+    update_app_setting('last_maintenance', str(time.time()))
+    logger.info(f"Database maintenance: login events {'pruned' if pruned else 'not pruned'}, {removed} unreferenced file(s) removed")
+    return {'login_events_pruned': bool(pruned), 'files_removed': removed}
+
+def run_maintenance_if_due():
+    """Start run_maintenance in the background if it has not run for MAINTENANCE_INTERVAL.
+
+    Cheap enough to call on every rerun: between runs it is an in-memory
+    time check. Returns True when a run was started.
+    """
+    database = DATABASE_NAME
+    now = time.time()
+    with _maintenance_lock:
+        if _maintenance_due.get(database, 0) > now:
+            return False
+        _maintenance_due[database] = now + MAINTENANCE_INTERVAL
+    last = get_app_setting('last_maintenance')
+    if last and now - float(last) < MAINTENANCE_INTERVAL:
+        with _maintenance_lock:
+            _maintenance_due[database] = float(last) + MAINTENANCE_INTERVAL
+        return False
+    threading.Thread(target=run_maintenance, name='db-maintenance', daemon=True).start()
+    return True
+
+def _status_distribution(counters, prefix):
+    return {
+        (name[len(prefix):] or None): value
+        for name, value in counters.items()
+        if name.startswith(prefix) and value
+    }
+
+def get_dashboard_snapshot(recent_activity_limit=10, login_days=7, login_granularity='day'):
+    """Every Overview KPI and distribution from one connection and one read transaction.
+
+    The counts come from metric_counters and the login rollups, which
+    triggers keep current, so none of them scans its source table.
+    """
+    try:
+        with transaction() as conn:
+            counters = {r['name']: r['value'] for r in _run_query(conn, "SELECT name, value FROM metric_counters")}
+            activities = _run_query(conn, _RECENT_ACTIVITIES_QUERY, (recent_activity_limit,))
+            logins = _login_statistics(conn, login_days, login_granularity)
+    except sqlite3.Error as e:
+        _report_query_error(e)
+        return None
+
+    application_statistics = _status_distribution(counters, 'applications.status:')
+    interview_statistics = _status_distribution(counters, 'interviews.status:')
+    return {
+        'total_candidates': counters.get('candidates', 0),
+        'open_applications': sum(application_statistics.get(s, 0) for s in ('under_review', 'interview_scheduled')),
+        'scheduled_interviews': interview_statistics.get('scheduled', 0),
+        'filled_positions': counters.get('positions.filled_staff', 0),
+        'total_applications': sum(application_statistics.values()),
+        'application_statistics': application_statistics,
+        'interview_statistics': interview_statistics,
+        'recent_activities': _format_activities(activities),
+        'login_statistics': logins['login'],
+        'failed_login_statistics': logins['login_failed']
+    }
+
+def check_metric_counters(repair=False):
+    """Compare metric_counters with counts recomputed from the source tables.
+
+    Returns {counter name: (stored, expected)} for every counter that is
+    off. With repair=True the counters are rebuilt from scratch.
+    """
+    with transaction('immediate' if repair else 'deferred') as conn:
+        stored = {r['name']: r['value'] for r in conn.execute("SELECT name, value FROM metric_counters")}
+        expected = {r['name']: r['value'] for r in conn.execute(_expected_metric_counters_query())}
+        drift = {
+            name: (stored.get(name, 0), expected.get(name, 0))
+            for name in set(stored) | set(expected)
+            if stored.get(name, 0) != expected.get(name, 0)
+        }
+        if repair and drift:
+            conn.execute("DELETE FROM metric_counters")
+            conn.execute(f"INSERT INTO metric_counters (name, value) {_expected_metric_counters_query()}")
+            logger.warning(f"Rebuilt {len(drift)} drifted metric counters")
+    return drift
 
 def get_interview_statistics():
     query = """
@@ -650,13 +2334,50 @@ def get_interview_statistics():
 
 def get_file_data(file_id):
     query = """
-    SELECT file_data, file_name, file_type
+    SELECT file_data, file_data_sha256, file_data_size, file_data_mime, file_name, file_type
     FROM documents
     WHERE id = ?
     """
     result = execute_db_query(query, (file_id,))
+    return _hydrate_file(dict(result[0]), 'file_data') if result else None
+
+def get_document_info(document_id):
+    """Document metadata plus where its bytes live, without reading them"""
+    query = """
+    SELECT id, user_id, file_name, file_type, upload_date, file_data_sha256,
+           COALESCE(file_data_size, length(file_data)) AS file_data_size,
+           file_data_mime, file_data IS NOT NULL AS inline_data
+    FROM documents
+    WHERE id = ?
+    """
+    result = execute_db_query(query, (document_id,))
     return dict(result[0]) if result else None
 
+@contextmanager
+def open_document(document_id):
+    """Yield (info, file object) for a document without loading it into memory.
+
+    The file object supports seek() and read(n). Stored documents are opened
+    from the blob store; rows that still hold an inline BLOB are read
+    incrementally through sqlite3's blobopen.
+    """
+    info = get_document_info(document_id)
+    if not info:
+        raise FileNotFoundError(f"Document {document_id} does not exist")
+    if info['file_data_sha256']:
+        with blob_store.open_blob(get_blob_root(), info['file_data_sha256']) as f:
+            yield info, f
+    elif info['inline_data']:
+        pool = get_pool()
+        conn = pool.acquire()
+        try:
+            with conn.blobopen('documents', 'file_data', document_id, readonly=True) as blob:
+                yield info, blob
+        finally:
+            pool.release(conn)
+    else:
+        raise FileNotFoundError(f"Document {document_id} has no file data")
+
 def update_user_password(user_id, new_password):
     query = "UPDATE users SET password = ? WHERE id = ?"
     return execute_db_query(query, (new_password, user_id), fetch=False)
@@ -676,13 +2397,103 @@ def clear_reset_token(user_id):
 
 # Additional helper functions can be added here as needed
 
-def log_activity(activity_type, details):
-    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    query = """
-    INSERT INTO activities (activity_type, details, timestamp)
-    VALUES (?, ?, ?)
+# Activity log writes are buffered in memory and written in batches by a
+# background thread, so logging never adds a commit to the request path.
+ACTIVITY_FLUSH_INTERVAL = 1.0   # seconds between background flushes
+ACTIVITY_BATCH_SIZE = 200       # flush early once this many events are waiting
+ACTIVITY_BUFFER_LIMIT = 10000   # beyond this the caller flushes synchronously
+
+_activity_buffer = []  # (database, row) pairs in logging order
+_activity_cond = threading.Condition()
+_activity_flush_lock = threading.Lock()
+_activity_writer = None
+
+def _run_activity_writer():
+    while True:
+        with _activity_cond:
+            _activity_cond.wait_for(lambda: len(_activity_buffer) >= ACTIVITY_BATCH_SIZE, timeout=ACTIVITY_FLUSH_INTERVAL)
+        try:
+            flush_activity_log()
+        except Exception:
+            logger.exception("Activity log writer failed")
+
+def _start_activity_writer():
+    global _activity_writer
+    with _activity_cond:
+        if _activity_writer is None:
+            _activity_writer = threading.Thread(target=_run_activity_writer, name='activity-log-writer', daemon=True)
+            _activity_writer.start()
+            atexit.register(flush_activity_log)
+
+def log_activity(activity_type, details=None, user_id=None, entity=None, entity_id=None):
+    """Record an event in the activity log.
+
+    activity_type is the action ('login', 'application_submitted', ...),
+    user_id the user who performed it and entity/entity_id the record it
+    concerns. The event is queued and written within ACTIVITY_FLUSH_INTERVAL.
     """
-    return execute_db_query(query, (activity_type, details, now), fetch=False)
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    row = (activity_type, details, now, user_id, entity, entity_id)
+    with _activity_cond:
+        _activity_buffer.append((DATABASE_NAME, row))
+        pending = len(_activity_buffer)
+        if pending >= ACTIVITY_BATCH_SIZE:
+            _activity_cond.notify()
+    if _activity_writer is None:
+        _start_activity_writer()
+    if pending >= ACTIVITY_BUFFER_LIMIT:
+        # The writer is falling behind; make the producers wait for it
+        flush_activity_log()
+    return True
+
+def flush_activity_log():
+    """Write every queued activity event now; returns the number written"""
+    if _current_transaction() is not None:
+        # An open transaction('immediate') holds the writer this would wait for
+        return 0
+    with _activity_flush_lock:
+        with _activity_cond:
+            events = _activity_buffer[:]
+            _activity_buffer.clear()
+        if not events:
+            return 0
+        by_database = {}
+        for database, row in events:
+            by_database.setdefault(database, []).append(row)
+        written = 0
+        for database, rows in by_database.items():
+            try:
+                get_writer(database).execute(
+                    lambda conn: conn.executemany("""INSERT INTO activities (activity_type, details, timestamp, user_id, entity, entity_id)
+                                                     VALUES (?, ?, ?, ?, ?, ?)""", rows),
+                    ('activities',))
+                written += len(rows)
+            except sqlite3.Error as e:
+                # Usually runs on the log writer thread, so there is no page to report to
+                logger.error(f"Failed to write {len(rows)} activity log events: {str(e)}")
+        return written
+
+def query_activities(user_id=None, entity=None, entity_id=None, activity_type=None, date_from=None, date_to=None,
+                     page_size=DEFAULT_PAGE_SIZE, cursor=None, include_total=False):
+    """Activity log events matching every given filter, newest first, one page at a time"""
+    flush_activity_log()
+    conditions = []
+    params = []
+    for column, value in (('user_id', user_id), ('entity', entity), ('entity_id', entity_id), ('activity_type', activity_type)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    if date_from:
+        conditions.append("timestamp >= ?")
+        params.append(str(date_from))
+    if date_to:
+        # Dates compare as text; include the whole of the last day
+        conditions.append("timestamp < date(?, '+1 day')")
+        params.append(str(date_to))
+    query = "SELECT id, activity_type, details, timestamp, user_id, entity, entity_id FROM activities"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return fetch_page(query, params, ('timestamp', 'id'), page_size, cursor, include_total=include_total)
 
 def get_application_statistics():
     query = """
@@ -694,14 +2505,15 @@ def get_application_statistics():
     return {r['status']: r['count'] for r in results} if results else {}
 
 def get_user_activity_log(user_id, limit=10):
+    flush_activity_log()
     query = """
     SELECT activity_type, details, timestamp
     FROM activities
-    WHERE details LIKE ?
+    WHERE user_id = ?
     ORDER BY timestamp DESC
     LIMIT ?
     """
-    results = execute_db_query(query, (f"%user_id: {user_id}%", limit))
+    results = execute_db_query(query, (user_id, limit))
     return [dict(r) for r in results] if results else []
 
 def update_app_setting(key, value):
@@ -711,6 +2523,7 @@ def update_app_setting(key, value):
     """
     return execute_db_query(query, (key, value), fetch=False)
 
+@query_cache.cached('app_settings', scope=_cache_scope)
 def get_app_setting(key):
     query = "SELECT value FROM app_settings WHERE key = ?"
     result = execute_db_query(query, (key,))
@@ -0,0 +1,195 @@
+import hashlib
+import hmac
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, urlsplit
+
+import streamlit as st
+
+import database
+
+logger = logging.getLogger(__name__)
+
+# Documents are streamed to the browser by a small HTTP server running next to
+# Streamlit, so a PDF or video is never base64-encoded into the page. By
+# default it only listens on this machine and links use the host name the
+# browser reached Streamlit at. Anywhere else (another machine, a proxy,
+# HTTPS) set FILE_SERVER_PUBLIC_URL to the address browsers should use, and
+# FILE_SERVER_ADDRESS to an interface that address reaches.
+FILE_SERVER_ADDRESS = os.environ.get('FILE_SERVER_ADDRESS', '127.0.0.1')
+FILE_SERVER_PORT = int(os.environ.get('FILE_SERVER_PORT', '8502'))
+FILE_SERVER_PUBLIC_URL = os.environ.get('FILE_SERVER_PUBLIC_URL')
+# Shared secret for signed links; set it when several processes serve the app
+FILE_SERVER_SECRET = os.environ.get('FILE_SERVER_SECRET') or secrets.token_hex(32)
+
+LINK_LIFETIME = 15 * 60  # seconds a signed document link stays valid
+CHUNK_SIZE = 64 * 1024
+
+_RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+_LOCAL_HOSTS = {'localhost', '127.0.0.1', '::1'}
+
+_server = None
+_server_lock = threading.Lock()
+_warned_hosts = set()
+
+def _sign(document_id, expires):
+    message = f"{document_id}:{expires}".encode()
+    return hmac.new(FILE_SERVER_SECRET.encode(), message, hashlib.sha256).hexdigest()
+
+def make_token(document_id, lifetime=LINK_LIFETIME):
+    expires = int(time.time()) + lifetime
+    return f"{document_id}-{expires}-{_sign(document_id, expires)}"
+
+def verify_token(token):
+    """Return the document id a token grants access to, or None"""
+    try:
+        document_id, expires, signature = token.split('-', 2)
+        document_id, expires = int(document_id), int(expires)
+    except ValueError:
+        return None
+    if expires < time.time() or not hmac.compare_digest(signature, _sign(document_id, expires)):
+        return None
+    return document_id
+
+def parse_range(header, size):
+    """Parse a single HTTP byte range into an inclusive (start, end), or None if unsatisfiable"""
+    match = _RANGE_PATTERN.match(header.strip())
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    start, end = match.group(1), match.group(2)
+    if start:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    else:
+        # bytes=-N means the last N bytes
+        start = max(size - int(end), 0)
+        end = size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+class DocumentRequestHandler(BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        match = re.match(r'^/documents/([^/?]+)', self.path)
+        document_id = verify_token(match.group(1)) if match else None
+        if document_id is None:
+            self.send_error(404)
+            return
+        try:
+            with database.open_document(document_id) as (info, f):
+                size = info['file_data_size'] or 0
+                start, end = 0, size - 1
+                status = 200
+                range_header = self.headers.get('Range')
+                if range_header and size:
+                    byte_range = parse_range(range_header, size)
+                    if byte_range is None:
+                        self.send_response(416)
+                        self.send_header('Content-Range', f"bytes */{size}")
+                        self.end_headers()
+                        return
+                    start, end = byte_range
+                    status = 206
+
+                self.send_response(status)
+                self.send_header('Content-Type', info['file_data_mime'] or 'application/octet-stream')
+                self.send_header('Content-Length', str(end - start + 1 if size else 0))
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('Content-Disposition', f"inline; filename*=UTF-8''{quote(info['file_name'] or 'document')}")
+                self.send_header('Cache-Control', 'private, max-age=300')
+                if status == 206:
+                    self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+                self.end_headers()
+                if not send_body or not size:
+                    return
+
+                f.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+        except FileNotFoundError:
+            self.send_error(404)
+        except (BrokenPipeError, ConnectionResetError):
+            # The browser cancelled the request, e.g. while seeking in a video
+            pass
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+def ensure_file_server():
+    """Start the document server once per process"""
+    global _server
+    if _server is not None:
+        return _server
+    with _server_lock:
+        if _server is None:
+            try:
+                server = ThreadingHTTPServer((FILE_SERVER_ADDRESS, FILE_SERVER_PORT), DocumentRequestHandler)
+            except OSError as e:
+                # Another app process already serves this port; its links use the same secret
+                logger.warning(f"Document file server not started: {str(e)}")
+                return None
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name='file-server', daemon=True).start()
+            logger.info(f"Document file server listening on {FILE_SERVER_ADDRESS}:{server.server_port}")
+            _server = server
+    return _server
+
+def stop_file_server():
+    """Stop the document server; the next link starts it again"""
+    global _server
+    with _server_lock:
+        server, _server = _server, None
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+
+def _browser_origin():
+    """(scheme, host name) the current session reached Streamlit at, or (None, None) outside one"""
+    try:
+        headers = st.context.headers
+    except Exception:
+        return None, None
+    host = headers.get('Host') if headers else None
+    if not host:
+        return None, None
+    return headers.get('X-Forwarded-Proto', 'http'), urlsplit(f"//{host}").hostname
+
+def public_url():
+    """The document server's base URL as the current browser should use it"""
+    if FILE_SERVER_PUBLIC_URL:
+        return FILE_SERVER_PUBLIC_URL.rstrip('/')
+    server = ensure_file_server()
+    port = server.server_port if server else FILE_SERVER_PORT
+    scheme, host = _browser_origin()
+    if not host or host in _LOCAL_HOSTS:
+        return f"http://localhost:{port}"
+    if host not in _warned_hosts:
+        _warned_hosts.add(host)
+        problems = [] if FILE_SERVER_ADDRESS not in _LOCAL_HOSTS else [f"the server only listens on {FILE_SERVER_ADDRESS}"]
+        if scheme == 'https':
+            problems.append("browsers block plain HTTP links on an HTTPS page")
+        if problems:
+            logger.warning(f"FILE_SERVER_PUBLIC_URL is not set and the app is used from {host}, so document links "
+                           f"may not load: {'; '.join(problems)}")
+    return f"http://{f'[{host}]' if ':' in host else host}:{port}"
+
+def document_url(document_id):
+    """A short-lived signed URL that streams the document with range support"""
+    return f"{public_url()}/documents/{make_token(document_id)}"
@@ -4,30 +4,33 @@ from database import (
     get_application,
     save_application,
     get_candidate_tests,
-    get_messages,
+    get_conversations_page,
+    get_conversation_messages,
+    mark_conversation_read,
+    get_unread_message_count,
+    get_user_by_email,
     save_message,
+    send_message_bulk,
     delete_message,
     get_documents,
     save_document,
-    get_screening_tests,
+    get_screening_tests_page,
     create_screening_test,
-    assign_test,
+    assign_test_bulk,
     get_test_details,
     start_test,
     submit_test,
     get_pending_edit_requests,
     update_edit_request,
     submit_edit_request,
-    get_total_candidates,
-    get_open_applications,
-    get_scheduled_interviews,
-    get_filled_positions,
+    get_dashboard_snapshot,
     update_filled_positions,
-    get_recent_activities,
     add_new_position,
-    get_all_candidates,
-    get_all_applications,
-    get_all_documents,
+    get_candidates_page,
+    get_applications_page,
+    get_application_positions,
+    list_documents,
+    mark_document_viewed,
     update_user_profile,
     get_user_profile,
     get_user_documents,
@@ -35,31 +38,82 @@ from database import (
     schedule_interview,
     get_candidate_interviews,
     update_interview_response,
-    get_all_interviews,
+    get_interviews_page,
     update_interview_status,
     reschedule_interview,
     update_application_status,
-    get_candidate_details,
+    update_application_status_bulk,
+    get_candidate_360,
     search_candidates,
     get_all_positions,
+    get_positions_page,
     get_total_applicants,
     get_total_messages,
     get_total_documents,
-    get_login_statistics,
-    get_interview_statistics,
-    get_file_data,
-    get_application_statistics,
+    get_document_info,
+    get_query_stats,
+    reset_query_stats,
+    run_maintenance,
+    get_pool_stats,
+    get_writer_stats,
+    get_cache_stats,
+    get_thumbnail,
+    get_thumbnail_stats,
+    store_upload,
     get_user_activity_log,
+    log_activity,
     update_app_setting,
-    get_app_setting
+    get_app_setting,
+    DEFAULT_PAGE_SIZE
 )
 from datetime import datetime, timedelta
 import json
-import io
-from PIL import Image
-import plotly.graph_objects as go
-import plotly.express as px
-import base64
+from file_server import document_url
+from blob_store import UploadRejected
+from passwords import get_hashing_stats, reset_stats as reset_hashing_stats
+
+# plotly is imported inside the page that draws charts: plotly.express
+# alone adds about 0.2 s to a cold start, and candidate sessions never draw
+# a chart. Pictures are shown from thumbnails, so pages never decode them.
+
+PAGE_SIZES = [10, 25, 50, 100]
+
+DOCUMENT_TYPES = [
+    "Degree Certificate", "Other Certificate", "Passport Photograph",
+    "Facial Expression Video", "Resume", "Government ID", "Address Proof",
+    "Job Experience Evidence"
+]
+
+# Uploads are streamed into the blob store and refused as soon as they go
+# over the limit or their content does not match their type
+MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+
+DOCUMENT_MIME_TYPES = {
+    'application/pdf', 'application/msword',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'image/jpeg', 'image/png', 'video/mp4'
+}
+
+PICTURE_MIME_TYPES = {'image/jpeg', 'image/png'}
+
+VISA_TYPES = ["British Citizen", "EU Settlement Scheme", "Skilled Worker Visa", "Health and Care Worker Visa", "Other"]
+
+APPLICATION_STATUSES = ["submitted", "under_review", "interview_scheduled", "rejected", "accepted"]
+
+CANDIDATE_STATUSES = ["active", "inactive"]
+
+CANDIDATE_SORT_LABELS = {"Newest": 'newest', "Oldest": 'oldest', "Name": 'name'}
+
+# Candidates offered by a picker before and after a search; pickers never load the whole roster
+CANDIDATE_PICKER_LIMIT = 25
+
+# Overview login chart periods: label -> (days, rollup granularity)
+LOGIN_PERIODS = {
+    "Last 48 Hours": (2, 'hour'),
+    "Last 7 Days": (7, 'day'),
+    "Last 30 Days": (30, 'day'),
+    "Last 12 Months": (365, 'day'),
+}
 
 def show_landing_page():
 
@@ -354,13 +408,65 @@ def show_password_recovery_page():
         st.session_state.page = 'login'
         st.rerun()
 
+def get_page_cursor(key, filters=None):
+    """Cursor of the page currently shown for a paginated list; back to page one when the filters change"""
+    state = st.session_state.setdefault(f"{key}_pager", {'filters': filters, 'cursor': None})
+    if state['filters'] != filters:
+        state['filters'] = filters
+        state['cursor'] = None
+    return state['cursor']
+
+def get_page_size(key):
+    return st.session_state.get(f"{key}_page_size", DEFAULT_PAGE_SIZE)
+
+def show_page_controls(key, page):
+    """Previous/Next buttons, row count and page size selector for a fetch_page result"""
+    col1, col2, col3, col4 = st.columns([1, 2, 1, 1])
+    with col1:
+        if page['prev_cursor'] and st.button("Previous", key=f"{key}_prev"):
+            st.session_state[f"{key}_pager"]['cursor'] = page['prev_cursor']
+            st.rerun()
+    with col2:
+        if page['total'] is not None:
+            total = f"{page['total']}+" if page['total_capped'] else page['total']
+            st.caption(f"Showing {len(page['rows'])} of {total}")
+    with col3:
+        if page['next_cursor'] and st.button("Next", key=f"{key}_next"):
+            st.session_state[f"{key}_pager"]['cursor'] = page['next_cursor']
+            st.rerun()
+    with col4:
+        st.selectbox("Per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE), key=f"{key}_page_size")
+
+def pick_candidates(key, label, multiple=True, blank=None):
+    """Choose candidates through a search box instead of a list of every candidate.
+
+    The newest candidates are offered until something is typed, then the
+    full-text matches; picks are kept across searches. Returns the chosen
+    [(label, id)] in selection order. With multiple=False at most one can
+    be chosen, and `blank` labels the empty choice.
+    """
+    term = st.text_input("Search candidates", key=f"{key}_search", placeholder="Name or email")
+    if term.strip():
+        matches = search_candidates(term, limit=CANDIDATE_PICKER_LIMIT, ranked=False)
+    else:
+        matches = get_candidates_page(CANDIDATE_PICKER_LIMIT)['rows']
+    options = dict(st.session_state.get(f"{key}_picked", {}))
+    options.update({f"{c['name']} ({c['email']})": c['id'] for c in matches})
+    if multiple:
+        selected = st.multiselect(label, list(options), key=f"{key}_selected")
+    else:
+        choice = st.selectbox(label, [blank] + list(options), key=f"{key}_selected")
+        selected = [] if choice == blank else [choice]
+    st.session_state[f"{key}_picked"] = {name: options[name] for name in selected}
+    return [(name, options[name]) for name in selected]
+
 def show_admin_dashboard():
     st.title("Admin Dashboard")
     st.write("Welcome to the admin dashboard. Here you can manage users, applications, and other administrative tasks.")
 
     # Sidebar for navigation
     st.sidebar.title("Navigation")
-    admin_page = st.sidebar.radio("Go to", ["Overview", "Candidates", "Applications", "Interviews", "Positions", "Documents", "Messages", "Screening Tests"])
+    admin_page = st.sidebar.radio("Go to", ["Overview", "Candidates", "Applications", "Interviews", "Positions", "Documents", "Messages", "Screening Tests", "Performance"])
 
     if admin_page == "Overview":
         show_admin_overview()
@@ -378,39 +484,53 @@ def show_admin_dashboard():
         show_admin_messages()
     elif admin_page == "Screening Tests":
         show_admin_screening_tests()
+    elif admin_page == "Performance":
+        show_admin_performance()
 
 def show_admin_overview():
+    import plotly.express as px
+    import plotly.graph_objects as go
+
     st.header("Overview")
     
+    # The period selector is drawn with the login chart, but its value is needed here
+    login_days, login_granularity = LOGIN_PERIODS[st.session_state.get('login_period', "Last 7 Days")]
+    snapshot = get_dashboard_snapshot(login_days=login_days, login_granularity=login_granularity)
+
     # Display key metrics
     col1, col2, col3, col4 = st.columns(4)
-    col1.metric("Total Candidates", get_total_candidates())
-    col2.metric("Open Applications", get_open_applications())
-    col3.metric("Scheduled Interviews", get_scheduled_interviews())
-    col4.metric("Filled Positions", get_filled_positions())
+    col1.metric("Total Candidates", snapshot['total_candidates'])
+    col2.metric("Open Applications", snapshot['open_applications'])
+    col3.metric("Scheduled Interviews", snapshot['scheduled_interviews'])
+    col4.metric("Filled Positions", snapshot['filled_positions'])
 
     # Recent Activities
     st.subheader("Recent Activities")
-    activities = get_recent_activities()
-    for activity in activities:
+    for activity in snapshot['recent_activities']:
         st.write(activity)
 
     # Login Statistics
-    st.subheader("Login Statistics (Last 7 Days)")
-    login_stats = get_login_statistics()
-    fig = go.Figure(data=go.Bar(x=list(login_stats.keys()), y=list(login_stats.values())))
-    fig.update_layout(title="Daily Logins", xaxis_title="Date", yaxis_title="Number of Logins")
+    st.subheader("Login Statistics")
+    st.selectbox("Period", list(LOGIN_PERIODS), index=1, key='login_period')
+    login_stats = snapshot['login_statistics']
+    failed_stats = snapshot['failed_login_statistics']
+    fig = go.Figure(data=[
+        go.Bar(name="Successful", x=list(login_stats.keys()), y=list(login_stats.values())),
+        go.Bar(name="Failed", x=list(failed_stats.keys()), y=list(failed_stats.values()))
+    ])
+    fig.update_layout(barmode='stack', title="Hourly Logins" if login_granularity == 'hour' else "Daily Logins",
+                      xaxis_title="Time" if login_granularity == 'hour' else "Date", yaxis_title="Number of Logins")
     st.plotly_chart(fig)
 
     # Interview Statistics
     st.subheader("Interview Statistics")
-    interview_stats = get_interview_statistics()
+    interview_stats = snapshot['interview_statistics']
     fig = px.pie(values=list(interview_stats.values()), names=list(interview_stats.keys()), title="Interview Status Distribution")
     st.plotly_chart(fig)
 
     # Application Statistics
     st.subheader("Application Statistics")
-    application_stats = get_application_statistics()
+    application_stats = snapshot['application_statistics']
     fig = px.pie(values=list(application_stats.values()), names=list(application_stats.keys()), title="Application Status Distribution")
     st.plotly_chart(fig)
 
@@ -448,91 +568,182 @@ def show_admin_candidates():
     
     # Search functionality
     search_term = st.text_input("Search Candidates", "")
+    page = None
     if search_term:
         candidates = search_candidates(search_term)
+        grid_key = f"candidates_grid_search_{search_term}"
     else:
-        candidates = get_all_candidates()
-
-    # Display candidates
-    for candidate in candidates:
-        with st.expander(f"{candidate['name']} - {candidate['email']}"):
-            st.write(f"Registration Date: {candidate['registration_date']}")
-            st.write(f"Status: {candidate['status']}")
-            if st.button(f"View Details for {candidate['name']}"):
-                show_candidate_details(candidate['id'])
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            status = st.selectbox("Status", ["All"] + CANDIDATE_STATUSES, key="candidates_status")
+        with col2:
+            registered = st.date_input("Registered Between", value=(), key="candidates_registered")
+        with col3:
+            position = st.selectbox("Applied For", ["All"] + get_application_positions(), key="candidates_position")
+        with col4:
+            sort = st.selectbox("Sort By", list(CANDIDATE_SORT_LABELS), key="candidates_sort")
+
+        filters = {
+            'status': None if status == "All" else status,
+            'registered_from': registered[0] if len(registered) > 0 else None,
+            'registered_to': registered[1] if len(registered) > 1 else None,
+            'position': None if position == "All" else position,
+            'sort': CANDIDATE_SORT_LABELS[sort]
+        }
+        cursor = get_page_cursor('candidates', filters)
+        page = get_candidates_page(get_page_size('candidates'), cursor, include_total=True, **filters)
+        candidates = page['rows']
+        # A new page or filter gets a fresh grid, so a selected row index never points at another candidate
+        grid_key = f"candidates_grid_{cursor}_{sorted(filters.items())}"
+
+    if not candidates:
+        st.info("No candidates match these filters.")
+        return
+
+    # One table widget however many rows are shown; details load only for the selected row
+    columns = {'name': "Name", 'email': "Email", 'status': "Status", 'registration_date': "Registered"}
+    if search_term:
+        columns['snippet'] = "Matched"
+    event = st.dataframe(
+        [{label: candidate.get(field) for field, label in columns.items()} for candidate in candidates],
+        hide_index=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        key=grid_key
+    )
+
+    if page:
+        show_page_controls('candidates', page)
+
+    selected = event.selection.rows
+    if selected:
+        show_candidate_details(candidates[selected[0]]['id'])
+    else:
+        st.caption("Select a row to see the candidate's details.")
 
 def show_candidate_details(candidate_id):
-    details = get_candidate_details(candidate_id)
-    st.subheader(f"Details for {details['first_name']} {details['last_name']}")
+    details = get_candidate_360(candidate_id)
+    if not details:
+        st.error("Candidate not found")
+        return
+    profile = details['profile']
+    st.subheader(f"Details for {profile['first_name']} {profile['last_name']}")
     
     col1, col2 = st.columns(2)
     with col1:
-        st.write(f"Email: {details['email']}")
-        st.write(f"Mobile: {details['mobile']}")
-        st.write(f"Registration Date: {details['registration_date']}")
-        st.write(f"Age: {details['age']}")
-        st.write(f"Location: {details['location']}")
-        st.write(f"Country: {details['country']}")
+        st.write(f"Email: {profile['email']}")
+        st.write(f"Mobile: {profile['mobile']}")
+        st.write(f"Registration Date: {profile['registration_date']}")
+        st.write(f"Age: {profile['age']}")
+        st.write(f"Location: {profile['location']}")
+        st.write(f"Country: {profile['country']}")
     
     with col2:
-        if details['profile_picture']:
-            st.image(details['profile_picture'], caption="Profile Picture", use_column_width=True)
+        picture = get_thumbnail(profile['profile_picture_sha256'], profile['profile_picture_mime'], 'medium')
+        if picture:
+            st.image(picture, caption="Profile Picture")
         else:
             st.write("No profile picture uploaded")
     
-    if details['application_status']:
-        st.subheader("Application Information")
-        st.write(f"Application Status: {details['application_status']}")
-        st.write(f"Application Submitted: {details['application_submitted_date']}")
-        st.write("Application Data:")
-        st.json(json.loads(details['application_data']))
+    st.subheader(f"Applications ({len(details['applications'])})")
+    for application in details['applications']:
+        st.write(f"Status: {application['status']} - Submitted: {application['submitted_date']}")
+        st.json(json.loads(application['application_data'] or '{}'), expanded=False)
     
-    if details['interview_date']:
-        st.subheader("Interview Information")
-        st.write(f"Interview Scheduled: {details['interview_date']} at {details['interview_time']}")
-        st.write(f"Interview Status: {details['interview_status']}")
+    st.subheader(f"Interviews ({len(details['interviews'])})")
+    for interview in details['interviews']:
+        st.write(f"{interview['date']} at {interview['time']} - {interview['type']} {interview['stage']} - Status: {interview['status']}")
+        if interview['candidate_response']:
+            st.write(f"Candidate response: {interview['candidate_response']} {interview['candidate_note'] or ''}")
     
-    if details['test_score'] is not None:
-        st.subheader("Screening Test Information")
-        st.write(f"Test Score: {details['test_score']}")
-        st.write("Test Responses:")
-        st.json(json.loads(details['test_responses']))
+    st.subheader(f"Screening Tests ({len(details['tests'])})")
+    for test in details['tests']:
+        st.write(f"{test['title']} - Status: {test['status']} - Score: {test['score'] if test['score'] is not None else 'N/A'}")
+        if test['responses']:
+            st.json(json.loads(test['responses']), expanded=False)
     
-    st.subheader("Documents")
-    documents = get_user_documents(candidate_id)
-    for doc in documents:
+    st.subheader(f"Documents ({len(details['documents'])})")
+    for doc in details['documents']:
         st.write(f"{doc['file_name']} - {doc['file_type']} - {doc['upload_date']}")
-        if st.button(f"View {doc['file_name']}"):
-            file_data = get_file_data(doc['id'])
-            if file_data:
-                file_type = file_data['file_type']
-                if file_type.startswith('image'):
-                    st.image(file_data['file_data'])
-                elif file_type == 'application/pdf':
-                    base64_pdf = base64.b64encode(file_data['file_data']).decode('utf-8')
-                    pdf_display = f'<iframe src="data:application/pdf;base64,{base64_pdf}" width="700" height="1000" type="application/pdf"></iframe>'
-                    st.markdown(pdf_display, unsafe_allow_html=True)
-                else:
-                    st.download_button("Download File", file_data['file_data'], file_name=file_data['file_name'])
+        if st.button(f"View {doc['file_name']}", key=f"view_document_{doc['id']}"):
+            show_document(doc['id'])
 
-    st.subheader("Messages")
-    messages = get_messages(candidate_id)
-    for message in messages:
-        st.write(f"From: {message['sender_name']} - {message['sent_date']}")
+    st.subheader(f"Messages ({len(details['messages'])})")
+    for message in details['messages']:
+        st.write(f"From: {message['sender_name']} To: {message['recipient_name']} - {message['sent_date']}")
         st.write(message['message'])
         st.markdown("---")
 
+def show_document(document_id):
+    """Preview or link a document; the browser streams the bytes from the file server"""
+    info = get_document_info(document_id)
+    if not info:
+        st.error("Document not found")
+        return
+    mark_document_viewed(document_id)
+    url = document_url(document_id)
+    file_type = info['file_data_mime'] or ''
+    if file_type.startswith('image'):
+        st.image(url)
+    elif file_type.startswith('video'):
+        st.video(url)
+    elif file_type == 'application/pdf':
+        st.markdown(f'<iframe src="{url}" width="700" height="1000" type="application/pdf"></iframe>', unsafe_allow_html=True)
+    st.link_button("Download File", url)
+
 def show_admin_applications():
     st.header("Application Management")
     
-    applications = get_all_applications()
-    for app in applications:
+    # Filters
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        position = st.selectbox("Position", ["All"] + get_application_positions())
+    with col2:
+        min_experience = st.number_input("Min. Years of Experience", min_value=0, max_value=50, value=0)
+    with col3:
+        visa_type = st.selectbox("Visa Type", ["All"] + VISA_TYPES)
+    with col4:
+        status = st.selectbox("Status", ["All"] + APPLICATION_STATUSES)
+    with col5:
+        sort = st.selectbox("Sort By", ["Newest", "Most experienced"])
+
+    filters = {
+        'position': None if position == "All" else position,
+        'min_experience': min_experience or None,
+        'visa_type': None if visa_type == "All" else visa_type,
+        'status': None if status == "All" else status,
+        'sort': 'experience' if sort == "Most experienced" else 'submitted'
+    }
+    page = get_applications_page(get_page_size('applications'), get_page_cursor('applications', filters), include_total=True, **filters)
+    if not page['rows']:
+        st.info("No applications match these filters.")
+
+    # Update several applications on this page at once
+    with st.form("bulk_application_status"):
+        app_options = {f"{app['candidate_name']} - {app['position']} (#{app['id']})": app['id'] for app in page['rows']}
+        selected_apps = st.multiselect("Select Applications", options=list(app_options.keys()))
+        bulk_status = st.selectbox("New Status", ["under_review", "interview_scheduled", "rejected", "accepted"])
+        if st.form_submit_button("Update Selected"):
+            outcomes = update_application_status_bulk([app_options[app] for app in selected_apps], bulk_status)
+            failed = [app for app, outcome in zip(selected_apps, outcomes) if not outcome['ok']]
+            for app, outcome in zip(selected_apps, outcomes):
+                if outcome['ok']:
+                    log_activity('application_status_updated', f"#{app_options[app]} {bulk_status}", user_id=st.session_state.user['id'], entity='application', entity_id=app_options[app])
+            if failed:
+                st.error(f"Failed to update: {', '.join(failed)}")
+            elif selected_apps:
+                st.success(f"Updated {len(selected_apps)} application(s).")
+                st.rerun()
+
+    for app in page['rows']:
         with st.expander(f"{app['candidate_name']} - {app['position']}"):
             st.write(f"Status: {app['status']}")
             st.write(f"Submitted: {app['submitted_date']}")
+            st.write(f"Experience: {app['years_experience']} years - Visa: {app['visa_type'] or 'N/A'} - Start: {app['start_date']}")
             new_status = st.selectbox("Update Status", ["under_review", "interview_scheduled", "rejected", "accepted"], key=f"status_{app['id']}")
             if st.button("Update", key=f"update_{app['id']}"):
                 if update_application_status(app['id'], new_status):
+                    log_activity('application_status_updated', f"#{app['id']} {new_status}", user_id=st.session_state.user['id'], entity='application', entity_id=app['id'])
                     st.success("Application status updated successfully!")
                 else:
                     st.error("Failed to update application status. Please try again.")
@@ -540,6 +751,8 @@ def show_admin_applications():
             if st.button("View Full Application", key=f"view_{app['id']}"):
                 show_full_application(app['id'])
 
+    show_page_controls('applications', page)
+
 def show_full_application(application_id):
     application = get_application(application_id)
     if application:
@@ -559,10 +772,9 @@ def show_admin_interviews():
     
     # Schedule new interview
     st.subheader("Schedule New Interview")
+    # Searching reruns the page, which a widget inside the form cannot do
+    selected_candidates = pick_candidates('interview_candidates', "Select Candidates")
     with st.form("schedule_interview"):
-        candidates = get_all_candidates()
-        candidate_options = {f"{c['name']} ({c['email']})": c['id'] for c in candidates}
-        selected_candidates = st.multiselect("Select Candidates", options=list(candidate_options.keys()))
         date = st.date_input("Interview Date")
         time = st.time_input("Interview Time")
         interview_type = st.selectbox("Interview Type", ["In-person", "Phone", "Video"])
@@ -571,16 +783,18 @@ def show_admin_interviews():
         stage = st.selectbox("Interview Stage", ["First", "Second", "Final"])
         
         if st.form_submit_button("Schedule Interview"):
-            candidate_ids = [candidate_options[c] for c in selected_candidates]
+            candidate_ids = [candidate_id for _, candidate_id in selected_candidates]
             if schedule_interview(candidate_ids, date.strftime('%Y-%m-%d'), time.strftime('%H:%M:%S'), interview_type, role, dress_code, stage):
+                for candidate_id in candidate_ids:
+                    log_activity('interview_scheduled', f"{date} {time} {stage}", user_id=st.session_state.user['id'], entity='user', entity_id=candidate_id)
                 st.success("Interview scheduled successfully!")
             else:
                 st.error("Failed to schedule interview. Please try again.")
     
     # Manage existing interviews
     st.subheader("Manage Interviews")
-    interviews = get_all_interviews()
-    for interview in interviews:
+    page = get_interviews_page(get_page_size('interviews'), get_page_cursor('interviews'), include_total=True)
+    for interview in page['rows']:
         with st.expander(f"{interview['first_name']} {interview['last_name']} - {interview['date']} {interview['time']}"):
             st.write(f"Type: {interview['type']}")
             st.write(f"Role: {interview['role']}")
@@ -600,6 +814,8 @@ def show_admin_interviews():
                 else:
                     st.error("Failed to reschedule interview. Please try again.")
 
+    show_page_controls('interviews', page)
+
 def show_admin_positions():
     st.header("Position Management")
     
@@ -617,8 +833,8 @@ def show_admin_positions():
 
     # Display and manage existing positions
     st.subheader("Existing Positions")
-    positions = get_all_positions()
-    for position in positions:
+    page = get_positions_page(get_page_size('positions'), get_page_cursor('positions'), include_total=True)
+    for position in page['rows']:
         with st.expander(f"{position['title']} (Required: {position['required_staff']}, Filled: {position['filled_staff']})"):
             st.write(f"Description: {position['description']}")
             new_filled = st.number_input("Update Filled Staff", min_value=0, value=position['filled_staff'], key=f"filled_{position['id']}")
@@ -628,54 +844,122 @@ def show_admin_positions():
                 else:
                     st.error("Failed to update position. Please try again.")
 
+    show_page_controls('positions', page)
+
 def show_admin_documents():
     st.header("Document Management")
-    
-    documents = get_all_documents()
-    for doc in documents:
-        with st.expander(f"{doc['candidate_name']} - {doc['file_name']}"):
+
+    # Filters
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        candidate = pick_candidates('document_candidate', "Candidate", multiple=False, blank="All candidates")
+    with col2:
+        document_type = st.selectbox("Document Type", ["All"] + DOCUMENT_TYPES)
+    with col3:
+        date_range = st.date_input("Uploaded Between", value=(), key="documents_date_range")
+    with col4:
+        viewed = st.selectbox("Viewed", ["All", "Not viewed", "Viewed"])
+
+    filters = {
+        'user_id': candidate[0][1] if candidate else None,
+        'file_type': None if document_type == "All" else document_type,
+        'date_from': date_range[0] if len(date_range) > 0 else None,
+        'date_to': date_range[1] if len(date_range) > 1 else None,
+        'viewed': {"All": None, "Not viewed": False, "Viewed": True}[viewed]
+    }
+    page = list_documents(get_page_size('documents'), get_page_cursor('documents', filters), include_total=True, **filters)
+    if not page['rows']:
+        st.info("No documents match these filters.")
+    for doc in page['rows']:
+        label = f"{doc['candidate_name']} - {doc['file_name']}"
+        if not doc['viewed']:
+            label += " (new)"
+        with st.expander(label):
+            preview = get_thumbnail(doc['sha256'], doc['mime_type'])
+            if preview:
+                st.image(preview)
             st.write(f"Type: {doc['document_type']}")
             st.write(f"Uploaded: {doc['upload_date']}")
             if st.button("View Document", key=f"view_{doc['id']}"):
-                file_data = get_file_data(doc['id'])
-                if file_data:
-                    file_type = file_data['file_type']
-                    if file_type.startswith('image'):
-                        st.image(file_data['file_data'])
-                    elif file_type == 'application/pdf':
-                        base64_pdf = base64.b64encode(file_data['file_data']).decode('utf-8')
-                        pdf_display = f'<iframe src="data:application/pdf;base64,{base64_pdf}" width="700" height="1000" type="application/pdf"></iframe>'
-                        st.markdown(pdf_display, unsafe_allow_html=True)
-                    else:
-                        st.download_button("Download File", file_data['file_data'], file_name=file_data['file_name'])
+                show_document(doc['id'])
+
+    show_page_controls('documents', page)
+
+def show_inbox(key, user_id=None):
+    """A page of conversations to pick from (every conversation when user_id is None); returns the chosen one"""
+    page = get_conversations_page(user_id, get_page_size(key), get_page_cursor(key, filters=user_id), include_total=True)
+    if not page['rows']:
+        st.info("No conversations yet.")
+        return None
+
+    def label(conversation):
+        if user_id is None:
+            title = f"{conversation['user_low_name']} and {conversation['user_high_name']}"
+        else:
+            title = conversation['other_name'] or "Unknown user"
+        unread = f" ({conversation['unread_count']} unread)" if conversation['unread_count'] else ""
+        preview = (conversation['last_message'] or "")[:60]
+        return f"{title}{unread} - {conversation['last_activity']}: {preview}"
+
+    conversations = {c['conversation_id']: c for c in page['rows']}
+    selected = st.radio("Conversations", list(conversations), format_func=lambda cid: label(conversations[cid]), key=f"{key}_selected")
+    show_page_controls(key, page)
+    return conversations.get(selected)
+
+def show_conversation(key, conversation, user_id, can_reply=True):
+    """A conversation's messages, newest first, with delete buttons and a reply box"""
+    conversation_id = conversation['conversation_id']
+    if conversation['unread_count']:
+        mark_conversation_read(conversation_id, user_id)
+    page = get_conversation_messages(conversation_id, get_page_size(key), get_page_cursor(key, filters=conversation_id))
+    for message in page['rows']:
+        st.markdown(f"**{message['sender_name']}** - {message['sent_date']}")
+        st.write(message['message'])
+        if st.button("Delete", key=f"delete_{message['id']}"):
+            if delete_message(message['id']):
+                st.success("Message deleted successfully!")
+                st.rerun()
+            else:
+                st.error("Failed to delete message. Please try again.")
+    show_page_controls(key, page)
+
+    if can_reply:
+        reply = st.text_area("Reply", key=f"{key}_reply_{conversation_id}")
+        if st.button("Send Reply", key=f"{key}_send_{conversation_id}"):
+            if save_message(user_id, conversation['other_user_id'], reply):
+                st.success("Reply sent!")
+                st.rerun()
+            else:
+                st.error("Failed to send reply. Please try again.")
 
 def show_admin_messages():
     st.header("Message Management")
-    
-    # Display all messages
-    messages = get_messages(None)  # None to get all messages
-    for message in messages:
-        with st.expander(f"From: {message['sender_name']} - To: {message['recipient_name']} - {message['sent_date']}"):
-            st.write(message['message'])
-            if st.button("Delete", key=f"delete_{message['id']}"):
-                if delete_message(message['id']):
-                    st.success("Message deleted successfully!")
-                    st.rerun()
-                else:
-                    st.error("Failed to delete message. Please try again.")
+
+    admin_id = st.session_state.user['id']
+    scope = st.radio("Show", ["My Conversations", "All Conversations"], horizontal=True)
+    st.caption(f"Unread messages: {get_unread_message_count(admin_id)}")
+    owner = admin_id if scope == "My Conversations" else None
+    conversation = show_inbox('admin_inbox', owner)
+    if conversation:
+        st.subheader("Conversation")
+        # Other admins' conversations can be read and moderated, not answered
+        show_conversation('admin_thread', conversation, admin_id, can_reply=owner is not None)
     
     # Send a new message
     st.subheader("Send a New Message")
-    candidates = get_all_candidates()
-    recipient = st.selectbox("Select Recipient", [f"{c['name']} ({c['email']})" for c in candidates])
+    # (label, id) in selection order; outcomes come back in the order sent, so they stay paired
+    selected = pick_candidates('message_recipients', "Select Recipients")
     message_content = st.text_area("Message")
     if st.button("Send Message"):
-        recipient_id = next(c['id'] for c in candidates if f"{c['name']} ({c['email']})" == recipient)
-        if save_message(st.session_state.user['id'], recipient_id, message_content):
-            st.success("Message sent successfully!")
+        outcomes = send_message_bulk(st.session_state.user['id'], [candidate_id for _, candidate_id in selected], message_content)
+        failed = [label for (label, _), outcome in zip(selected, outcomes) if not outcome['ok']]
+        if selected and not failed:
+            st.success(f"Message sent to {len(selected)} recipient(s)!")
             st.rerun()
+        elif failed:
+            st.error(f"Failed to send message to: {', '.join(failed)}")
         else:
-            st.error("Failed to send message. Please try again.")
+            st.warning("Select at least one recipient.")
 
 def show_admin_screening_tests():
     st.header("Screening Test Management")
@@ -716,8 +1000,8 @@ def show_admin_screening_tests():
     
     # Manage existing tests
     st.subheader("Existing Screening Tests")
-    tests = get_screening_tests()
-    for test in tests:
+    page = get_screening_tests_page(get_page_size('screening_tests'), get_page_cursor('screening_tests'), include_total=True)
+    for test in page['rows']:
         with st.expander(f"{test['title']} - Created on {test['creation_date']}"):
             st.write(f"Description: {test['description']}")
             st.write(f"Duration: {test['duration']} minutes")
@@ -726,16 +1010,70 @@ def show_admin_screening_tests():
                 st.write(f"Q{i+1}: {question['text']}")
             
             # Assign test to candidates
-            candidates = get_all_candidates()
-            selected_candidates = st.multiselect("Assign to Candidates", [f"{c['name']} ({c['email']})" for c in candidates])
+            selected_candidates = pick_candidates(f"assign_candidates_{test['id']}", "Assign to Candidates")
             if st.button("Assign Test", key=f"assign_{test['id']}"):
-                for candidate in selected_candidates:
-                    candidate_id = next(c['id'] for c in candidates if f"{c['name']} ({c['email']})" == candidate)
-                    if assign_test(test['id'], candidate_id):
+                outcomes = assign_test_bulk(test['id'], [candidate_id for _, candidate_id in selected_candidates])
+                for (candidate, _), outcome in zip(selected_candidates, outcomes):
+                    if outcome['ok']:
                         st.success(f"Test assigned to {candidate}")
                     else:
                         st.error(f"Failed to assign test to {candidate}")
 
+    show_page_controls('screening_tests', page)
+
+def show_admin_performance():
+    st.header("Performance")
+
+    statements = get_query_stats()
+    total_calls = sum(s['calls'] for s in statements)
+    total_ms = sum(s['total_ms'] for s in statements)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Queries", total_calls)
+    col2.metric("Total Query Time", f"{total_ms / 1000:.2f} s")
+    col3.metric("Slow Queries", sum(s['slow'] for s in statements))
+    col4.metric("Query Errors", sum(s['errors'] for s in statements))
+
+    st.subheader("Top Statements by Total Time")
+    top = st.selectbox("Show", [10, 25, 50, 100], key="performance_top")
+    st.dataframe(
+        [{k: v for k, v in s.items() if k != 'plan'} for s in statements[:top]],
+        column_config={'statement': st.column_config.TextColumn("Statement", width="large")}
+    )
+
+    slow = [s for s in statements if s['plan']]
+    if slow:
+        st.subheader("Slow Query Plans")
+        for s in slow:
+            with st.expander(f"{s['max_ms']:.0f} ms max - {s['statement'][:100]}"):
+                st.code(s['statement'], language="sql")
+                st.code("\n".join(s['plan']))
+
+    st.subheader("Connections and Cache")
+    st.write("Connection pools")
+    st.json(get_pool_stats())
+    st.write("Writer")
+    st.json(get_writer_stats())
+    st.write("Query cache")
+    st.json(get_cache_stats())
+    st.write("Password hashing")
+    st.json(get_hashing_stats())
+    st.write("Thumbnails")
+    st.json(get_thumbnail_stats())
+
+    if st.button("Reset Statistics"):
+        reset_query_stats()
+        reset_hashing_stats()
+        st.rerun()
+
+    st.subheader("Maintenance")
+    last_run = get_app_setting('last_maintenance')
+    last_run = datetime.fromtimestamp(float(last_run)).strftime('%Y-%m-%d %H:%M') if last_run else "never"
+    st.write(f"Old login events and unreferenced files are cleaned up once a day. Last run: {last_run}")
+    if st.button("Run Maintenance Now"):
+        outcome = run_maintenance()
+        st.success(f"Old login events {'pruned' if outcome['login_events_pruned'] else 'could not be pruned'}; "
+                   f"{outcome['files_removed']} unreferenced file(s) removed.")
+
 def show_candidate_dashboard():
     st.title(f"Welcome, {st.session_state.user['first_name']}!")
     st.write("Here you can manage your profile, applications, and messages.")
@@ -768,15 +1106,15 @@ def show_candidate_profile():
     st.header("Your Profile")
     
     user_id = st.session_state.user['id']
-    profile = get_user_profile(user_id)
+    profile = get_user_profile(user_id, include_picture=False)
     
     with st.form("update_profile"):
         col1, col2 = st.columns(2)
         with col1:
             
-            if profile['profile_picture']:
-                image = Image.open(io.BytesIO(profile['profile_picture']))
-                st.image(image, caption="Profile Picture", use_column_width=True)
+            picture = get_thumbnail(profile['profile_picture_sha256'], profile['profile_picture_mime'], 'medium')
+            if picture:
+                st.image(picture, caption="Profile Picture")
             else:
                 st.info("No profile picture uploaded")
 
@@ -793,10 +1131,14 @@ def show_candidate_profile():
         
         uploaded_file = st.file_uploader("Choose a profile picture", type=["jpg", "png", "jpeg"])
         if uploaded_file is not None:
-            image = Image.open(uploaded_file)
-            st.image(image, caption="Uploaded Image", use_column_width=True,  width=50)
+            st.image(uploaded_file, caption="Uploaded Image", width=160)
         
         if st.form_submit_button("Update Profile"):
+            try:
+                picture = store_upload(uploaded_file, max_size=MAX_UPLOAD_BYTES, allowed_types=PICTURE_MIME_TYPES)
+            except UploadRejected as e:
+                st.error(f"Profile picture not saved: {str(e)}")
+                return
             profile_data = {
                 'first_name': first_name,
                 'last_name': last_name,
@@ -805,7 +1147,7 @@ def show_candidate_profile():
                 'age': age,
                 'location': location,
                 'country': country,
-                'profile_picture': uploaded_file.getvalue() if uploaded_file else profile['profile_picture']
+                'profile_picture': picture
             }
             if update_user_profile(user_id, profile_data):
                 st.success("Profile updated successfully!")
@@ -827,7 +1169,7 @@ def show_candidate_application():
     st.header("Your Application")
     
     user_id = st.session_state.user['id']
-    application = get_application(user_id)
+    application = get_application(user_id, include_files=False)
     
     if application:
         st.write(f"Status: {application['status']}")
@@ -882,7 +1224,7 @@ def show_candidate_application():
             st.write("Work Authorization")
             work_auth = st.radio("Are you authorized to work in the UK?", ("Yes", "No"))
             if work_auth == "Yes":
-                visa_type = st.selectbox("Visa Type", ["British Citizen", "EU Settlement Scheme", "Skilled Worker Visa", "Health and Care Worker Visa", "Other"])
+                visa_type = st.selectbox("Visa Type", VISA_TYPES)
             
             # References
             st.write("References")
@@ -943,7 +1285,13 @@ def show_candidate_application():
                             'willing_to_relocate': willing_to_relocate == "Yes"
                         }
                     }
-                    if save_application(user_id, application_data, resume.getvalue(), cover_letter.getvalue()):
+                    try:
+                        resume_ref = store_upload(resume, max_size=MAX_UPLOAD_BYTES, allowed_types={'application/pdf'})
+                        cover_letter_ref = store_upload(cover_letter, max_size=MAX_UPLOAD_BYTES, allowed_types={'application/pdf'})
+                    except UploadRejected as e:
+                        st.error(f"Application not submitted: {str(e)}")
+                        return
+                    if save_application(user_id, application_data, resume_ref, cover_letter_ref):
                         st.success("Application submitted successfully!")
                     else:
                         st.error("Failed to submit application. Please try again.")
@@ -952,25 +1300,22 @@ def show_candidate_messages():
     st.header("Your Messages")
     
     user_id = st.session_state.user['id']
-    messages = get_messages(user_id)
-    
-    for message in messages:
-        with st.expander(f"From: {message['sender_name']} - {message['sent_date']}"):
-            st.write(message['message'])
-            if st.button("Delete", key=f"delete_{message['id']}"):
-                if delete_message(message['id']):
-                    st.success("Message deleted successfully!")
-                    st.rerun()
-                else:
-                    st.error("Failed to delete message. Please try again.")
+    st.caption(f"Unread messages: {get_unread_message_count(user_id)}")
+    conversation = show_inbox('candidate_inbox', user_id)
+    if conversation:
+        st.subheader("Conversation")
+        show_conversation('candidate_thread', conversation, user_id)
     
     st.subheader("Send a Message")
     recipient = st.text_input("Recipient Email")
     message_content = st.text_area("Message")
     if st.button("Send"):
-        if save_message(user_id, recipient, message_content):
+        recipient_user = get_user_by_email(recipient.strip())
+        if recipient_user is None:
+            st.error("No user is registered with that email address.")
+        elif save_message(user_id, recipient_user['id'], message_content):
             st.success("Message sent successfully!")
-            st.empty()  # Clear the input fields
+            st.rerun()
         else:
             st.error("Failed to send message. Please try again.")
 
@@ -982,6 +1327,9 @@ def show_candidate_documents():
     
     for doc in documents:
         with st.expander(f"{doc['file_name']} - {doc['upload_date']}"):
+            preview = get_thumbnail(doc['file_data_sha256'], doc['file_data_mime'])
+            if preview:
+                st.image(preview)
             st.write(f"Type: {doc['file_type']}")
             if st.button("Delete", key=f"delete_{doc['id']}"):
                 if delete_document(doc['id'], user_id):
@@ -991,19 +1339,19 @@ def show_candidate_documents():
                     st.error("Failed to delete document. Please try again.")
     
     st.subheader("Upload New Document")
-    file_type = st.selectbox("Document Type", [
-        "Degree Certificate", "Other Certificate", "Passport Photograph",
-        "Facial Expression Video", "Resume", "Government ID", "Address Proof",
-        "Job Experience Evidence"
-    ])
+    file_type = st.selectbox("Document Type", DOCUMENT_TYPES)
     uploaded_file = st.file_uploader("Choose a file", type=["pdf", "doc", "docx", "jpg", "png", "mp4"])
     if uploaded_file is not None:
-        file_size = uploaded_file.size / (1024 * 1024)  # Convert to MB
-        if file_size > 5:
-            st.error("File size exceeds 5MB limit. Please upload a smaller file.")
+        if uploaded_file.size > MAX_UPLOAD_BYTES:
+            st.error(f"File size exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)}MB limit. Please upload a smaller file.")
         else:
             if st.button("Upload"):
-                if save_document(user_id, uploaded_file.name, uploaded_file.getvalue(), file_type):
+                try:
+                    ref = store_upload(uploaded_file, max_size=MAX_UPLOAD_BYTES, allowed_types=DOCUMENT_MIME_TYPES)
+                except UploadRejected as e:
+                    st.error(f"File not uploaded: {str(e)}")
+                    return
+                if save_document(user_id, uploaded_file.name, ref, file_type):
                     st.success("Document uploaded successfully!")
                 else:
                     st.error("Failed to upload document. Please try again.")
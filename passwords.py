@@ -0,0 +1,181 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import bcrypt
+
+# Password hashing for auth.py.
+#
+# bcrypt runs on a small pool of worker threads (it releases the GIL while
+# hashing), so a burst of logins waits its turn instead of taking every core
+# away from page renders. At most MAX_QUEUED calls wait for a worker; beyond
+# that callers get PasswordHasherBusy straight away. The cost factor comes
+# from BCRYPT_ROUNDS or is calibrated once per process to take about
+# TARGET_HASH_MS, and hashes with a lower cost are replaced on the next
+# successful login (see needs_rehash).
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.environ.get('BCRYPT_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+MAX_QUEUED = 32          # calls waiting for a worker before new ones are refused
+QUEUE_TIMEOUT = 30.0     # seconds a caller waits for its result
+TARGET_HASH_MS = 250     # calibration target for one hash
+MIN_ROUNDS = 10          # never calibrate below this, however slow the host
+MAX_ROUNDS = 15
+ROUNDS = int(os.environ['BCRYPT_ROUNDS']) if os.environ.get('BCRYPT_ROUNDS') else None  # None calibrates
+
+class PasswordHasherBusy(RuntimeError):
+    """Raised when MAX_QUEUED calls are already waiting for a worker"""
+
+_lock = threading.Lock()
+_executor = None
+_slots = threading.BoundedSemaphore(WORKERS + MAX_QUEUED)
+_in_flight = 0
+_samples = {'hash_ms': deque(maxlen=1000), 'verify_ms': deque(maxlen=1000), 'queue_ms': deque(maxlen=1000)}
+stats = {'hashes': 0, 'verifies': 0, 'rehashes': 0, 'rejected': 0, 'timeouts': 0}
+
+def calibrate(target_ms=TARGET_HASH_MS):
+    """The highest cost factor whose hash takes no more than target_ms on this host"""
+    # Each extra round doubles the work, so one cheap measurement predicts the rest
+    probe_rounds = 8
+    elapsed_ms = min(_time_hash(probe_rounds) for _ in range(3))
+    rounds = probe_rounds + int(math.floor(math.log2(max(target_ms / max(elapsed_ms, 0.01), 1))))
+    return max(MIN_ROUNDS, min(MAX_ROUNDS, rounds))
+
+def _time_hash(rounds):
+    start = time.perf_counter()
+    bcrypt.hashpw(b'calibration', bcrypt.gensalt(rounds))
+    return (time.perf_counter() - start) * 1000
+
+def get_rounds():
+    """The configured cost factor, calibrating it on first use"""
+    global ROUNDS
+    if ROUNDS is None:
+        with _lock:
+            if ROUNDS is None:
+                ROUNDS = calibrate()
+                logger.info(f"bcrypt cost factor calibrated to {ROUNDS} (target {TARGET_HASH_MS} ms)")
+    return ROUNDS
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='bcrypt')
+    return _executor
+
+def _run(kind, func, *args):
+    """Run func on the pool and wait for it, recording queueing and hashing time"""
+    global _in_flight
+    if not _slots.acquire(blocking=False):
+        with _lock:
+            stats['rejected'] += 1
+        raise PasswordHasherBusy("Too many password checks are already queued")
+    submitted = time.perf_counter()
+
+    def task():
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            finished = time.perf_counter()
+            with _lock:
+                _samples['queue_ms'].append((started - submitted) * 1000)
+                _samples[f'{kind}_ms'].append((finished - started) * 1000)
+
+    with _lock:
+        _in_flight += 1
+    try:
+        future = _get_executor().submit(task)
+    except BaseException:
+        _release_slot(None)
+        raise
+    # The slot is held until the job is done or cancelled, not just while the caller waits
+    future.add_done_callback(_release_slot)
+    try:
+        return future.result(QUEUE_TIMEOUT)
+    except TimeoutError:
+        # A job still queued is dropped; one already hashing keeps its slot until it finishes
+        future.cancel()
+        with _lock:
+            stats['timeouts'] += 1
+        raise PasswordHasherBusy("Timed out waiting for a password check")
+
+def _release_slot(future):
+    global _in_flight
+    with _lock:
+        _in_flight -= 1
+    _slots.release()
+
+def hash_password(password, rounds=None):
+    """bcrypt hash of password at the configured cost"""
+    salt = bcrypt.gensalt(rounds or get_rounds())
+    hashed = _run('hash', bcrypt.hashpw, password.encode('utf-8'), salt)
+    with _lock:
+        stats['hashes'] += 1
+    return hashed
+
+def verify_password(hashed_password, password):
+    if not hashed_password:
+        return False
+    if isinstance(hashed_password, str):
+        hashed_password = hashed_password.encode('utf-8')
+    result = _run('verify', bcrypt.checkpw, password.encode('utf-8'), hashed_password)
+    with _lock:
+        stats['verifies'] += 1
+    return result
+
+def hash_rounds(hashed_password):
+    """The cost factor a bcrypt hash was made with ($2b$12$... -> 12), or None"""
+    if isinstance(hashed_password, bytes):
+        hashed_password = hashed_password.decode('ascii', 'replace')
+    parts = (hashed_password or '').split('$')
+    return int(parts[2]) if len(parts) > 3 and parts[2].isdigit() else None
+
+def needs_rehash(hashed_password):
+    """Whether a hash was made with a lower cost than the current one"""
+    rounds = hash_rounds(hashed_password)
+    return rounds is not None and rounds < get_rounds()
+
+def rehash_if_needed(hashed_password, password):
+    """A new hash for a password that just verified against an outdated one, else None.
+
+    Skipped while the pool is busy; the next login tries again.
+    """
+    if not needs_rehash(hashed_password):
+        return None
+    try:
+        hashed = hash_password(password)
+    except PasswordHasherBusy:
+        return None
+    with _lock:
+        stats['rehashes'] += 1
+    return hashed
+
+def _summary(samples):
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    return {'count': len(ordered), 'mean': round(sum(ordered) / len(ordered), 3),
+            'p50': round(ordered[len(ordered) // 2], 3), 'p95': round(ordered[int(0.95 * (len(ordered) - 1))], 3),
+            'max': round(ordered[-1], 3)}
+
+def get_hashing_stats():
+    """Call counters, cost factor, pool size and recent hashing/queueing times in ms"""
+    with _lock:
+        samples = {name: list(values) for name, values in _samples.items()}
+        result = dict(stats, in_flight=_in_flight, workers=WORKERS, max_queued=MAX_QUEUED, rounds=ROUNDS)
+    result.update({name: _summary(values) for name, values in samples.items()})
+    return result
+
+def reset_stats():
+    with _lock:
+        for values in _samples.values():
+            values.clear()
+        for key in stats:
+            stats[key] = 0
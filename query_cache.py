@@ -0,0 +1,109 @@
+import copy
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+# In-process read-through cache for database.py read functions.
+#
+# Every table has a write version that database.py bumps after each
+# committed write to it. A cached result remembers the versions of the tables
+# it was read from and is only served while all of them are unchanged, so a
+# write is visible to the next read in this process. Writes made by other
+# processes are only picked up through the optional TTL. Reads made while
+# a transaction is open bypass the cache entirely: they can see writes that
+# have not committed and may still be rolled back.
+
+MAX_ENTRIES = 1024
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # key -> (table versions, expires_at, value)
+_table_versions = {}
+stats = {'hits': 0, 'misses': 0, 'stale': 0, 'expired': 0, 'evictions': 0, 'bypassed': 0}
+_in_transaction = None
+
+def set_transaction_check(check):
+    """Register a callable that returns True while the calling thread has a transaction open"""
+    global _in_transaction
+    _in_transaction = check
+
+def bump_tables(*tables):
+    """Record a committed write to each table, invalidating results read from it"""
+    with _lock:
+        for table in tables:
+            _table_versions[table] = _table_versions.get(table, 0) + 1
+
+def table_versions(tables):
+    with _lock:
+        return tuple(_table_versions.get(table, 0) for table in tables)
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+def get_cache_stats():
+    with _lock:
+        return dict(stats, entries=len(_entries), max_entries=MAX_ENTRIES)
+
+def _lookup(key, versions):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            stats['misses'] += 1
+            return False, None
+        entry_versions, expires_at, value = entry
+        if entry_versions != versions:
+            stats['stale'] += 1
+            del _entries[key]
+            return False, None
+        if expires_at is not None and expires_at < time.monotonic():
+            stats['expired'] += 1
+            del _entries[key]
+            return False, None
+        _entries.move_to_end(key)
+        stats['hits'] += 1
+        return True, value
+
+def _store(key, versions, ttl, value):
+    with _lock:
+        _entries[key] = (versions, time.monotonic() + ttl if ttl else None, value)
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+            stats['evictions'] += 1
+
+def cached(*tables, ttl=None, scope=None):
+    """Cache a read function's result until any of `tables` is written.
+
+    `tables` must name every table the function reads. `scope` is called to
+    add context to the key (database.py passes the current database file).
+    Results are shared between callers: lists and dicts are shallow-copied
+    on the way out, but the rows inside must be treated as read-only.
+    Results of None (a failed query) are never cached, and neither are reads
+    made inside a transaction.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _in_transaction is not None and _in_transaction():
+                with _lock:
+                    stats['bypassed'] += 1
+                return func(*args, **kwargs)
+            key = (func.__qualname__, scope() if scope else None, args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                return func(*args, **kwargs)
+            # Versions are read before the query runs, so a write that commits
+            # meanwhile leaves this entry already stale
+            versions = table_versions(tables)
+            hit, value = _lookup(key, versions)
+            if not hit:
+                value = func(*args, **kwargs)
+                if value is None:
+                    return None
+                _store(key, versions, ttl, value)
+            return copy.copy(value) if isinstance(value, (list, dict)) else value
+        wrapper.uncached = func
+        return wrapper
+    return decorator
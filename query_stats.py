@@ -0,0 +1,119 @@
+import logging
+import re
+import threading
+
+# Per-statement execution statistics for database.py.
+#
+# Statements are normalised (literals replaced by ?, whitespace collapsed,
+# placeholder lists shortened) so calls that differ only in their values
+# share one entry. Latencies go into fixed histogram buckets, so recording a
+# call costs the same however many calls came before it.
+
+logger = logging.getLogger(__name__)
+
+ENABLED = True
+SLOW_QUERY_MS = 250          # calls at least this slow are logged with their query plan
+MAX_STATEMENTS = 500         # distinct statements tracked; later ones are counted as 'other'
+
+# Upper bounds of the latency buckets in milliseconds; the last bucket is open ended
+BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+_lock = threading.Lock()
+_statements = {}
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalise(sql):
+    """The statement with literal values replaced, used as its statistics key"""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    return _PLACEHOLDER_LIST.sub('(?, ...)', sql)
+
+def _new_entry():
+    return {'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0, 'blob_bytes': 0,
+            'slow': 0, 'plan': None, 'buckets': [0] * (len(BUCKETS_MS) + 1)}
+
+def record(sql, elapsed, rows=0, blob_bytes=0, error=False):
+    """Add one call of `sql` that took `elapsed` seconds; returns True if it was slow"""
+    if not ENABLED:
+        return False
+    key = normalise(sql)
+    elapsed_ms = elapsed * 1000
+    bucket = next((i for i, bound in enumerate(BUCKETS_MS) if elapsed_ms <= bound), len(BUCKETS_MS))
+    slow = elapsed_ms >= SLOW_QUERY_MS
+    with _lock:
+        entry = _statements.get(key)
+        if entry is None:
+            if len(_statements) >= MAX_STATEMENTS:
+                key = 'other'
+            entry = _statements.setdefault(key, _new_entry())
+        entry['calls'] += 1
+        entry['errors'] += bool(error)
+        entry['total_ms'] += elapsed_ms
+        entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+        entry['rows'] += rows
+        entry['blob_bytes'] += blob_bytes
+        entry['slow'] += slow
+        entry['buckets'][bucket] += 1
+    return slow
+
+def record_plan(sql, plan, elapsed):
+    """Keep the query plan of a slow call and log it"""
+    key = normalise(sql)
+    with _lock:
+        entry = _statements.get(key)
+        if entry is not None:
+            entry['plan'] = plan
+    logger.warning(f"Slow query ({elapsed * 1000:.1f} ms): {key}\n" + "\n".join(plan))
+
+def needs_plan(sql):
+    """Whether a slow call of `sql` still needs its plan captured (once per statement)"""
+    with _lock:
+        entry = _statements.get(normalise(sql))
+        return entry is not None and entry['plan'] is None
+
+def _percentile(entry, fraction):
+    """Upper bound of the bucket holding the given fraction of calls"""
+    target = fraction * entry['calls']
+    seen = 0
+    for i, count in enumerate(entry['buckets']):
+        seen += count
+        if count and seen >= target:
+            return min(BUCKETS_MS[i], entry['max_ms']) if i < len(BUCKETS_MS) else entry['max_ms']
+    return entry['max_ms']
+
+def snapshot(top=None, order_by='total_ms'):
+    """Statistics per statement, sorted by `order_by` descending.
+
+    Percentiles come from the histogram, so they are the upper bound of the
+    bucket they fall in (capped at the slowest call seen).
+    """
+    with _lock:
+        entries = [(key, dict(entry, buckets=list(entry['buckets']))) for key, entry in _statements.items()]
+    result = []
+    for key, entry in entries:
+        result.append({
+            'statement': key,
+            'calls': entry['calls'],
+            'errors': entry['errors'],
+            'total_ms': round(entry['total_ms'], 3),
+            'mean_ms': round(entry['total_ms'] / entry['calls'], 3) if entry['calls'] else 0.0,
+            'p50_ms': round(_percentile(entry, 0.50), 3),
+            'p95_ms': round(_percentile(entry, 0.95), 3),
+            'p99_ms': round(_percentile(entry, 0.99), 3),
+            'max_ms': round(entry['max_ms'], 3),
+            'rows': entry['rows'],
+            'blob_bytes': entry['blob_bytes'],
+            'slow': entry['slow'],
+            'plan': entry['plan'],
+        })
+    result.sort(key=lambda s: s[order_by], reverse=True)
+    return result[:top] if top else result
+
+def reset():
+    with _lock:
+        _statements.clear()
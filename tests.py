@@ -1,4 +1,7 @@
+import os
+import sqlite3
 import unittest
+import database
 from auth import hash_password, verify_password
 from database import init_db, execute_db_query
 
@@ -9,6 +12,46 @@ class TestAuthFunctions(unittest.TestCase):
         self.assertTrue(verify_password(hashed, password))
         self.assertFalse(verify_password(hashed, "wrong_password"))
 
+    def test_hasher_refuses_work_beyond_its_queue(self):
+        import threading
+        from unittest import mock
+        import passwords
+        with mock.patch.object(passwords, '_slots', threading.BoundedSemaphore(1)):
+            passwords._slots.acquire()
+            with self.assertRaises(passwords.PasswordHasherBusy):
+                passwords.hash_password("pw", rounds=4)
+        self.assertGreaterEqual(passwords.get_hashing_stats()['rejected'], 1)
+
+    def test_timed_out_checks_are_dropped_or_keep_their_slot(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from unittest import mock
+        import passwords
+        gate, ran = threading.Event(), []
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(gate.set)
+        with mock.patch.object(passwords, '_executor', executor), \
+                mock.patch.object(passwords, '_slots', threading.BoundedSemaphore(2)), \
+                mock.patch.object(passwords, 'QUEUE_TIMEOUT', 0.05):
+            with self.assertRaises(passwords.PasswordHasherBusy):
+                passwords._run('hash', gate.wait)
+            with self.assertRaises(passwords.PasswordHasherBusy):
+                passwords._run('hash', ran.append, 1)
+            # The queued check was cancelled; the running one still counts against the limit
+            self.assertEqual(passwords.get_hashing_stats()['in_flight'], 1)
+            self.assertTrue(passwords._slots.acquire(blocking=False))
+            self.assertFalse(passwords._slots.acquire(blocking=False))
+            passwords._slots.release()
+            gate.set()
+            executor.shutdown(wait=True)
+            self.assertEqual(ran, [])
+            self.assertEqual(passwords.get_hashing_stats()['in_flight'], 0)
+
+    def test_calibration_respects_minimum_cost(self):
+        import passwords
+        self.assertEqual(passwords.calibrate(target_ms=0.001), passwords.MIN_ROUNDS)
+        self.assertEqual(passwords.hash_rounds(passwords.hash_password("pw", rounds=5)), 5)
+
 class TestDatabaseFunctions(unittest.TestCase):
     def setUp(self):
         # Set up a test database
@@ -19,6 +62,7 @@ class TestDatabaseFunctions(unittest.TestCase):
     def tearDown(self):
         # Clean up the test database
         import os
+        database.close_all_connections()
         os.remove('test_miracle_healthcare.db')
         database.DATABASE_NAME = self.original_db_name
 
@@ -32,6 +76,679 @@ class TestDatabaseFunctions(unittest.TestCase):
         self.assertIsNotNone(result)
         self.assertEqual(result[0][1], 'test@example.com')
 
+class TempDatabaseTestCase(unittest.TestCase):
+    """Runs each test against a fresh database file in a temporary directory"""
+    initialise = False
+
+    def setUp(self):
+        import tempfile
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.original_db_name = database.DATABASE_NAME
+        database.DATABASE_NAME = os.path.join(self.tmpdir.name, 'test.db')
+        if self.initialise:
+            init_db()
+            self.user_id = database.get_user_by_email('admin@admin.com')['id']
+
+    def tearDown(self):
+        database.close_all_connections()
+        database.DATABASE_NAME = self.original_db_name
+        self.tmpdir.cleanup()
+
+class TestConnectionPool(TempDatabaseTestCase):
+    def test_connections_are_reused(self):
+        execute_db_query("CREATE TABLE t (x INTEGER)", fetch=False)
+        for i in range(5):
+            execute_db_query("INSERT INTO t (x) VALUES (?)", (i,), fetch=False)
+        for i in range(5):
+            execute_db_query("SELECT x FROM t WHERE x = ?", (i,))
+        # Writes go through the single writer; reads reuse one pooled connection
+        stats = database.get_pool().get_stats()
+        self.assertEqual(stats['open'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 4)
+
+    def test_pragmas_applied(self):
+        result = execute_db_query("PRAGMA journal_mode")
+        self.assertEqual(result[0][0], 'wal')
+
+    def test_idle_connections_evicted(self):
+        pool = database.get_pool()
+        pool.idle_timeout = 0
+        execute_db_query("SELECT 1")
+        execute_db_query("SELECT 1")
+        self.assertEqual(pool.get_stats()['evictions'], 1)
+
+    def test_connections_in_use_close_when_released_after_shutdown(self):
+        pool = database.get_pool()
+        conn = pool.acquire()
+        database.close_all_connections()
+        pool.release(conn)
+        self.assertEqual(pool.get_stats()['open'], 0)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+
+    def test_concurrent_writes_are_group_committed(self):
+        from concurrent.futures import ThreadPoolExecutor
+        execute_db_query("CREATE TABLE t (x INTEGER UNIQUE)", fetch=False)
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(lambda i: execute_db_query("INSERT INTO t (x) VALUES (?)", (i % 150,), fetch=False), range(200)))
+        # Duplicates fail alone without taking their batch down with them
+        self.assertEqual(results.count(True), 150)
+        self.assertEqual(execute_db_query("SELECT COUNT(*) FROM t")[0][0], 150)
+        stats = database.get_writer().get_stats()
+        self.assertEqual(stats['requests'], 201)
+        self.assertLess(stats['batches'], 201)
+
+        writer = database.get_writer()
+        future = writer.submit(lambda conn: conn.execute("INSERT INTO t (x) VALUES (1000)").rowcount)
+        self.assertEqual(future.result(), 1)
+
+    def test_writer_survives_a_database_it_cannot_open(self):
+        import time
+        missing = os.path.join(self.tmpdir.name, 'missing')
+        database.DATABASE_NAME = os.path.join(missing, 'writer_test.db')
+        writer = database.get_writer()
+        started = time.monotonic()
+        with self.assertRaises(sqlite3.OperationalError):
+            writer.execute(lambda conn: conn.execute("CREATE TABLE t (x INTEGER)"), timeout=5)
+        self.assertLess(time.monotonic() - started, 5)
+        os.mkdir(missing)
+        writer.execute(lambda conn: conn.execute("CREATE TABLE t (x INTEGER)"), timeout=5)
+        self.assertTrue(execute_db_query("INSERT INTO t (x) VALUES (1)", fetch=False))
+
+    def test_timed_out_writes_are_cancelled(self):
+        execute_db_query("CREATE TABLE t (x INTEGER)", fetch=False)
+        writer = database.get_writer()
+        # Hold the writer busy so the write is still queued when the caller gives up
+        with writer.lock:
+            with self.assertRaises(sqlite3.OperationalError):
+                writer.execute(lambda conn: conn.execute("INSERT INTO t (x) VALUES (1)"), timeout=0.1)
+        execute_db_query("INSERT INTO t (x) VALUES (2)", fetch=False)
+        self.assertEqual([r[0] for r in execute_db_query("SELECT x FROM t")], [2])
+
+    def test_compact_database_runs_outside_the_writers_transactions(self):
+        execute_db_query("CREATE TABLE t (x BLOB)", fetch=False)
+        database.execute_many("INSERT INTO t (x) VALUES (?)", [(b'x' * 4096,) for _ in range(100)])
+        execute_db_query("DELETE FROM t", fetch=False)
+        self.assertGreater(execute_db_query("PRAGMA freelist_count")[0][0], 0)
+        self.assertTrue(database.compact_database())
+        self.assertEqual(execute_db_query("PRAGMA freelist_count")[0][0], 0)
+
+class TestMigrations(TempDatabaseTestCase):
+    def test_upgrades_legacy_database_in_place(self):
+        import sqlite3
+        legacy = sqlite3.connect(database.DATABASE_NAME)
+        database._migration_001_initial_schema(legacy.cursor())
+        legacy.execute("INSERT INTO users (email, role) VALUES ('old@example.com', 'candidate')")
+        legacy.execute("INSERT INTO users (email, role) VALUES ('other@example.com', 'candidate')")
+        # Old candidate messages stored the recipient's email instead of an id
+        legacy.executemany("INSERT INTO messages (sender_id, recipient_id, message, sent_date, read_status) VALUES (?, ?, ?, ?, ?)",
+                           [(2, 1, 'hello', '2024-01-01 09:00:00', 1), (1, 'other@example.com', 'hi', '2024-01-02 09:00:00', 0)])
+        legacy.commit()
+        legacy.close()
+
+        self.assertTrue(init_db())
+        result = execute_db_query("PRAGMA user_version")
+        self.assertEqual(result[0][0], database.SCHEMA_VERSION)
+        self.assertIsNotNone(database.get_user_by_email('old@example.com'))
+        indexes = {r['name'] for r in execute_db_query("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertIn('idx_users_reset_token', indexes)
+        inbox = database.get_conversations_page(1)['rows']
+        self.assertEqual([(c['other_user_id'], c['message_count'], c['unread_count']) for c in inbox], [(2, 2, 0)])
+        self.assertEqual(database.get_unread_message_count(2), 1)
+
+    def test_migrations_apply_once(self):
+        self.assertTrue(init_db())
+        with database.get_db_connection() as conn:
+            self.assertEqual(database.run_migrations(conn), [])
+
+    def test_bootstrap_runs_once_per_database_file(self):
+        from unittest import mock
+        with mock.patch.object(database, 'init_db', wraps=database.init_db) as init:
+            self.assertTrue(database.bootstrap_db())
+            execute_db_query("INSERT INTO positions (title) VALUES ('Nurse')", fetch=False)
+            self.assertTrue(database.bootstrap_db())
+            self.assertEqual(init.call_count, 1)
+
+            # Replacing the file on disk forces a fresh bootstrap
+            database.close_all_connections()
+            os.remove(database.DATABASE_NAME)
+            self.assertTrue(database.bootstrap_db())
+            self.assertEqual(init.call_count, 2)
+            self.assertIsNotNone(database.get_user_by_email('admin@admin.com'))
+
+    def test_activity_log_backfills_user_id_from_details(self):
+        legacy = sqlite3.connect(database.DATABASE_NAME)
+        database._migration_001_initial_schema(legacy.cursor())
+        legacy.executemany("INSERT INTO activities (activity_type, details, timestamp) VALUES (?, ?, ?)",
+                           [('login', 'user_id: 1', '2024-01-01'), ('login', 'user_id: 10, ok', '2024-01-02'),
+                            ('note', 'user_id: unknown', '2024-01-03')])
+        legacy.commit()
+        legacy.close()
+
+        self.assertTrue(init_db())
+        result = execute_db_query("SELECT user_id FROM activities ORDER BY id")
+        self.assertEqual([r['user_id'] for r in result], [1, 10, None])
+        self.assertEqual(len(database.get_user_activity_log(1)), 1)
+
+class TestBlobStore(TempDatabaseTestCase):
+    initialise = True
+
+    def test_identical_uploads_are_stored_once(self):
+        import blob_store
+        pdf = b'%PDF-1.4 resume contents'
+        database.save_document(self.user_id, 'cv.pdf', pdf, 'Resume')
+        database.save_application(self.user_id, {'skills': []}, pdf, pdf)
+        self.assertEqual(len(list(blob_store.iter_blobs(database.get_blob_root()))), 1)
+
+        doc = database.get_user_documents(self.user_id)[0]
+        file_data = database.get_file_data(doc['id'])
+        self.assertEqual(file_data['file_data'], pdf)
+        self.assertEqual(file_data['file_data_mime'], 'application/pdf')
+        self.assertEqual(database.get_application(self.user_id)['resume'], pdf)
+
+        # A document row without a file is still accepted, as it always was
+        self.assertTrue(database.save_document(self.user_id, 'pending.pdf', None, 'Other'))
+        pending = next(d for d in database.get_user_documents(self.user_id) if d['file_name'] == 'pending.pdf')
+        self.assertIsNone(database.get_file_data(pending['id'])['file_data'])
+
+    def test_reused_orphan_blobs_survive_garbage_collection(self):
+        import io
+        import blob_store
+        root = database.get_blob_root()
+        for pdf, store in [(b'%PDF-1.4 stored', database.store_file), (b'%PDF-1.4 streamed', lambda data: database.store_upload(io.BytesIO(data), 'cv.pdf'))]:
+            # An orphan from an earlier upload, well past the grace period
+            sha256, _ = blob_store.write_blob(root, pdf)
+            os.utime(blob_store.blob_path(root, sha256), (0, 0))
+            # Stored again, but the row referencing it is not committed yet
+            self.assertEqual(store(pdf)['sha256'], sha256)
+            self.assertEqual(database.collect_blob_garbage(), 0)
+            self.assertEqual(blob_store.read_blob(root, sha256), pdf)
+
+    def test_maintenance_prunes_login_events_and_orphans_once_a_day(self):
+        from unittest import mock
+        import blob_store
+        root = database.get_blob_root()
+        sha256, _ = blob_store.write_blob(root, b'%PDF-1.4 orphan')
+        os.utime(blob_store.blob_path(root, sha256), (0, 0))
+        database.execute_db_query("INSERT INTO login_events (user_id, event, occurred_at) VALUES (?, 'login', '2020-01-01 09:30:00')",
+                                  (self.user_id,), fetch=False)
+
+        self.assertEqual(database.run_maintenance(), {'login_events_pruned': True, 'files_removed': 1})
+        self.assertEqual(database.execute_db_query("SELECT * FROM login_events WHERE occurred_at < '2021'"), [])
+        # The run is recorded, so the automatic one waits a day
+        self.assertFalse(database.run_maintenance_if_due())
+        database.update_app_setting('last_maintenance', '0')
+        database._maintenance_due.clear()
+        with mock.patch.object(database, 'run_maintenance'):
+            self.assertTrue(database.run_maintenance_if_due())
+            self.assertFalse(database.run_maintenance_if_due())
+
+    def test_uploads_stream_in_chunks_and_reject_early(self):
+        import io
+        import blob_store
+        pdf = b'%PDF-1.4 ' + os.urandom(10000)
+        ref = database.store_upload(io.BytesIO(pdf), 'cv.pdf', max_size=20000, allowed_types={'application/pdf'})
+        self.assertEqual(ref['size'], len(pdf))
+        self.assertEqual(ref['mime_type'], 'application/pdf')
+        database.save_document(self.user_id, 'cv.pdf', ref, 'Resume')
+        doc = database.get_user_documents(self.user_id)[0]
+        self.assertEqual(database.get_file_data(doc['id'])['file_data'], pdf)
+
+        root = database.get_blob_root()
+        with self.assertRaises(blob_store.UploadRejected):
+            blob_store.ingest_stream(root, io.BytesIO(pdf), 'big.pdf', max_size=5000, chunk_size=1024)
+        with self.assertRaises(blob_store.UploadRejected):
+            database.store_upload(io.BytesIO(b'MZ\x90\x00 not a picture'), 'photo.png')
+        with self.assertRaises(blob_store.UploadRejected):
+            database.store_upload(io.BytesIO(b'\x89PNG\r\n\x1a\n'), 'photo.png', allowed_types={'application/pdf'})
+        # Rejected uploads leave neither blobs nor temporary files behind
+        leftovers = [name for _, _, names in os.walk(root) for name in names if name.startswith('.upload-')]
+        self.assertEqual(leftovers, [])
+        self.assertEqual(len(list(blob_store.iter_blobs(root))), 1)
+
+    def test_migration_moves_inline_blobs(self):
+        import sqlite3
+        legacy_path = os.path.join(self.tmpdir.name, 'legacy.db')
+        legacy = sqlite3.connect(legacy_path)
+        database._migration_001_initial_schema(legacy.cursor())
+        database._migration_002_lookup_indexes(legacy.cursor())
+        legacy.execute("PRAGMA user_version = 2")
+        legacy.execute("INSERT INTO users (email, profile_picture) VALUES (?, ?)",
+                       ('legacy@example.com', b'\x89PNG\r\n\x1a\n picture'))
+        legacy.commit()
+        legacy.close()
+
+        database.DATABASE_NAME = legacy_path
+        self.assertTrue(init_db())
+        result = execute_db_query("SELECT id, profile_picture, profile_picture_mime FROM users WHERE email = 'legacy@example.com'")
+        self.assertIsNone(result[0]['profile_picture'])
+        self.assertEqual(result[0]['profile_picture_mime'], 'image/png')
+        self.assertEqual(database.get_user_profile(result[0]['id'])['profile_picture'], b'\x89PNG\r\n\x1a\n picture')
+
+    def test_list_documents_pages_metadata_only(self):
+        for i in range(5):
+            database.save_document(self.user_id, f'doc{i}.pdf', b'%PDF-1.4 ' + bytes([i]), 'Resume')
+        database.save_document(self.user_id, 'id.png', b'\x89PNG\r\n\x1a\n', 'Government ID')
+
+        first = database.list_documents(page_size=4, file_type='Resume')
+        self.assertEqual(len(first['rows']), 4)
+        self.assertNotIn('file_data', first['rows'][0])
+        second = database.list_documents(page_size=4, file_type='Resume', cursor=first['next_cursor'])
+        self.assertEqual(len(second['rows']), 1)
+        self.assertIsNone(second['next_cursor'])
+        names = [d['file_name'] for d in first['rows'] + second['rows']]
+        self.assertEqual(names, [f'doc{i}.pdf' for i in range(4, -1, -1)])
+
+        database.mark_document_viewed(first['rows'][0]['id'])
+        self.assertEqual(len(database.list_documents(viewed=True)['rows']), 1)
+
+    def test_file_server_streams_byte_ranges(self):
+        import urllib.request
+        from unittest import mock
+        import file_server
+        pdf = b'%PDF-1.4 ' + bytes(range(256)) * 1000
+        database.save_document(self.user_id, 'big.pdf', pdf, 'Resume')
+        doc = database.get_user_documents(self.user_id)[0]
+
+        patcher = mock.patch.object(file_server, 'FILE_SERVER_PORT', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(file_server.stop_file_server)
+        server = file_server.ensure_file_server()
+        url = f"http://127.0.0.1:{server.server_port}/documents/{file_server.make_token(doc['id'])}"
+
+        request = urllib.request.Request(url, headers={'Range': 'bytes=100-199'})
+        with urllib.request.urlopen(request) as response:
+            self.assertEqual(response.status, 206)
+            self.assertEqual(response.headers['Content-Range'], f"bytes 100-199/{len(pdf)}")
+            self.assertEqual(response.read(), pdf[100:200])
+        with urllib.request.urlopen(url) as response:
+            self.assertEqual(response.headers['Content-Type'], 'application/pdf')
+            self.assertEqual(response.read(), pdf)
+        self.assertIsNone(file_server.verify_token(f"{doc['id']}-9999999999-forged"))
+
+        # Links follow the host the browser used, and warn when they cannot work from there
+        with mock.patch.object(file_server, '_browser_origin', return_value=('https', 'hr.example.com')):
+            with self.assertLogs('file_server', level='WARNING'):
+                self.assertTrue(file_server.document_url(doc['id']).startswith(f"http://hr.example.com:{server.server_port}/"))
+        with mock.patch.object(file_server, 'FILE_SERVER_PUBLIC_URL', 'https://files.example.com/'):
+            self.assertTrue(file_server.document_url(doc['id']).startswith("https://files.example.com/documents/"))
+
+    def test_pictures_are_served_as_cached_thumbnails(self):
+        import io
+        from PIL import Image
+        import thumbnails
+        original = io.BytesIO()
+        Image.new('RGB', (1600, 1200), 'teal').save(original, 'PNG')
+        database.update_user_profile(self.user_id, {'first_name': 'A', 'last_name': 'A', 'mobile': '1', 'home_address': '',
+                                                    'age': 30, 'location': '', 'country': '', 'profile_picture': original.getvalue()})
+        profile = database.get_user_profile(self.user_id, include_picture=False)
+        self.assertNotIn('profile_picture', {k for k, v in profile.items() if v})
+
+        small = database.get_thumbnail(profile['profile_picture_sha256'], profile['profile_picture_mime'])
+        self.assertEqual(max(Image.open(io.BytesIO(small)).size), thumbnails.RENDITIONS['small'])
+        self.assertLess(len(small), len(original.getvalue()))
+        hits = thumbnails.get_thumbnail_stats()['hits']
+        self.assertEqual(database.get_thumbnail(profile['profile_picture_sha256'], profile['profile_picture_mime']), small)
+        self.assertEqual(thumbnails.get_thumbnail_stats()['hits'], hits + 1)
+        self.assertIsNone(database.get_thumbnail(profile['profile_picture_sha256'], 'application/msword'))
+
+        # Evicted renditions are rendered again from the original
+        thumbnails.evict(database.get_thumbnail_root(), max_bytes=0)
+        self.assertEqual(thumbnails.cache_size(database.get_thumbnail_root()), 0)
+        self.assertIsNotNone(database.get_thumbnail(profile['profile_picture_sha256'], profile['profile_picture_mime'], 'medium'))
+
+        # Rewriting a rendition replaces its bytes in the cache size instead of adding to them
+        root = database.get_thumbnail_root()
+        before = thumbnails.cache_size(root)
+        path = thumbnails.thumbnail_path(root, profile['profile_picture_sha256'], 'medium')
+        with open(path, 'rb') as f:
+            thumbnails._write(root, path, f.read())
+        self.assertEqual(thumbnails.cache_size(root), before)
+
+        # A failed render is skipped for a while, then tried again
+        from unittest import mock
+        def missing_source():
+            raise FileNotFoundError("blob briefly missing")
+        sha256, mime_type = 'f' * 64, 'image/png'
+        self.assertIsNone(thumbnails.get_thumbnail(root, missing_source, sha256, mime_type, 'large'))
+        opened = mock.Mock(side_effect=lambda: io.BytesIO(original.getvalue()))
+        self.assertIsNone(thumbnails.get_thumbnail(root, opened, sha256, mime_type, 'large'))
+        opened.assert_not_called()
+        with mock.patch.object(thumbnails, 'RETRY_FAILED_AFTER', 0):
+            self.assertIsNotNone(thumbnails.get_thumbnail(root, opened, sha256, mime_type, 'large'))
+
+        # Saving the profile without a new upload keeps the picture
+        database.update_user_profile(self.user_id, {'first_name': 'B', 'last_name': 'A', 'mobile': '1', 'home_address': '',
+                                                    'age': 30, 'location': '', 'country': '', 'profile_picture': None})
+        self.assertEqual(database.get_user_profile(self.user_id)['profile_picture'], original.getvalue())
+
+class TestCandidateQueries(TempDatabaseTestCase):
+    initialise = True
+
+    def test_fetch_page_walks_forward_and_back(self):
+        for i in range(7):
+            database.add_new_position(f'Position {i}', '', 1)
+        first = database.get_positions_page(page_size=3, include_total=True)
+        self.assertEqual(first['total'], 7)
+        self.assertIsNone(first['prev_cursor'])
+        second = database.get_positions_page(page_size=3, cursor=first['next_cursor'])
+        third = database.get_positions_page(page_size=3, cursor=second['next_cursor'])
+        self.assertEqual(len(third['rows']), 1)
+        self.assertIsNone(third['next_cursor'])
+        titles = [p['title'] for p in first['rows'] + second['rows'] + third['rows']]
+        self.assertEqual(titles, [f'Position {i}' for i in range(6, -1, -1)])
+
+        back = database.get_positions_page(page_size=3, cursor=third['prev_cursor'])
+        self.assertEqual([p['title'] for p in back['rows']], [p['title'] for p in second['rows']])
+        back = database.get_positions_page(page_size=3, cursor=back['prev_cursor'])
+        self.assertEqual(back['rows'], first['rows'])
+        self.assertIsNone(back['prev_cursor'])
+
+    def test_candidates_page_filters_and_sorts_in_sql(self):
+        from auth import register_user
+        for email, last_name in (('c@example.com', 'Cole'), ('a@example.com', 'Abara'), ('b@example.com', 'Bello')):
+            register_user(email, 'pw', 'Test', last_name, '1')
+        ids = {email: database.get_user_by_email(email)['id'] for email in ('a@example.com', 'b@example.com', 'c@example.com')}
+        database.execute_db_query("UPDATE users SET status = 'inactive', registration_date = '2025-01-15 10:00:00' WHERE id = ?",
+                                  (ids['b@example.com'],), fetch=False)
+        database.save_application(ids['c@example.com'], {'professional_info': {'position': 'Midwife'}}, None, None)
+
+        names = [c['name'] for c in database.get_candidates_page(sort='name')['rows']]
+        self.assertEqual(names, ['Test Abara', 'Test Bello', 'Test Cole'])
+        self.assertEqual([c['id'] for c in database.get_candidates_page(status='inactive')['rows']], [ids['b@example.com']])
+        january = database.get_candidates_page(registered_from='2025-01-01', registered_to='2025-01-15')
+        self.assertEqual([c['id'] for c in january['rows']], [ids['b@example.com']])
+        self.assertEqual([c['id'] for c in database.get_candidates_page(position='Midwife')['rows']], [ids['c@example.com']])
+
+        first = database.get_candidates_page(page_size=2, sort='oldest')
+        second = database.get_candidates_page(page_size=2, cursor=first['next_cursor'], sort='oldest')
+        self.assertEqual([c['id'] for c in first['rows'] + second['rows']], sorted(ids.values()))
+
+    def test_candidate_search_covers_application_content(self):
+        from auth import register_user
+        register_user('jane@example.com', 'pw', 'Jane', 'Okafor', '0700')
+        jane = database.get_user_by_email('jane@example.com')
+        database.save_application(jane['id'], {
+            'professional_info': {'position': 'Registered Nurse', 'current_employer': 'St Mary Hospital'},
+            'skills': ['Phlebotomy', 'Wound care'],
+            'certifications': ['NMC PIN']
+        }, None, None)
+
+        self.assertEqual([c['id'] for c in database.search_candidates('phleb')], [jane['id']])
+        self.assertEqual([c['id'] for c in database.search_candidates('okaf mary')], [jane['id']])
+        self.assertIn('**', database.search_candidates('wound')[0]['snippet'])
+        self.assertEqual(database.search_candidates('admin'), [])
+
+        database.execute_db_query("UPDATE users SET last_name = 'Bello' WHERE id = ?", (jane['id'],), fetch=False)
+        self.assertEqual(database.search_candidates('okafor'), [])
+        self.assertEqual(len(database.search_candidates('bello', ranked=False)), 1)
+
+    def test_candidate_360_returns_every_child_row_once(self):
+        from auth import register_user
+        register_user('a@example.com', 'pw', 'A', 'A', '1')
+        candidate = database.get_user_by_email('a@example.com')['id']
+        admin = database.get_user_by_email('admin@admin.com')['id']
+        database.update_user_profile(candidate, {'first_name': 'A', 'last_name': 'A', 'mobile': '1', 'home_address': '', 'age': 30, 'location': '', 'country': '', 'profile_picture': b'\x89PNG\r\n\x1a\n'})
+        for i in range(3):
+            database.save_application(candidate, {'n': i}, b'%PDF resume', None)
+        database.schedule_interviews_bulk([candidate] * 5, '2026-11-02', '09:00:00', 'Video', 'Nurse', '', 'First')
+        database.create_screening_test('Test', '', [], 10, admin)
+        test = database.get_screening_tests()[0]['id']
+        database.assign_test_bulk(test, [candidate] * 4)
+        database.save_message(admin, candidate, 'Hi')
+        database.save_message(candidate, admin, 'Hello')
+
+        details = database.get_candidate_360(candidate)
+        self.assertEqual([len(details[k]) for k in ('applications', 'interviews', 'tests', 'messages')], [3, 5, 4, 2])
+        self.assertNotIn('password', details['profile'])
+        self.assertNotIn('resume', details['applications'][0])
+        heavy = database.get_candidate_360(candidate, include_heavy=True)
+        self.assertEqual(heavy['applications'][0]['resume'], b'%PDF resume')
+        self.assertEqual(heavy['profile']['profile_picture'], b'\x89PNG\r\n\x1a\n')
+        self.assertIsNone(database.get_candidate_360(candidate + 100))
+
+    def test_applications_filter_on_generated_columns(self):
+        def application(position, years, visa):
+            return {'professional_info': {'position': position, 'years_experience': years},
+                    'work_authorization': {'authorized': True, 'visa_type': visa},
+                    'additional_info': {'start_date': '2026-12-01'}}
+        database.save_application(self.user_id, application('Doctor', 12, 'Skilled Worker Visa'), None, None)
+        database.save_application(self.user_id, application('Doctor', 3, 'British Citizen'), None, None)
+        database.save_application(self.user_id, application('Nurse', 8, 'British Citizen'), None, None)
+        execute_db_query("INSERT INTO applications (user_id, application_data) VALUES (?, 'not json')", (self.user_id,), fetch=False)
+
+        page = database.get_applications_page(position='Doctor', sort='experience')
+        self.assertEqual([a['years_experience'] for a in page['rows']], [12, 3])
+        page = database.get_applications_page(min_experience=5, visa_type='British Citizen', start_by='2026-12-31')
+        self.assertEqual([a['position'] for a in page['rows']], ['Nurse'])
+        self.assertEqual(len(database.get_applications_page()['rows']), 4)
+        self.assertEqual(database.get_application_positions(), ['Doctor', 'Nurse'])
+        plan = execute_db_query("EXPLAIN QUERY PLAN SELECT id FROM applications WHERE position = ? AND years_experience >= ?", ('Doctor', 5))
+        self.assertIn('idx_applications_position', plan[0]['detail'])
+
+class TestWrites(TempDatabaseTestCase):
+    initialise = True
+
+    def test_cached_reads_invalidate_on_write(self):
+        database.add_new_position('Nurse', '', 2)
+        before = database.get_cache_stats()
+        self.assertEqual(len(database.get_all_positions()), 1)
+        self.assertEqual(len(database.get_all_positions()), 1)
+        self.assertEqual(database.get_cache_stats()['hits'], before['hits'] + 1)
+
+        database.add_new_position('Doctor', '', 1)
+        self.assertEqual(len(database.get_all_positions()), 2)
+        self.assertEqual(database.get_cache_stats()['stale'], before['stale'] + 1)
+
+    def test_execute_many_reports_each_row(self):
+        database.add_new_position('Nurse', '', 2)
+        self.assertEqual(len(database.get_all_positions()), 1)
+        query = "INSERT INTO positions (title, required_staff) VALUES (?, ?)"
+        rows = [('Doctor', 1), ('Nurse', 5), ('Porter', 3), ('Doctor', 2), ('Cleaner', 1)]
+        outcomes = database.execute_many(query, rows, chunk_size=2)
+        self.assertEqual([o['ok'] for o in outcomes], [True, False, True, False, True])
+        self.assertIn('UNIQUE', outcomes[1]['error'])
+        # Good rows in a failing chunk still commit, and cached reads see them
+        titles = sorted(p['title'] for p in database.get_all_positions())
+        self.assertEqual(titles, ['Cleaner', 'Doctor', 'Nurse', 'Porter'])
+
+        from auth import register_user
+        for i in range(3):
+            register_user(f"c{i}@example.com", 'pw', 'C', str(i), '1')
+        candidates = [c['id'] for c in database.get_all_candidates()]
+        self.assertTrue(database.schedule_interview(candidates, '2026-11-02', '09:00:00', 'Video', 'Nurse', '', 'First'))
+        self.assertEqual(database.get_dashboard_snapshot()['scheduled_interviews'], 3)
+        outcomes = database.send_message_bulk(candidates[0], candidates, 'Hello')
+        self.assertTrue(all(o['ok'] for o in outcomes))
+        self.assertEqual(database.get_total_messages()['total'], 3)
+
+    def test_transaction_commits_once_and_rolls_back_on_error(self):
+        database.add_new_position('Nurse', '', 2)
+        position = database.get_all_positions()[0]['id']
+        with database.transaction('immediate'):
+            database.update_filled_positions(position, 2)
+            database.add_new_position('Doctor', '', 1)
+            # Reads inside the transaction see its uncommitted writes
+            self.assertEqual(len(database.get_all_positions()), 2)
+        self.assertEqual(len(database.get_all_positions()), 2)
+        self.assertEqual(database.get_app_setting('filled_positions'), '2')
+
+        with self.assertRaises(sqlite3.IntegrityError):
+            with database.transaction('immediate'):
+                database.add_new_position('Porter', '', 1)
+                # A read of the uncommitted row must not outlive the rollback
+                self.assertEqual(len(database.get_all_positions()), 3)
+                database.add_new_position('Nurse', '', 1)
+        self.assertEqual(len(database.get_all_positions()), 2)
+
+        with database.transaction('immediate'):
+            database.add_new_position('Porter', '', 1)
+            try:
+                with database.transaction():
+                    database.add_new_position('Cleaner', '', 1)
+                    database.add_new_position('Nurse', '', 1)
+            except sqlite3.IntegrityError:
+                pass
+        titles = sorted(p['title'] for p in database.get_all_positions())
+        self.assertEqual(titles, ['Doctor', 'Nurse', 'Porter'])
+
+        # Read transactions never write on their pooled connection
+        with self.assertRaises(sqlite3.OperationalError):
+            with database.transaction():
+                database.get_all_positions()
+                database.add_new_position('Cleaner', '', 1)
+        self.assertEqual(len(database.get_all_positions()), 3)
+        self.assertTrue(database.add_new_position('Cleaner', '', 1))
+
+class TestAccounts(TempDatabaseTestCase):
+    initialise = True
+
+    def test_reset_password_uses_token_once(self):
+        from auth import register_user, reset_password
+        register_user('a@example.com', 'pw', 'A', 'A', '1')
+        user = database.get_user_by_email('a@example.com')
+        database.update_reset_token(user['id'], 'token')
+        self.assertTrue(reset_password('token', 'new'))
+        self.assertFalse(reset_password('token', 'newer'))
+        self.assertIsNone(database.get_user_by_email('a@example.com')['reset_token'])
+
+    def test_login_upgrades_outdated_hash(self):
+        import bcrypt
+        import passwords
+        from auth import login_user
+        database.update_user_password(self.user_id, bcrypt.hashpw(b'12345', bcrypt.gensalt(4)))
+        self.assertTrue(passwords.needs_rehash(database.get_user_by_email('admin@admin.com')['password']))
+
+        self.assertIsNotNone(login_user('admin@admin.com', '12345'))
+        stored = database.get_user_by_email('admin@admin.com')['password']
+        self.assertEqual(passwords.hash_rounds(stored), passwords.get_rounds())
+        self.assertIsNotNone(login_user('admin@admin.com', '12345'))
+        self.assertIsNone(login_user('admin@admin.com', 'wrong'))
+
+    def test_login_events_roll_up_by_hour_and_day(self):
+        from datetime import datetime
+        from auth import login_user
+        database.update_user_password(self.user_id, database.passwords.hash_password('12345', rounds=4))
+        login_user('admin@admin.com', '12345')
+        login_user('admin@admin.com', '12345')
+        login_user('admin@admin.com', 'wrong')
+        login_user('nobody@example.com', 'wrong')
+        # An old event only the daily rollup should keep after pruning
+        database.execute_db_query("INSERT INTO login_events (user_id, event, occurred_at) VALUES (?, 'login', '2020-01-01 09:30:00')",
+                                  (self.user_id,), fetch=False)
+
+        today = datetime.now().strftime('%Y-%m-%d')
+        this_hour = datetime.now().strftime('%Y-%m-%d %H:00')
+        self.assertEqual(database.get_login_statistics()[today], 2)
+        self.assertEqual(database.get_login_statistics(event='login_failed')[today], 2)
+        hourly = database.get_login_statistics(2, 'hour')
+        self.assertEqual((len(hourly), hourly[this_hour]), (48, 2))
+        snapshot = database.get_dashboard_snapshot()
+        self.assertEqual(len(snapshot['login_statistics']), 7)
+        self.assertEqual(snapshot['failed_login_statistics'][today], 2)
+
+        self.assertTrue(database.prune_login_events())
+        self.assertEqual(database.execute_db_query("SELECT COUNT(*) AS n FROM login_events")[0]['n'], 4)
+        daily = database.execute_db_query("SELECT count FROM login_counts_daily WHERE bucket = '2020-01-01'")
+        self.assertEqual(daily[0]['count'], 1)
+        self.assertEqual(database.execute_db_query("SELECT * FROM login_counts_hourly WHERE bucket < '2021'"), [])
+
+class TestDashboard(TempDatabaseTestCase):
+    initialise = True
+
+    def test_dashboard_counters_follow_writes(self):
+        from auth import register_user
+        register_user('a@example.com', 'pw', 'A', 'A', '1')
+        register_user('b@example.com', 'pw', 'B', 'B', '2')
+        candidate = database.get_user_by_email('a@example.com')['id']
+        database.save_application(candidate, {}, None, None)
+        application = database.get_application(candidate)['id']
+        database.update_application_status(application, 'under_review')
+        database.schedule_interview([candidate], '2026-11-02', '09:00:00', 'Video', 'Nurse', '', 'First')
+        database.add_new_position('Nurse', '', 3)
+        position = database.get_all_positions()[0]['id']
+        database.update_filled_positions(position, 2)
+        execute_db_query("DELETE FROM users WHERE email = 'b@example.com'", fetch=False)
+
+        snapshot = database.get_dashboard_snapshot()
+        self.assertEqual(snapshot['total_candidates'], 1)
+        self.assertEqual(snapshot['open_applications'], 1)
+        self.assertEqual(snapshot['application_statistics'], {'under_review': 1})
+        self.assertEqual(snapshot['scheduled_interviews'], 1)
+        self.assertEqual(snapshot['filled_positions'], 2)
+        self.assertEqual(database.check_metric_counters(), {})
+
+        execute_db_query("UPDATE metric_counters SET value = 42 WHERE name = 'candidates'", fetch=False)
+        self.assertEqual(database.check_metric_counters(repair=True), {'candidates': (42, 1)})
+        self.assertEqual(database.get_dashboard_snapshot()['total_candidates'], 1)
+
+    def test_activity_log_is_buffered_and_indexed(self):
+        database.log_activity('login', 'a@example.com', user_id=1, entity='user', entity_id=1)
+        database.log_activity('login', 'b@example.com', user_id=10, entity='user', entity_id=10)
+        database.log_activity('application_submitted', user_id=1, entity='application')
+        self.assertEqual(database.flush_activity_log(), 3)
+        self.assertEqual([a['activity_type'] for a in database.get_user_activity_log(1)], ['application_submitted', 'login'])
+
+        page = database.query_activities(activity_type='login', page_size=1, include_total=True)
+        self.assertEqual(page['total'], 2)
+        self.assertEqual(len(page['rows']), 1)
+        plan = execute_db_query("EXPLAIN QUERY PLAN SELECT * FROM activities WHERE user_id = ? ORDER BY timestamp DESC", (1,))
+        self.assertIn('idx_activities_user', plan[0]['detail'])
+
+    def test_query_stats_record_statements_and_slow_plans(self):
+        import query_stats
+        query_stats.reset()
+        for email in ('admin@admin.com', 'b@example.com', 'admin@admin.com'):
+            database.get_user_by_email(email)
+        stats = {s['statement']: s for s in database.get_query_stats()}
+        lookup = stats['SELECT * FROM users WHERE email = ?']
+        self.assertEqual(lookup['calls'], 3)
+        self.assertEqual(lookup['rows'], 2)
+        self.assertLessEqual(lookup['p50_ms'], lookup['p99_ms'])
+        self.assertEqual(query_stats.normalise("SELECT 1 FROM t WHERE x IN (1, 2,  3) AND y = 'it''s'"),
+                         "SELECT ? FROM t WHERE x IN (?, ...) AND y = ?")
+
+        original = query_stats.SLOW_QUERY_MS
+        query_stats.SLOW_QUERY_MS = 0
+        try:
+            with self.assertLogs('query_stats', level='WARNING'):
+                database.get_user_by_email('c@example.com')
+        finally:
+            query_stats.SLOW_QUERY_MS = original
+        plan = {s['statement']: s for s in database.get_query_stats()}['SELECT * FROM users WHERE email = ?']['plan']
+        self.assertTrue(any('email' in line for line in plan))
+
+class TestMessaging(TempDatabaseTestCase):
+    initialise = True
+
+    def test_conversations_keep_inboxes_and_unread_counts(self):
+        from auth import register_user
+        register_user('a@example.com', 'pw', 'A', 'A', '1')
+        register_user('b@example.com', 'pw', 'B', 'B', '1')
+        a, b = (database.get_user_by_email(email)['id'] for email in ('a@example.com', 'b@example.com'))
+        database.save_message(self.user_id, a, 'first')
+        database.save_message(a, self.user_id, 'reply')
+        database.send_message_bulk(self.user_id, [a, b], 'to everyone')
+
+        inbox = database.get_conversations_page(self.user_id)['rows']
+        self.assertEqual([c['other_user_id'] for c in inbox], [b, a])
+        self.assertEqual(database.get_unread_message_count(self.user_id), 1)
+        conversation = database.get_conversations_page(a)['rows'][0]
+        self.assertEqual((conversation['unread_count'], conversation['message_count'], conversation['last_message']), (2, 3, 'to everyone'))
+        thread = database.get_conversation_messages(conversation['conversation_id'], page_size=2)
+        self.assertEqual([m['message'] for m in thread['rows']], ['to everyone', 'reply'])
+        older = database.get_conversation_messages(conversation['conversation_id'], page_size=2, cursor=thread['next_cursor'])
+        self.assertEqual([m['message'] for m in older['rows']], ['first'])
+
+        database.mark_conversation_read(conversation['conversation_id'], a)
+        self.assertEqual(database.get_unread_message_count(a), 0)
+        database.delete_message(thread['rows'][0]['id'])
+        conversation = database.get_conversations_page(a)['rows'][0]
+        self.assertEqual((conversation['message_count'], conversation['last_message']), (2, 'reply'))
+        self.assertEqual(len(database.get_conversations_page()['rows']), 2)
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,214 @@
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Small renditions of uploaded pictures and PDFs for list and profile views.
+#
+# A rendition is keyed by the source blob's SHA-256 and a size name, and
+# stored as <cache root>/<aa>/<sha256>-<size>.<ext>. Renditions are made in
+# the background when a file is uploaded and otherwise on first request.
+# The cache is bounded by MAX_CACHE_BYTES: every read refreshes a file's
+# mtime, and the least recently used files are deleted once it is full.
+# Anything evicted is simply rendered again from the original.
+
+logger = logging.getLogger(__name__)
+
+# Longest edge in pixels of each rendition
+RENDITIONS = {
+    'small': 96,
+    'medium': 320,
+    'large': 1024,
+}
+QUALITY = 80
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+MAX_SOURCE_PIXELS = 50_000_000    # larger images are not decoded at all
+RETRY_FAILED_AFTER = 10 * 60      # seconds before a file that failed to render is tried again
+
+IMAGE_TYPES = {'image/jpeg', 'image/png', 'image/gif', 'image/webp'}
+
+_lock = threading.Lock()
+_cache_bytes = {}   # cache root -> bytes on disk, counted on first use
+_failed = {}        # (sha256, size) -> time.monotonic() it last failed to render
+_executor = None
+stats = {'hits': 0, 'misses': 0, 'failures': 0, 'evictions': 0}
+
+def can_render(mime_type):
+    return mime_type in IMAGE_TYPES or (mime_type == 'application/pdf' and _pdf_renderer() is not None)
+
+def _output_format():
+    from PIL import features
+    return ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+
+def thumbnail_path(cache_root, sha256, size):
+    return os.path.join(cache_root, sha256[:2], f"{sha256}-{size}.{_output_format()[1]}")
+
+def _pdf_renderer():
+    # First-page previews need pypdfium2, which is optional
+    try:
+        import pypdfium2
+    except ImportError:
+        return None
+    return pypdfium2
+
+def _open_source(fileobj, mime_type, max_edge):
+    from PIL import Image
+    if mime_type == 'application/pdf':
+        pdfium = _pdf_renderer()
+        document = pdfium.PdfDocument(fileobj.read())
+        try:
+            page = document[0]
+            width, height = page.get_size()
+            # Rasterise just large enough for the rendition
+            return page.render(scale=max_edge / max(width, height, 1)).to_pil()
+        finally:
+            document.close()
+    image = Image.open(fileobj)
+    if image.width * image.height > MAX_SOURCE_PIXELS:
+        raise ValueError(f"{image.width}x{image.height} image is too large to preview")
+    # JPEG can be decoded at a fraction of its size, which is much faster
+    image.draft('RGB', (max_edge, max_edge))
+    return image
+
+def render(fileobj, mime_type, size):
+    """Encoded rendition bytes of an image or PDF file object"""
+    from PIL import Image, ImageOps
+    max_edge = RENDITIONS[size]
+    image = _open_source(fileobj, mime_type, max_edge)
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    output_format = _output_format()[0]
+    if image.mode not in ('RGB', 'RGBA') or (output_format == 'JPEG' and image.mode == 'RGBA'):
+        background = Image.new('RGB', image.size, 'white')
+        image = image.convert('RGBA')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    out = io.BytesIO()
+    if output_format == 'WEBP':
+        image.save(out, output_format, quality=QUALITY, method=4)
+    else:
+        image.save(out, output_format, quality=QUALITY, optimize=True)
+    return out.getvalue()
+
+def _write(cache_root, path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.thumb-')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+        # A background render and a first request can both write the same rendition
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    with _lock:
+        total = _cache_bytes.get(cache_root)
+        if total is not None:
+            _cache_bytes[cache_root] = total + len(data) - replaced
+    if cache_size(cache_root) > MAX_CACHE_BYTES:
+        evict(cache_root)
+
+def get_thumbnail(cache_root, open_source, sha256, mime_type, size='small'):
+    """Rendition bytes for a stored file, rendering it on a cache miss.
+
+    open_source is called (only on a miss) to open the original file.
+    Returns None for types that cannot be previewed or files that fail to
+    render; a failed file is not tried again for RETRY_FAILED_AFTER seconds.
+    """
+    if not sha256 or not can_render(mime_type):
+        return None
+    failed_at = _failed.get((sha256, size))
+    if failed_at is not None and time.monotonic() - failed_at < RETRY_FAILED_AFTER:
+        return None
+    path = thumbnail_path(cache_root, sha256, size)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        os.utime(path)
+        with _lock:
+            stats['hits'] += 1
+        return data
+    except FileNotFoundError:
+        pass
+
+    with _lock:
+        stats['misses'] += 1
+    try:
+        with open_source() as source:
+            data = render(source, mime_type, size)
+    except Exception as e:
+        logger.error(f"Could not render {size} preview of {sha256}: {str(e)}")
+        with _lock:
+            stats['failures'] += 1
+            _failed[(sha256, size)] = time.monotonic()
+        return None
+    with _lock:
+        _failed.pop((sha256, size), None)
+    _write(cache_root, path, data)
+    return data
+
+def _generate(cache_root, open_source, sha256, mime_type):
+    for size in RENDITIONS:
+        get_thumbnail(cache_root, open_source, sha256, mime_type, size)
+
+def generate_later(cache_root, open_source, sha256, mime_type):
+    """Render every size of a newly uploaded file on a background thread"""
+    global _executor
+    if not can_render(mime_type):
+        return
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='thumbnails')
+    _executor.submit(_generate, cache_root, open_source, sha256, mime_type)
+
+def _cached_files(cache_root):
+    for dirpath, _, filenames in os.walk(cache_root):
+        for name in filenames:
+            if not name.startswith('.'):
+                path = os.path.join(dirpath, name)
+                try:
+                    st_result = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st_result.st_size, st_result.st_mtime
+
+def cache_size(cache_root):
+    with _lock:
+        total = _cache_bytes.get(cache_root)
+    if total is None:
+        total = sum(size for _, size, _ in _cached_files(cache_root))
+        with _lock:
+            _cache_bytes[cache_root] = total
+    return total
+
+def evict(cache_root, max_bytes=None):
+    """Delete least recently used renditions until the cache is at 90% of its limit"""
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    files = sorted(_cached_files(cache_root), key=lambda f: f[2])
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for path, size, _ in files:
+        if total <= max_bytes * 0.9:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    with _lock:
+        _cache_bytes[cache_root] = total
+        stats['evictions'] += removed
+    return removed
+
+def get_thumbnail_stats():
+    with _lock:
+        return dict(stats, cache_bytes=dict(_cache_bytes), max_cache_bytes=MAX_CACHE_BYTES)